@@ -0,0 +1,198 @@
+"""
+Dynamic micro-batching for the YOLO segmentation models.
+
+Each request thread submits its decoded image and blocks on a future. A single
+worker thread per model collects whatever arrives within a short window (up to
+ML_BATCH_MAX_SIZE images or ML_BATCH_MAX_WAIT_MS milliseconds after the first
+one), runs one batched `model.predict` and hands every caller its own result.
+Under concurrent load the model is called once per batch instead of once per
+request; a lone request only waits for the batching window.
+
+Because only the worker thread touches the model, this also stops concurrent
+requests from sharing the (non thread-safe) ultralytics predictor.
+
+Usage:
+    from api.batching import predict_batched
+    results = predict_batched('farm_boundary', img_np, conf=0.5, iou=0.45)
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+from .model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects single predictions into batches and runs them on a background thread.
+
+    Args:
+        name: Registry name of the model to run
+        max_batch_size: Largest number of images passed to one predict call
+        max_wait_ms: How long to wait for more images after the first one arrives
+    """
+    def __init__(self, name, max_batch_size=8, max_wait_ms=10):
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self.batches = 0
+        self.images = 0
+        self.largest_batch = 0
+
+    def _ensure_worker(self):
+        """
+        Start the worker thread on first use. Threads do not survive fork(), so a
+        worker started in a parent process is replaced in each child (with a fresh
+        queue); a worker restarted in the same process takes over the queued work.
+        """
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid or self._queue is None:
+                self._queue = queue.Queue()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name=f'batcher-{self.name}', daemon=True
+            )
+            self._pid = pid
+            self._thread.start()
+
+    def submit(self, image, **predict_kwargs):
+        """Queue one image and return a Future resolving to its ultralytics Results object"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((image, predict_kwargs, future))
+        return future
+
+    def predict(self, image, timeout=None, **predict_kwargs):
+        """Run one image through the batcher and block until its result is ready"""
+        future = self.submit(image, **predict_kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Frees its batch slot if it has not started yet (see _run_group)
+            future.cancel()
+            raise
+
+    def _collect(self, work_queue):
+        """Block for the first item, then gather more until the batch is full or the window closes"""
+        batch = [work_queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(work_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, work_queue):
+        while True:
+            batch = self._collect(work_queue)
+            try:
+                # Requests with different thresholds cannot share a predict call. Keyed by
+                # repr so unhashable values (e.g. classes=[0, 1]) can be grouped too.
+                groups = {}
+                for image, predict_kwargs, future in batch:
+                    key = tuple(sorted((name, repr(value)) for name, value in predict_kwargs.items()))
+                    groups.setdefault(key, (predict_kwargs, []))[1].append((image, future))
+
+                for predict_kwargs, items in groups.values():
+                    self._run_group(predict_kwargs, items)
+            except Exception as e:
+                # Keep the worker alive; fail whatever of this batch is still waiting
+                logger.exception(f"Batching failed for '{self.name}': {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        try:
+                            future.set_exception(e)
+                        except InvalidStateError:
+                            pass  # Cancelled by its caller in the meantime
+
+    def _run_group(self, predict_kwargs, items):
+        # Skip work for callers that gave up waiting
+        items = [(image, future) for image, future in items if future.set_running_or_notify_cancel()]
+        if not items:
+            return
+
+        try:
+            model = registry.get(self.name)
+            if model is None:
+                raise RuntimeError(f"Model '{self.name}' is not loaded")
+
+            start = time.perf_counter()
+            results = model.predict(source=[image for image, _ in items], save=False, verbose=False, **predict_kwargs)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            logger.exception(f"Batched prediction failed for '{self.name}': {e}")
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.images += len(items)
+        self.largest_batch = max(self.largest_batch, len(items))
+        logger.debug(f"Ran '{self.name}' on a batch of {len(items)} images in {elapsed:.3f}s")
+
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': round(self.max_wait * 1000, 1),
+            'running': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+            'batches': self.batches,
+            'images': self.images,
+            'average_batch_size': round(self.images / self.batches, 2) if self.batches else None,
+            'largest_batch': self.largest_batch,
+        }
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(name):
+    """Return the shared batcher for a registered model, creating it on first use"""
+    batcher = _batchers.get(name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(name)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    name,
+                    max_batch_size=settings.ML_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.ML_BATCH_MAX_WAIT_MS,
+                )
+                _batchers[name] = batcher
+    return batcher
+
+
+def predict_batched(name, image, **predict_kwargs):
+    """
+    Drop-in replacement for `model.predict(source=image, ...)` on a single image.
+    Returns a one-element list so existing `results[0]` handling keeps working.
+    """
+    result = get_batcher(name).predict(image, timeout=settings.ML_BATCH_TIMEOUT_SECONDS, **predict_kwargs)
+    return [result]
+
+
+def describe_batchers():
+    return [batcher.describe() for batcher in _batchers.values()]
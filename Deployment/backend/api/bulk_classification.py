@@ -0,0 +1,175 @@
+"""
+Bulk crop classification for many farms at once.
+
+Instead of saving one CropClassification per request (which runs the model, a
+weather lookup and a Crop get_or_create for every row), this module:
+
+1. loads the farms together with their latest weather in a single query,
+2. assembles the feature matrix for all of them,
+3. scores it in one predict_proba call, and
+4. writes the results with bulk_create.
+
+Value precedence for each input field is: per-farm overrides, then the farm's
+own data (soil, area, irrigation, latest weather, rainfall over the last 90 days
+from the daily rainfall store, governorate from the address),
+then the batch-wide defaults.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from core.models import Crop, CropClassification, Farm, FarmCrop, Weather
+from .ml_utils import crop_classifier
+from .rainfall import feature_rainfall
+
+logger = logging.getLogger(__name__)
+
+# Model inputs that must be known before a farm can be classified
+REQUIRED_FIELDS = [
+    'soil_n', 'soil_p', 'soil_k', 'temperature', 'humidity', 'ph', 'rainfall', 'area',
+    'fertilizer_amount', 'pesticide_amount', 'governorate', 'irrigation', 'fertilizer_type',
+    'planting_season', 'growing_season', 'harvest_season',
+]
+INPUT_FIELDS = REQUIRED_FIELDS + ['district']
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class ClassifierUnavailable(Exception):
+    """Raised when the crop classification model cannot be loaded"""
+
+
+def farms_with_latest_weather(farms):
+    """Annotate a Farm queryset with the fields of its most recent Weather record"""
+    latest = Weather.objects.filter(farm=OuterRef('pk')).order_by('-date')
+    return farms.annotate(
+        latest_temperature_max=Subquery(latest.values('temperature_max')[:1]),
+        latest_temperature_min=Subquery(latest.values('temperature_min')[:1]),
+        latest_humidity=Subquery(latest.values('humidity')[:1]),
+        latest_precipitation=Subquery(latest.values('precipitation')[:1]),
+    )
+
+
+def governorate_from_address(address):
+    """Extract governorate from a farm address (same rule as FarmCrop)"""
+    if not address:
+        return None
+    address = address.lower()
+    for gov_code, gov_name in FarmCrop.GOVERNORATE_CHOICES:
+        if gov_name.lower() in address:
+            return gov_code
+    return None
+
+
+def farm_inputs(farm):
+    """Return the classification inputs that can be derived from an annotated farm"""
+    inputs = {
+        'area': farm.size_hectares,
+        'ph': farm.soil_ph,
+        'soil_n': farm.soil_nitrogen,
+        'soil_p': farm.soil_phosphorus,
+        'soil_k': farm.soil_potassium,
+        'irrigation': farm.irrigation_type,
+        'governorate': governorate_from_address(farm.address),
+    }
+    if farm.latest_temperature_max is not None and farm.latest_temperature_min is not None:
+        inputs['temperature'] = (farm.latest_temperature_max + farm.latest_temperature_min) / 2
+    inputs['humidity'] = farm.latest_humidity
+    # Seasonal total from the daily rainfall store when the farm's cell has one (see classify_farms)
+    rainfall = getattr(farm, 'feature_rainfall', None)
+    inputs['rainfall'] = Decimal(str(rainfall)) if rainfall is not None else farm.latest_precipitation
+    return {field: value for field, value in inputs.items() if value not in (None, '')}
+
+
+def build_classification(farm, defaults=None, overrides=None):
+    """
+    Merge defaults, farm data and overrides into an unsaved CropClassification.
+
+    Returns:
+        Tuple of (instance, missing_fields); instance is None when required fields are missing
+    """
+    values = {}
+    values.update({k: v for k, v in (defaults or {}).items() if k in INPUT_FIELDS and v not in (None, '')})
+    values.update(farm_inputs(farm))
+    values.update({k: v for k, v in (overrides or {}).items() if k in INPUT_FIELDS and v not in (None, '')})
+
+    missing = [field for field in REQUIRED_FIELDS if field not in values]
+    if missing:
+        return None, missing
+
+    # Ensure temperature is properly formatted to avoid validation errors
+    values['temperature'] = Decimal(str(round(float(values['temperature']), 2)))
+    return CropClassification(farm=farm, **values), []
+
+
+def resolve_crops(names):
+    """Return a {name: Crop} map, creating any crops that do not exist yet in one statement"""
+    names = set(names)
+    crops = {crop.name: crop for crop in Crop.objects.filter(name__in=names)}
+    missing = names - crops.keys()
+    if missing:
+        Crop.objects.bulk_create([Crop(name=name) for name in missing], ignore_conflicts=True)
+        crops.update({crop.name: crop for crop in Crop.objects.filter(name__in=missing)})
+    return crops
+
+
+def classify_farms(farms, defaults=None, overrides=None, batch_size=DEFAULT_BATCH_SIZE, commit=True):
+    """
+    Classify every farm in the queryset and store the results in bulk.
+
+    Args:
+        farms: Farm queryset to classify
+        defaults: Batch-wide input values used when a farm has no data of its own
+        overrides: {farm_id: {field: value}} values that take precedence over farm data
+        batch_size: Number of farms loaded, scored and written per chunk
+        commit: If False, score the farms but do not write anything
+
+    Returns:
+        Tuple of (classifications, skipped) where skipped is a list of
+        {'farm': id, 'missing': [fields]} for farms without enough data
+
+    Raises:
+        ClassifierUnavailable: if the model cannot be loaded
+    """
+    if crop_classifier.model is None:
+        raise ClassifierUnavailable("Crop classification model is not available")
+
+    overrides = {int(farm_id): values for farm_id, values in (overrides or {}).items()}
+    farm_ids = list(farms.order_by('pk').values_list('pk', flat=True))
+
+    classifications = []
+    skipped = []
+    for start in range(0, len(farm_ids), batch_size):
+        chunk = list(farms_with_latest_weather(Farm.objects.filter(pk__in=farm_ids[start:start + batch_size])))
+        rainfall = feature_rainfall(chunk)
+
+        pending = []
+        for farm in chunk:
+            farm.feature_rainfall = rainfall.get(farm.pk)
+            instance, missing = build_classification(farm, defaults, overrides.get(farm.pk))
+            if instance is None:
+                skipped.append({'farm': farm.pk, 'missing': missing})
+            else:
+                pending.append(instance)
+
+        if not pending:
+            continue
+
+        predictions = crop_classifier.predict_batch([instance.get_feature_row() for instance in pending])
+        crops = resolve_crops(name for name, _ in predictions) if commit else {}
+        for instance, (crop_name, confidence) in zip(pending, predictions):
+            instance.recommended_crop = crops.get(crop_name)
+            instance.confidence_score = Decimal(str(round(confidence, 2)))
+            # Keep the prediction available when running without commit
+            instance.predicted_crop_name = crop_name
+
+        if commit:
+            # bulk_create skips CropClassification.save(), which would score each row again
+            with transaction.atomic():
+                pending = CropClassification.objects.bulk_create(pending)
+        classifications.extend(pending)
+        logger.info(f"Classified {len(pending)} farms ({start + len(chunk)}/{len(farm_ids)})")
+
+    return classifications, skipped
@@ -0,0 +1,456 @@
+"""
+Detection pipelines behind the ML endpoints: model inference plus post-processing
+into the JSON payloads the API returns.
+
+The views validate the request and then call `run_detection(kind, image, params)`,
+either directly in the request thread (INFERENCE_MODE='inline') or through the
+inference job queue, whose worker processes call the same function
+(INFERENCE_MODE='queue', see api/inference_queue.py). Keeping the pipelines free
+of request objects is what lets them run in either place.
+
+Every pipeline takes the input image and a dict of JSON-serializable parameters
+and returns a JSON-serializable result.
+"""
+import logging
+import math
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .batching import predict_batched
+from .geo import pixels_to_geojson_ring, pixels_to_latlng_paths
+from .image_io import decode_image_buffer
+from .model_registry import registry
+from .postprocessing import weed_detections, weed_coverage
+from .tiling import farm_size_category
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailable(Exception):
+    """The model a detection needs is not loaded (missing weights or load error)"""
+
+
+def require_model(name):
+    model = registry.get(name)
+    if not model:
+        raise ModelUnavailable(f"Model '{name}' is not loaded. Check server logs.")
+    return model
+
+
+# --- Helper Function: Calculate approximate area per pixel ---
+def calculate_area_per_pixel(bounds, img_width, img_height):
+    """Calculates approximate area in square meters per pixel."""
+    R_EARTH = 6371000 # Earth radius in meters
+    lat_north = math.radians(bounds['north'])
+    lat_south = math.radians(bounds['south'])
+    lon_east = math.radians(bounds['east'])
+    lon_west = math.radians(bounds['west'])
+
+    avg_lat = (lat_north + lat_south) / 2.0
+
+    # Approx distance north-south and east-west in meters
+    dist_ns = R_EARTH * (lat_north - lat_south)
+    dist_ew = R_EARTH * (lon_east - lon_west) * math.cos(avg_lat)
+
+    # Avoid division by zero if image dimensions are invalid
+    if img_height <= 0 or img_width <= 0:
+        return 0.0
+
+    meters_per_pixel_y = dist_ns / img_height
+    meters_per_pixel_x = dist_ew / img_width
+
+    # Area per pixel in square meters
+    area_sq_m_per_pixel = meters_per_pixel_x * meters_per_pixel_y
+    return area_sq_m_per_pixel
+
+
+# --- Pipelines ---
+
+def segment_map(img_np, params):
+    """
+    Farm boundary polygons for a map screenshot, as Google Maps style paths.
+
+    Args:
+        img_np: RGB image array
+        params: {'bounds': {north, south, east, west}, 'projection': 'linear' | 'mercator'}
+
+    Returns:
+        {'polygons': [{'paths': [{'lat': .., 'lng': ..}, ...]}, ...]}
+    """
+    require_model('farm_boundary')
+    img_height, img_width = img_np.shape[:2]
+
+    # Perform Inference
+    results = predict_batched('farm_boundary', img_np, conf=0.5) # Adjust confidence as needed
+
+    detected_polygons = []
+    if results and results[0].masks:
+        print(f"Detected {len(results[0].masks)} masks.")
+        # Iterate through detected masks
+        for mask_data in results[0].masks.xy: # Use .xy for polygon points
+            if len(mask_data) < 3: # Need at least 3 points for a polygon
+                continue
+
+            # Convert the whole (N, 2) pixel array at once, clamped to the image
+            geo_polygon_paths = pixels_to_latlng_paths(
+                mask_data.astype(int), img_width, img_height, params['bounds'], params['projection']
+            )
+
+            detected_polygons.append({
+                'paths': geo_polygon_paths
+                # Add score or class if needed: 'score': score, 'class': class_name
+            })
+    else:
+        print("No masks detected in results.")
+
+    return {'polygons': detected_polygons}
+
+
+def detect_farm_boundaries(img_np, params):
+    """
+    Farm boundaries in a satellite image as GeoJSON features with area and size category.
+
+    Args:
+        img_np: RGB image array
+        params: {'bounds': {north, south, east, west}, 'projection': 'linear' | 'mercator'}
+
+    Returns:
+        List of GeoJSON Polygon features
+    """
+    require_model('farm_boundary')
+    bounds = params['bounds']
+    projection = params['projection']
+    img_height, img_width = img_np.shape[:2]
+
+    # --- Perform Inference ---
+    print("Running model inference...")
+    # Increase confidence threshold to filter weaker detections
+    # Add iou parameter and adjust confidence level
+    results = predict_batched('farm_boundary', img_np, conf=0.5, iou=0.45)
+    print(f"Inference complete. Results: {len(results) if results else 0}")
+
+    # Calculate area per pixel once
+    try:
+        area_sq_m_per_pixel = calculate_area_per_pixel(bounds, img_width, img_height)
+        print(f"Approx area per pixel (sq m): {area_sq_m_per_pixel}")
+    except Exception as area_calc_err:
+        print(f"Error calculating area per pixel: {area_calc_err}")
+        # Default to 0 or handle appropriately if calculation fails
+        area_sq_m_per_pixel = 0.0
+
+    # --- Process Results and Convert to GeoJSON ---
+    geojson_features = []
+    if results and results[0].masks:
+        print(f"Detected {len(results[0].masks)} masks.")
+        # Use .xy for polygon points (list of [x, y])
+        for i, mask_xy in enumerate(results[0].masks.xy):
+            pixel_polygon_raw = mask_xy.astype(np.int32) # Use int32 for OpenCV
+
+            if len(pixel_polygon_raw) < 3: # Need at least 3 points for a valid polygon
+                print(f"Skipping mask {i}: Not enough points ({len(pixel_polygon_raw)})")
+                continue
+
+            # --- Add Smoothing ---
+            # Reshape for approxPolyDP: (N, 1, 2)
+            contour = pixel_polygon_raw.reshape((-1, 1, 2))
+
+            # Calculate epsilon for approximation (e.g., 1% of arc length)
+            # Adjust the percentage (0.01) for more or less smoothing
+            epsilon = 0.01 * cv2.arcLength(contour, True)
+            smoothed_contour = cv2.approxPolyDP(contour, epsilon, True)
+
+            # Reshape back to (N, 2) for geo conversion
+            pixel_polygon_smoothed = smoothed_contour.reshape((-1, 2))
+
+            if len(pixel_polygon_smoothed) < 3: # Check again after smoothing
+                print(f"Skipping mask {i}: Not enough points after smoothing ({len(pixel_polygon_smoothed)})")
+                continue
+            # --- End Smoothing ---
+
+            # --- Calculate Area ---
+            area_hectares = 0.0
+            size_category = "Unknown"
+            if area_sq_m_per_pixel > 0:
+                pixel_area = cv2.contourArea(smoothed_contour)
+                area_sq_m = pixel_area * area_sq_m_per_pixel
+                area_hectares = round(area_sq_m / 10000.0, 2) # Convert to hectares, round to 2 decimal places
+
+                # --- Classify Size ---
+                size_category = farm_size_category(area_hectares)
+            else:
+                print(f"Skipping area calculation for mask {i} due to invalid area_per_pixel.")
+            # --- End Area Calculation & Classification ---
+
+            # Convert *smoothed* pixel coordinates to a closed GeoJSON ring ([lng, lat] pairs)
+            # in one vectorized step, clamping to the image dimensions
+            geo_polygon_coords = pixels_to_geojson_ring(
+                pixel_polygon_smoothed, img_width, img_height, bounds, projection
+            )
+
+            # Only add if we still have a valid polygon after closing
+            if len(geo_polygon_coords) >= 4: # Need at least 4 points for a closed linear ring
+                feature = {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [geo_polygon_coords] # GeoJSON requires an array of rings
+                    },
+                    "properties": {
+                        "id": i, # Add an identifier if needed
+                        "area_hectares": area_hectares,
+                        "size_category": size_category,
+                        "message": f"Detected a {size_category.split(' (')[0]}." # Example message
+                    }
+                }
+                geojson_features.append(feature)
+            else:
+                print(f"Skipping mask {i}: Not enough points for a closed GeoJSON polygon after smoothing ({len(geo_polygon_coords)})")
+
+    print(f"Returning {len(geojson_features)} GeoJSON features.")
+    return geojson_features
+
+
+def detect_farm_boundaries_tiled(image, params):
+    """
+    Farm boundaries over an input too large for a single pass (see api/tiling.py).
+
+    Args:
+        image: RGB image array (with params['bounds']), a GeoTIFF path, or None to
+            fetch imagery for params['bounds'] at params['zoom'] from the tile server
+        params: bounds, projection, zoom, tile_size, overlap
+
+    Returns:
+        GeoJSON FeatureCollection
+    """
+    from .tiling import ArraySource, RasterioSource, XYZSource, detect_boundaries_tiled
+
+    require_model('farm_boundary')
+    if isinstance(image, np.ndarray):
+        source = ArraySource(image, params['bounds'], projection=params['projection'])
+    elif image is not None:
+        source = RasterioSource(image)
+    else:
+        source = XYZSource(params['bounds'], params['zoom'], tile_size=params['tile_size'])
+
+    try:
+        tile_size = params['tile_size']
+        overlap = params['overlap']
+        logger.info(f"Tiled detection over {source.width}x{source.height} px with {tile_size}px tiles ({overlap}px overlap)")
+        feature_collection = detect_boundaries_tiled(
+            source,
+            lambda tile: predict_batched('farm_boundary', tile, conf=0.5, iou=0.45),
+            tile_size=tile_size,
+            overlap=overlap,
+        )
+        logger.info(f"Returning {len(feature_collection['features'])} merged GeoJSON features")
+        return feature_collection
+    finally:
+        source.close()
+
+
+def detect_weeds(img_np, params=None):
+    """
+    Weed instances in a field photo.
+
+    Args:
+        img_np: RGB image array
+        params: Optional 'output' ('objects', 'flat' or 'columnar', see api.postprocessing)
+            and 'rle' (add a run-length encoded mask per detection)
+
+    Returns:
+        {'detected_weeds': [{'id', 'class_name', 'confidence', 'polygon_pixels'}, ...]} by default
+    """
+    params = params or {}
+    output = params.get('output') or 'objects'
+    result = _weed_inference(img_np)
+    if result is None:
+        return weed_detections(None, output=output)
+
+    # All detections are converted at once (see api.postprocessing)
+    height, width = img_np.shape[:2]
+    return weed_detections(result, output=output, include_rle=bool(params.get('rle')),
+                           image_size=(width, height))
+
+
+def _weed_inference(img_np):
+    """Run the weed model on one image; returns its result, or None if nothing was detected"""
+    require_model('weed')
+
+    # Perform Inference
+    print("Running weed detection model inference...")
+    # Use similar parameters as farm boundaries for consistency
+    results = predict_batched('weed', img_np, conf=0.5, iou=0.45)
+    print(f"Weed detection inference complete. Results: {len(results) if results else 0}")
+
+    # Check if results exist and contain masks
+    if not results or not results[0].masks:
+        print("No weed masks detected in results.")
+        return None
+
+    print(f"Detected {len(results[0].masks)} weed masks.")
+
+    # Check if model has class names
+    names = results[0].names if hasattr(results[0], 'names') else {}
+    print(f"Model class names: {names}")
+    return results[0]
+
+
+def scan_weeds(image, params=None):
+    """
+    Weed detection for a stored Scan image: the detect_weeds payload plus the
+    per-instance boxes and areas, class counts, image area and the mask coverage
+    summary (see api.postprocessing.weed_coverage) that Scan.record_detection stores.
+
+    Args:
+        image: RGB image array or path to the image file
+        params: Optional 'bounds' ({'north', 'south', 'east', 'west'}) of the area the
+            image covers, to add areas in square meters to the coverage
+    """
+    params = params or {}
+    img_np = image if isinstance(image, np.ndarray) else decode_image_buffer(np.fromfile(image, dtype=np.uint8))
+    img_height, img_width = img_np.shape[:2]
+    result = _weed_inference(img_np)
+    detections = weed_detections(result)
+
+    boxes = []
+    class_counts = {}
+    for weed in detections['detected_weeds']:
+        polygon = np.asarray(weed['polygon_pixels'], dtype=np.int32).reshape((-1, 1, 2))
+        x, y, w, h = cv2.boundingRect(polygon)
+        boxes.append({
+            'id': weed['id'],
+            'class_name': weed['class_name'],
+            'confidence': weed['confidence'],
+            'box': [x, y, x + w, y + h],
+            'area': float(cv2.contourArea(polygon)),
+        })
+        if weed['class_name'] != 'Unknown':
+            class_counts[weed['class_name']] = class_counts.get(weed['class_name'], 0) + 1
+
+    # Coverage is computed once here from the unsimplified masks, not from the stored polygons
+    bounds = params.get('bounds')
+    area_per_pixel = calculate_area_per_pixel(bounds, img_width, img_height) if bounds else None
+    detections.update({
+        'image_width': img_width,
+        'image_height': img_height,
+        'image_area': img_width * img_height,
+        'boxes': boxes,
+        'classes': [{'name': name, 'count': count} for name, count in class_counts.items()],
+        'coverage': weed_coverage(result, (img_width, img_height), settings.WEED_DENSITY_GRID_SIZE, area_per_pixel),
+    })
+    return detections
+
+
+def classify_disease(image_file, params=None):
+    """
+    Disease class of a leaf photo.
+
+    Args:
+        image_file: Path or file-like object with the encoded image
+
+    Returns:
+        {'predicted_class': str, 'confidence': float}
+    """
+    disease_model = require_model('disease')
+
+    # Safe to import now: the registry has already loaded torch for the model
+    from .disease_model import DISEASE_CLASSES, preprocess_image_file, predict_top_k
+
+    # Open and preprocess the image, adding the batch dimension
+    img_tensor = preprocess_image_file(image_file).unsqueeze(0)
+
+    # Make prediction: class and confidence from a single softmax
+    top_probabilities, top_indices = predict_top_k(disease_model, img_tensor, k=1)
+    return {
+        'predicted_class': DISEASE_CLASSES[top_indices[0, 0].item()],
+        'confidence': top_probabilities[0, 0].item(),
+    }
+
+
+def classify_disease_batch(images, params=None):
+    """
+    Disease classes of many leaf photos in one forward pass.
+
+    Images are decoded and preprocessed in a thread pool (Pillow releases the GIL while
+    decoding), stacked into one tensor and classified with a single softmax.
+
+    Args:
+        images: Paths or file-like objects, one per image still to classify
+        params: 'top_k'; 'filenames' of all the images of the request; 'pending', the
+            index in 'filenames' of each entry of `images`; 'cached', results already
+            known for the other indexes (keys are the indexes as strings)
+
+    Returns:
+        {'count': int, 'results': [{'filename', 'predicted_class', 'confidence', 'top_k'}
+        or {'filename', 'error'}, ...]} for all the filenames, in order
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    params = params or {}
+    filenames = params.get('filenames') or [getattr(image, 'name', str(image)) for image in images]
+    pending = params.get('pending') or list(range(len(images)))
+    results = [None] * len(filenames)
+    for index, result in (params.get('cached') or {}).items():
+        results[int(index)] = dict(result, filename=filenames[int(index)])
+    if not images:
+        return {'count': len(results), 'results': results}
+
+    disease_model = require_model('disease')
+    import torch
+    from .disease_model import DISEASE_CLASSES, preprocess_image_file, predict_top_k
+    top_k = max(1, min(int(params.get('top_k', 3)), len(DISEASE_CLASSES)))
+
+    def load(position):
+        try:
+            return position, preprocess_image_file(images[position]), None
+        except Exception as e:
+            return position, None, str(e)
+
+    tensors = []
+    with ThreadPoolExecutor(max_workers=min(settings.DISEASE_PREPROCESS_WORKERS, len(images))) as pool:
+        for position, tensor, error in pool.map(load, range(len(images))):
+            index = pending[position]
+            if error is not None:
+                logger.warning(f"Error preprocessing {filenames[index]}: {error}")
+                results[index] = {'filename': filenames[index], 'error': f'Error processing image: {error}'}
+            else:
+                tensors.append((index, tensor))
+
+    if tensors:
+        # One forward pass and one softmax for the whole batch
+        batch = torch.stack([tensor for _, tensor in tensors])
+        top_probabilities, top_indices = predict_top_k(disease_model, batch, k=top_k)
+        logger.debug(f"Classified {len(tensors)} leaf images in one batch")
+        for row, (index, _) in enumerate(tensors):
+            predictions = [
+                {'class': DISEASE_CLASSES[class_idx], 'confidence': probability}
+                for class_idx, probability in zip(top_indices[row].tolist(), top_probabilities[row].tolist())
+            ]
+            results[index] = {
+                'filename': filenames[index],
+                'predicted_class': predictions[0]['class'],
+                'confidence': predictions[0]['confidence'],
+                'top_k': predictions,
+            }
+    return {'count': len(results), 'results': results}
+
+
+# Detection kinds accepted by run_detection and the inference job queue
+DETECTORS = {
+    'segment_map': segment_map,
+    'farm_boundary': detect_farm_boundaries,
+    'farm_boundary_tiled': detect_farm_boundaries_tiled,
+    'weed': detect_weeds,
+    'weed_scan': scan_weeds,
+    'disease': classify_disease,
+    'disease_batch': classify_disease_batch,
+}
+
+
+def run_detection(kind, image, params=None):
+    """Run the detection pipeline registered for `kind` and return its JSON-serializable result"""
+    if kind not in DETECTORS:
+        raise ValueError(f"Unknown detection kind '{kind}', expected one of {tuple(DETECTORS)}")
+    return DETECTORS[kind](image, params or {})
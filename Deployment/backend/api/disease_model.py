@@ -0,0 +1,127 @@
+"""
+ResNet9 plant disease classifier used by the disease detection endpoints.
+
+This module imports torch at load time, so it should only be imported lazily
+(for example through ``api.model_registry``) by code that actually runs the
+disease model.
+"""
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torchvision.transforms as transforms
+
+# Output classes of the trained ResNet9, in logit order
+DISEASE_CLASSES = ['Pepper,_bell___healthy', 'Orange___Haunglongbing_(Citrus_greening)', 'Apple___Apple_scab', 'Tomato___Target_Spot', 'Peach___healthy', 'Grape___Black_rot', 'Apple___healthy', 'Tomato___healthy', 'Tomato___Septoria_leaf_spot', 'Raspberry___healthy', 'Squash___Powdery_mildew', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Strawberry___healthy', 'Potato___Early_blight', 'Potato___Late_blight', 'Peach___Bacterial_spot', 'Potato___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Pepper,_bell___Bacterial_spot', 'Blueberry___healthy', 'Cherry_(including_sour)___healthy', 'Apple___Cedar_apple_rust', 'Strawberry___Leaf_scorch', 'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Tomato___Early_blight', 'Tomato___Spider_mites Two-spotted_spider_mite', 'Corn_(maize)___healthy', 'Tomato___Leaf_Mold', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Corn_(maize)___Common_rust_', 'Tomato___Bacterial_spot', 'Corn_(maize)___Northern_Leaf_Blight', 'Grape___healthy', 'Apple___Black_rot', 'Grape___Esca_(Black_Measles)', 'Soybean___healthy', 'Tomato___Tomato_mosaic_virus', 'Tomato___Late_blight']
+
+# --- Model Definitions from Notebook ---
+def accuracy(outputs, labels):
+    _, preds = torch.max(outputs, dim=1)
+    return torch.tensor(torch.sum(preds == labels).item() / len(preds))
+
+class ImageClassificationBase(nn.Module):
+    def training_step(self, batch):
+        images, labels = batch
+        out = self(images)
+        loss = F.cross_entropy(out, labels)
+        return loss
+
+    def validation_step(self, batch):
+        images, labels = batch
+        out = self(images)
+        loss = F.cross_entropy(out, labels)
+        acc = accuracy(out, labels)
+        preds = torch.argmax(out, dim=1)
+        return {
+            "val_loss": loss.detach(),
+            "val_accuracy": acc,
+            "preds": preds.detach(),
+            "labels": labels.detach()
+        }
+
+    def validation_epoch_end(self, outputs):
+        batch_losses = [x["val_loss"] for x in outputs]
+        batch_accuracy = [x["val_accuracy"] for x in outputs]
+        epoch_loss = torch.stack(batch_losses).mean()
+        epoch_accuracy = torch.stack(batch_accuracy).mean()
+        return {"val_loss": epoch_loss, "val_accuracy": epoch_accuracy}
+
+    def epoch_end(self, epoch, result):
+        print("Epoch [{}], last_lr: {:.5f}, train_loss: {:.4f}, val_loss: {:.4f}, val_acc: {:.4f}".format(
+            epoch, result['lrs'][-1], result['train_loss'], result['val_loss'], result['val_accuracy']))
+
+def ConvBlock(in_channels, out_channels, pool=False):
+    layers = [nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
+             nn.BatchNorm2d(out_channels),
+             nn.ReLU(inplace=True)]
+    if pool:
+        layers.append(nn.MaxPool2d(4))
+    return nn.Sequential(*layers)
+
+class ResNet9(ImageClassificationBase):
+    def __init__(self, in_channels, num_diseases):
+        super().__init__()
+        self.conv1 = ConvBlock(in_channels, 64)
+        self.conv2 = ConvBlock(64, 128, pool=True)
+        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
+        self.conv3 = ConvBlock(128, 256, pool=True)
+        self.conv4 = ConvBlock(256, 512, pool=True)
+        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
+        self.classifier = nn.Sequential(nn.MaxPool2d(4),
+                                       nn.Flatten(),
+                                       nn.Linear(512, num_diseases))
+
+    def forward(self, xb):
+        out = self.conv1(xb)
+        out = self.conv2(out)
+        out = self.res1(out) + out
+        out = self.conv3(out)
+        out = self.conv4(out)
+        out = self.res2(out) + out
+        out = self.classifier(out)
+        return out
+# --- End Model Definitions ---
+
+# Transformations applied to uploaded leaf images before inference
+preprocess = transforms.Compose([
+    transforms.Resize(256), # Resize to 256x256
+    transforms.CenterCrop(224), # Crop to 224x224 from center
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]) # Standard normalization for ImageNet models
+])
+
+def load_disease_model(path, mmap=False):
+    """
+    Build the ResNet9 architecture and load the trained state_dict from disk.
+    With mmap=True the parameters stay backed by the memory-mapped file (torch>=2.1),
+    so every process loading the same file shares its pages through the page cache.
+    Returns the model in evaluation mode.
+    """
+    model = ResNet9(in_channels=3, num_diseases=len(DISEASE_CLASSES))
+    if mmap:
+        try:
+            state_dict = torch.load(path, map_location=torch.device('cpu'), mmap=True, weights_only=True)
+            model.load_state_dict(state_dict, assign=True)
+            model.eval()
+            return model
+        except (TypeError, RuntimeError) as e:
+            # Older torch, or a checkpoint saved in the legacy (non-zip) format
+            print(f"Memory-mapped loading unavailable for {path}, loading into memory: {e}")
+    state_dict = torch.load(path, map_location=torch.device('cpu'))
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model
+
+def preprocess_image_file(image_file):
+    """Open an uploaded image file and apply `preprocess`, returning a (3, 224, 224) tensor"""
+    from PIL import Image
+    with Image.open(image_file) as img:
+        return preprocess(img.convert('RGB'))
+
+def predict_top_k(model, batch, k=1):
+    """
+    Run a single forward pass over a (N, 3, 224, 224) batch and one softmax.
+    Returns (probabilities, class_indices), each of shape (N, k), best first.
+    """
+    with torch.no_grad():
+        probabilities = F.softmax(model(batch), dim=1)
+    return probabilities.topk(k, dim=1)
@@ -0,0 +1,161 @@
+"""
+Optimized CPU runtimes for the ResNet9 disease classifier.
+
+The trained weights are an eager-mode state_dict (diseases_model_fixed.pt). This
+module exports them to a frozen TorchScript graph or an ONNX graph and loads
+those artifacts as drop-in replacements for the eager model: every backend is
+called as `model(batch)` with a (N, 3, 224, 224) float tensor and returns a
+logits tensor, so predict_top_k and the views do not change.
+
+Which backend the registry serves is set by DISEASE_MODEL_BACKEND
+('eager', 'torchscript' or 'onnx'). Thread counts are pinned by
+ML_INTRA_OP_THREADS so several Gunicorn workers on one node do not each spawn
+a thread per core and oversubscribe the CPU.
+
+onnx/onnxruntime are optional and only needed for the ONNX backend.
+"""
+import logging
+import os
+import statistics
+import time
+
+import torch
+from django.conf import settings
+
+from .disease_model import load_disease_model
+from .model_registry import configure_torch_threads, disease_artifact_path, DISEASE_BACKENDS as BACKENDS
+
+logger = logging.getLogger(__name__)
+
+INPUT_SHAPE = (3, 224, 224)
+
+
+# --- Export ---
+
+def export_torchscript(model, output_path):
+    """Trace the eager model, freeze it (folds weights and batch norm into the graph) and save it"""
+    example = torch.randn(1, *INPUT_SHAPE)
+    with torch.no_grad():
+        traced = torch.jit.trace(model.eval(), example)
+        frozen = torch.jit.freeze(traced)
+    frozen.save(output_path)
+    return output_path
+
+
+def export_onnx(model, output_path, opset=17):
+    """Export the eager model to ONNX with a dynamic batch dimension"""
+    example = torch.randn(1, *INPUT_SHAPE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model.eval(), example, output_path,
+            input_names=['images'], output_names=['logits'],
+            dynamic_axes={'images': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=opset,
+        )
+    return output_path
+
+
+# --- Runtimes ---
+
+class TorchScriptDiseaseModel:
+    """Frozen TorchScript graph, optimized for inference on load"""
+    backend = 'torchscript'
+
+    def __init__(self, path):
+        configure_torch_threads()
+        module = torch.jit.load(path, map_location='cpu').eval()
+        self.module = torch.jit.optimize_for_inference(module)
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.module(batch)
+
+
+class OnnxDiseaseModel:
+    """ONNX Runtime CPU session with pinned thread counts"""
+    backend = 'onnx'
+
+    def __init__(self, path, intra_op_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or settings.ML_INTRA_OP_THREADS or 0
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def load_eager_model(path):
+    configure_torch_threads()
+    return load_disease_model(path, mmap=settings.ML_MMAP_WEIGHTS)
+
+
+LOADERS = {
+    'eager': load_eager_model,
+    'torchscript': TorchScriptDiseaseModel,
+    'onnx': OnnxDiseaseModel,
+}
+
+
+def load_backend(backend, path):
+    if backend not in LOADERS:
+        raise ValueError(f"Unknown disease model backend '{backend}', expected one of {BACKENDS}")
+    return LOADERS[backend](path)
+
+
+def backend_for_path(path):
+    """Infer the runtime from an artifact's file name (see disease_artifact_path)"""
+    path = os.fspath(path)
+    if path.endswith('.onnx'):
+        return 'onnx'
+    if path.endswith('.torchscript.pt'):
+        return 'torchscript'
+    return 'eager'
+
+
+# --- Parity and benchmarking ---
+
+def check_parity(reference, candidate, batch_size=8, atol=1e-3, seed=0):
+    """
+    Compare a candidate runtime against the eager reference on random inputs.
+
+    Returns:
+        Dict with the maximum absolute logit difference, whether top-1 classes agree, and pass/fail
+    """
+    generator = torch.Generator().manual_seed(seed)
+    batch = torch.randn(batch_size, *INPUT_SHAPE, generator=generator)
+    with torch.no_grad():
+        expected = reference(batch)
+        actual = candidate(batch)
+    max_abs_diff = float((expected - actual).abs().max())
+    top1_match = bool(torch.equal(expected.argmax(dim=1), actual.argmax(dim=1)))
+    return {'max_abs_diff': max_abs_diff, 'top1_match': top1_match, 'passed': top1_match and max_abs_diff <= atol}
+
+
+def benchmark(model, batch_size=1, iterations=50, warmup=5):
+    """Time `model(batch)` and return latency statistics in milliseconds"""
+    batch = torch.randn(batch_size, *INPUT_SHAPE)
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(batch)
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            model(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p50 = statistics.median(timings)
+    return {
+        'batch_size': batch_size,
+        'p50_ms': round(p50, 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'mean_ms': round(statistics.mean(timings), 2),
+        'images_per_second': round(batch_size * 1000 / p50, 1),
+    }
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the Open-Meteo forecast and archive endpoints, for tests and benchmarks.
+
+Answers /v1/forecast and /v1/archive with deterministic synthetic data (derived from the
+coordinates and dates, so repeated runs agree) in the response format the client in
+api/open_meteo.py reads, including multi-location requests (comma-separated
+latitude/longitude lists answered with a JSON list). Latency and failures can be
+injected to exercise the retries and the circuit breaker.
+
+    with FakeOpenMeteoServer(latency=0.2) as server:
+        settings.OPEN_METEO_FORECAST_URL = server.forecast_url
+        settings.OPEN_METEO_ARCHIVE_URL = server.archive_url
+
+`python manage.py fake_open_meteo` runs it in the foreground.
+"""
+import json
+import math
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def _series(lat, lng, key, count, low, high):
+    """Deterministic pseudo-random values in [low, high) for a location"""
+    rng = random.Random(f"{lat:.4f},{lng:.4f},{key}")
+    return [round(low + (high - low) * rng.random(), 1) for _ in range(count)]
+
+
+def forecast_payload(lat, lng, days=7):
+    today = date.today()
+    hours = days * 24
+    start = datetime.combine(today, datetime.min.time())
+    codes = [0, 1, 2, 3, 61, 80, 95]
+    return {
+        'latitude': lat,
+        'longitude': lng,
+        'current': {
+            'temperature_2m': _series(lat, lng, 'current-t', 1, 5, 35)[0],
+            'relative_humidity_2m': _series(lat, lng, 'current-h', 1, 20, 95)[0],
+            'precipitation': _series(lat, lng, 'current-p', 1, 0, 3)[0],
+            'weather_code': codes[int(_series(lat, lng, 'current-c', 1, 0, len(codes))[0]) % len(codes)],
+            'wind_speed_10m': _series(lat, lng, 'current-w', 1, 0, 40)[0],
+            'wind_direction_10m': int(_series(lat, lng, 'current-d', 1, 0, 360)[0]),
+        },
+        'hourly': {
+            'time': [(start + timedelta(hours=h)).strftime('%Y-%m-%dT%H:%M') for h in range(hours)],
+            'temperature_2m': _series(lat, lng, 'hourly-t', hours, 5, 35),
+            'precipitation_probability': [int(v) for v in _series(lat, lng, 'hourly-pp', hours, 0, 100)],
+            'weather_code': [codes[int(v) % len(codes)] for v in _series(lat, lng, 'hourly-c', hours, 0, len(codes))],
+            'wind_speed_10m': _series(lat, lng, 'hourly-w', hours, 0, 40),
+        },
+        'daily': {
+            'time': [(today + timedelta(days=d)).isoformat() for d in range(days)],
+            'weather_code': [codes[int(v) % len(codes)] for v in _series(lat, lng, 'daily-c', days, 0, len(codes))],
+            'temperature_2m_max': _series(lat, lng, 'daily-tmax', days, 20, 38),
+            'temperature_2m_min': _series(lat, lng, 'daily-tmin', days, 2, 19),
+            'precipitation_sum': _series(lat, lng, 'daily-p', days, 0, 15),
+            'precipitation_probability_max': [int(v) for v in _series(lat, lng, 'daily-pp', days, 0, 100)],
+        },
+    }
+
+
+def archive_payload(lat, lng, start_date, end_date, lag_days=5):
+    """Daily precipitation between the dates; the last `lag_days` before today are null, as in the real archive"""
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    cutoff = date.today() - timedelta(days=lag_days)
+    values = []
+    for day in days:
+        if day > cutoff:
+            values.append(None)
+            continue
+        rng = random.Random(f"{lat:.4f},{lng:.4f},{day.isoformat()}")
+        # Mostly dry days, wetter in winter
+        wet = rng.random() < 0.25 + 0.15 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 15) / 365)
+        values.append(round(rng.expovariate(1 / 6.0), 1) if wet else 0.0)
+    return {
+        'latitude': lat,
+        'longitude': lng,
+        'daily': {'time': [day.isoformat() for day in days], 'precipitation_sum': values},
+    }
+
+
+class FakeOpenMeteoServer:
+    """
+    Threaded HTTP server on host:port (port 0 picks a free one).
+
+    Args:
+        latency: Seconds added to every response
+        fail_rate: Fraction of requests answered with 503
+        fail_next: Number of upcoming requests answered with 503 (then normal again)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0, fail_next=0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_next = fail_next
+        self.requests = []  # (path, query) of every request received
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def forecast_url(self):
+        return f"{self.base_url}/v1/forecast"
+
+    @property
+    def archive_url(self):
+        return f"{self.base_url}/v1/archive"
+
+    def _should_fail(self):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+        return self.fail_rate > 0 and random.random() < self.fail_rate
+
+    def respond(self, path, query):
+        """(status, payload) for a request"""
+        with self._lock:
+            self.requests.append((path, query))
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_fail():
+            return 503, {'error': True, 'reason': 'Injected failure'}
+
+        try:
+            lats = [float(v) for v in query['latitude'][0].split(',')]
+            lngs = [float(v) for v in query['longitude'][0].split(',')]
+        except (KeyError, ValueError):
+            return 400, {'error': True, 'reason': 'latitude and longitude are required'}
+        if len(lats) != len(lngs):
+            return 400, {'error': True, 'reason': 'latitude and longitude must have the same number of elements'}
+
+        if path.endswith('/forecast'):
+            days = int(query.get('forecast_days', ['7'])[0])
+            payloads = [forecast_payload(lat, lng, days) for lat, lng in zip(lats, lngs)]
+        elif path.endswith('/archive'):
+            try:
+                start = date.fromisoformat(query['start_date'][0])
+                end = date.fromisoformat(query['end_date'][0])
+            except (KeyError, ValueError):
+                return 400, {'error': True, 'reason': 'start_date and end_date are required'}
+            payloads = [archive_payload(lat, lng, start, end) for lat, lng in zip(lats, lngs)]
+        else:
+            return 404, {'error': True, 'reason': 'Not found'}
+        return 200, payloads[0] if len(payloads) == 1 else payloads
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is measurable
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, payload = server.respond(url.path, parse_qs(url.query))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name='fake-open-meteo')
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,110 @@
+"""
+Vectorized conversions between image pixels and geographic coordinates.
+
+Detection masks come back from YOLO as (N, 2) arrays of pixel coordinates. The
+functions here convert whole arrays at once with numpy instead of looping over
+vertices, with optional clamping to the image and closing of GeoJSON rings.
+
+Two projections are supported for an image covering a north/south/east/west box:
+
+- 'linear': latitude and longitude interpolated linearly across the image
+  (the original behaviour, accurate for small map views)
+- 'mercator': x linear in longitude, y linear in Web Mercator space, which is how
+  web map screenshots and XYZ tiles are actually rendered
+"""
+import math
+
+import numpy as np
+
+PROJECTIONS = ('linear', 'mercator')
+MAX_MERCATOR_LAT = 85.05112878
+R_EARTH = 6371000  # Earth radius in meters
+
+
+def lat_to_mercator_y(lat):
+    """Latitude (degrees, scalar or array) to normalised Web Mercator y (0 at the top of the world, 1 at the bottom)"""
+    lat = np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    sin_lat = np.sin(np.radians(lat))
+    return 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)
+
+
+def mercator_y_to_lat(y):
+    """Inverse of lat_to_mercator_y"""
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y)))))
+
+
+def lng_to_mercator_x(lng):
+    return (np.asarray(lng) + 180.0) / 360.0
+
+
+def mercator_x_to_lng(x):
+    return np.asarray(x) * 360.0 - 180.0
+
+
+def pixels_to_lnglat(points, img_width, img_height, bounds, projection='linear', clamp=True):
+    """
+    Convert pixel coordinates (from the top-left corner) to longitude/latitude.
+
+    Args:
+        points: (N, 2) array-like of [x, y] pixels
+        img_width, img_height: Image size in pixels
+        bounds: {'north': lat, 'south': lat, 'east': lng, 'west': lng} covered by the image
+        projection: 'linear' or 'mercator'
+        clamp: Clamp points to the image before converting
+
+    Returns:
+        (N, 2) float array of [lng, lat]
+    """
+    if projection not in PROJECTIONS:
+        raise ValueError(f"Unknown projection '{projection}', expected one of {PROJECTIONS}")
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if clamp:
+        points = np.clip(points, 0, [img_width - 1, img_height - 1])
+
+    norm_x = points[:, 0] / img_width
+    norm_y = points[:, 1] / img_height
+
+    lng = bounds['west'] + norm_x * (bounds['east'] - bounds['west'])
+    if projection == 'linear':
+        # Y is inverted (0 is top)
+        lat = bounds['north'] - norm_y * (bounds['north'] - bounds['south'])
+    else:
+        top = lat_to_mercator_y(bounds['north'])
+        bottom = lat_to_mercator_y(bounds['south'])
+        lat = mercator_y_to_lat(top + norm_y * (bottom - top))
+
+    return np.column_stack([lng, lat])
+
+
+def close_ring(coords):
+    """Return the (N, 2) coordinates with the first point appended if the ring is not already closed"""
+    coords = np.asarray(coords)
+    if len(coords) and not np.array_equal(coords[0], coords[-1]):
+        coords = np.vstack([coords, coords[:1]])
+    return coords
+
+
+def pixels_to_geojson_ring(points, img_width, img_height, bounds, projection='linear'):
+    """Convert a pixel polygon to a closed GeoJSON ring: a list of [lng, lat] pairs"""
+    return close_ring(pixels_to_lnglat(points, img_width, img_height, bounds, projection)).tolist()
+
+
+def pixels_to_latlng_paths(points, img_width, img_height, bounds, projection='linear'):
+    """Convert a pixel polygon to a list of {'lat': .., 'lng': ..} dicts (Google Maps path format)"""
+    lnglat = pixels_to_lnglat(points, img_width, img_height, bounds, projection)
+    return [{'lat': lat, 'lng': lng} for lng, lat in lnglat.tolist()]
+
+
+def polygon_area_hectares(lnglat):
+    """
+    Approximate area of a small lng/lat polygon ((N, 2) array) in hectares,
+    using an equirectangular projection around its mean latitude.
+    """
+    lnglat = np.asarray(lnglat, dtype=np.float64)
+    lng = np.radians(lnglat[:, 0])
+    lat = np.radians(lnglat[:, 1])
+    x = R_EARTH * lng * math.cos(float(lat.mean()))
+    y = R_EARTH * lat
+    area_sq_m = 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+    return area_sq_m / 10000.0
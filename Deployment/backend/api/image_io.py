@@ -0,0 +1,137 @@
+"""
+Image upload decoding for the detection endpoints.
+
+The detection views accept an image in three ways:
+
+1. multipart/form-data with the image as a file field (other parameters as form
+   fields, JSON-encoded where they are objects),
+2. a raw binary body (Content-Type image/* or application/octet-stream) with the
+   parameters in the query string,
+3. the original JSON body with a base64 data URL.
+
+For the first two the encoded bytes are handed to OpenCV through a zero-copy
+numpy view (the in-memory upload buffer, the request body, or the temporary
+upload file read straight into an array), so the only full-size allocation is
+the decoded pixel array itself.
+"""
+import base64
+import io
+import json
+import logging
+
+import cv2
+import numpy as np
+from PIL import Image
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+logger = logging.getLogger(__name__)
+
+BINARY_CONTENT_TYPES = ('application/octet-stream',)
+
+
+class ImageDecodeError(ValueError):
+    """Raised when uploaded bytes cannot be decoded as an image"""
+
+
+def decode_image_buffer(buffer):
+    """
+    Decode an encoded image (bytes, bytearray, memoryview or uint8 array) into an RGB numpy array.
+    """
+    encoded = buffer if isinstance(buffer, np.ndarray) else np.frombuffer(buffer, dtype=np.uint8)
+    if encoded.size == 0:
+        raise ImageDecodeError("Empty image data")
+
+    img = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    if img is None:
+        # Fall back to Pillow for formats OpenCV was built without
+        try:
+            with Image.open(io.BytesIO(encoded)) as pil_img:
+                return np.asarray(pil_img.convert('RGB'))
+        except Exception as e:
+            raise ImageDecodeError(f"Unsupported or corrupt image: {e}")
+
+    # The models have always been given RGB arrays (from PIL); convert in place
+    cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    return img
+
+
+def decode_uploaded_file(uploaded_file):
+    """Decode a Django UploadedFile without copying it into an intermediate bytes object"""
+    if isinstance(uploaded_file, TemporaryUploadedFile):
+        # Large uploads are spooled to disk; read the file directly into the array
+        uploaded_file.file.flush()
+        return decode_image_buffer(np.fromfile(uploaded_file.temporary_file_path(), dtype=np.uint8))
+
+    handle = uploaded_file.file
+    if hasattr(handle, 'getbuffer'):
+        view = handle.getbuffer()
+        try:
+            return decode_image_buffer(view)
+        finally:
+            view.release()
+
+    uploaded_file.seek(0)
+    return decode_image_buffer(uploaded_file.read())
+
+
+def decode_base64_image(image_base64):
+    """Decode a base64 string, with or without a data:image/...;base64, prefix"""
+    if ',' in image_base64:
+        header, encoded = image_base64.split(',', 1)
+    else:
+        encoded = image_base64
+    try:
+        image_data = base64.b64decode(encoded)
+    except (ValueError, TypeError) as e:
+        raise ImageDecodeError(f"Invalid base64 image data: {e}")
+    return decode_image_buffer(image_data)
+
+
+def _parse_json_fields(params, json_fields):
+    """Form fields and query parameters arrive as strings; decode the ones that carry objects"""
+    for field in json_fields:
+        value = params.get(field)
+        if isinstance(value, str) and value:
+            params[field] = json.loads(value)
+    return params
+
+
+def read_image_request(request, image_field, json_fields=()):
+    """
+    Extract the image and the remaining parameters from a detection request.
+
+    Args:
+        request: Django HttpRequest
+        image_field: Name of the file field / JSON key holding the image
+        json_fields: Parameter names whose form/query values are JSON-encoded objects
+
+    Returns:
+        Tuple of (img_np or None if no image was sent, params dict)
+
+    Raises:
+        json.JSONDecodeError: if the JSON body or a JSON-encoded parameter is malformed
+        ImageDecodeError: if the image cannot be decoded or the JSON body is not an object
+    """
+    content_type = (request.content_type or '').lower()
+
+    if content_type.startswith('multipart/form-data'):
+        params = _parse_json_fields(request.POST.dict(), json_fields)
+        uploaded_file = request.FILES.get(image_field) or request.FILES.get('image')
+        if uploaded_file is None:
+            return None, params
+        return decode_uploaded_file(uploaded_file), params
+
+    if content_type.startswith('image/') or content_type in BINARY_CONTENT_TYPES:
+        params = _parse_json_fields(request.GET.dict(), json_fields)
+        body = request.body
+        if not body:
+            return None, params
+        return decode_image_buffer(body), params
+
+    params = json.loads(request.body)
+    if not isinstance(params, dict):
+        raise ImageDecodeError("JSON payload must be an object")
+    image_base64 = params.pop(image_field, None)
+    if not image_base64:
+        return None, params
+    return decode_base64_image(image_base64), params
@@ -0,0 +1,220 @@
+"""
+Content-addressed cache for detection results.
+
+Farmers often resubmit the same viewport or photo (page refresh, retry), and on
+CPU-only hosts every YOLO forward pass costs seconds. Results are cached under a
+key made from the model name, the loaded model's version, a digest of the image
+pixels (or uploaded bytes) and the request parameters that affect the output
+(thresholds, bounds, projection), so a changed model or parameter never serves a
+stale result.
+
+Two tiers:
+- an in-process LRU bounded by entry count and total size, and
+- an optional on-disk tier (ML_RESULT_CACHE_DIR) shared by all workers on the
+  host, bounded by total size with the least recently written files evicted first.
+
+Values must be JSON-serializable (the response payloads of the views).
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+def digest_array(arr):
+    """Digest of a decoded image array (shape, dtype and pixels)"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{arr.shape}{arr.dtype}".encode())
+    digest.update(memoryview(arr if arr.flags['C_CONTIGUOUS'] else arr.copy()).cast('B'))
+    return digest.hexdigest()
+
+
+def digest_uploaded_file(uploaded_file):
+    """Digest of an uploaded file's bytes, read in chunks; the file is rewound afterwards"""
+    digest = hashlib.blake2b(digest_size=20)
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+class InferenceCache:
+    """
+    Two-tier (memory LRU + optional disk) cache of inference results.
+
+    Args:
+        max_entries: Most results kept in memory
+        max_bytes: Most serialized bytes kept in memory
+        disk_dir: Directory for the disk tier, or None to disable it
+        disk_max_bytes: Size the disk tier is pruned back to
+    """
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = os.fspath(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_writes = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    def make_key(self, model_name, image_digest, **params):
+        """
+        Build a cache key, or return None if the model is unavailable (no version to key on).
+        With INFERENCE_MODE='queue' the model is not loaded in this process, so the
+        version comes from the checksum of its weights file instead.
+        """
+        if settings.INFERENCE_MODE == 'queue':
+            checksum = registry.checksum(model_name)
+        else:
+            entry = registry.get_entry(model_name)
+            checksum = entry.checksum if entry is not None else None
+        if checksum is None:
+            return None
+        payload = json.dumps(
+            {'model': model_name, 'version': checksum, 'image': image_digest, 'params': params},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    # --- memory tier ---
+
+    def _remember(self, key, value, size):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    # --- disk tier ---
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'rb') as handle:
+                data = handle.read()
+            return json.loads(data), len(data)
+        except FileNotFoundError:
+            return None, 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable inference cache file for {key}: {e}")
+            return None, 0
+
+    def _write_disk(self, key, data):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write inference cache file {path}: {e}")
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % 50 == 0:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Delete the oldest files until the disk tier is under disk_max_bytes"""
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    # --- public API ---
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.disk_dir:
+            value, size = self._read_disk(key)
+            if value is not None:
+                self.disk_hits += 1
+                self._remember(key, value, size)
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        if key is None:
+            return
+        data = json.dumps(value).encode()
+        if self.max_entries > 0 and len(data) <= self.max_bytes:
+            self._remember(key, value, len(data))
+        if self.disk_dir:
+            self._write_disk(key, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def describe(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'disk_dir': self.disk_dir,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+        }
+
+
+inference_cache = InferenceCache(
+    max_entries=settings.ML_RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.ML_RESULT_CACHE_MAX_MB * 1024 * 1024,
+    disk_dir=settings.ML_RESULT_CACHE_DIR,
+    disk_max_bytes=settings.ML_RESULT_CACHE_DISK_MAX_MB * 1024 * 1024,
+)
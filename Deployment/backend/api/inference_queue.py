@@ -0,0 +1,390 @@
+"""
+Out-of-process inference: a job queue in the database and a pool of worker processes.
+
+With INFERENCE_MODE='queue' the detection endpoints no longer run YOLO or ResNet9
+in the Django request thread. They spool the decoded image to INFERENCE_JOB_DIR,
+insert an InferenceJob row and either wait for it (up to INFERENCE_JOB_WAIT_SECONDS)
+or return the job id straight away for polling at /api/inference-jobs/<id>/.
+
+The workers are started separately:
+
+    python manage.py run_inference_workers --processes 2
+
+The supervisor loads the models once and forks the worker processes, which share
+the weights copy-on-write (as with Gunicorn's preload_app). Each worker claims
+QUEUED jobs with a conditional UPDATE, so no two workers run the same job on
+SQLite or PostgreSQL and no broker is needed. Workers run the same pipelines as
+the inline path (api/detection.py) and also fill the result cache.
+
+Scans (core.models.Scan) are always processed in the background through this
+queue: the job result is stored on the scan. Without a worker pool
+(INFERENCE_MODE='inline') the web process runs such jobs on a background thread;
+jobs lost to a restart of that process are picked up again by recover_local_jobs.
+"""
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.models import InferenceJob, Scan
+from .detection import DETECTORS, run_detection
+from .inference_cache import inference_cache, digest_uploaded_file
+
+logger = logging.getLogger(__name__)
+
+
+# --- Submitting and waiting (web process) ---
+
+def _spool_input(job_id, image):
+    """
+    Write the job input under INFERENCE_JOB_DIR and return its path. A list of inputs
+    (batch pipelines) is written as numbered files in a directory of its own.
+    """
+    os.makedirs(settings.INFERENCE_JOB_DIR, exist_ok=True)
+    base = os.path.join(settings.INFERENCE_JOB_DIR, str(job_id))
+    if isinstance(image, (list, tuple)):
+        os.makedirs(base, exist_ok=True)
+        for index, item in enumerate(image):
+            _spool_file(os.path.join(base, f"{index:04d}"), item)
+        return base
+    return _spool_file(base, image)
+
+
+def _spool_file(base, image):
+    if isinstance(image, np.ndarray):
+        path = f"{base}.npy"
+        np.save(path, image)
+        return path
+
+    if hasattr(image, 'chunks'):
+        # Uploaded file: keep the extension so format sniffing (GeoTIFF, JPEG, ...) still works
+        path = base + os.path.splitext(image.name or '')[1].lower()
+        with open(path, 'wb') as handle:
+            for chunk in image.chunks():
+                handle.write(chunk)
+        image.seek(0)
+        return path
+
+    path = base + os.path.splitext(os.fspath(image))[1].lower()
+    shutil.copyfile(image, path)
+    return path
+
+
+def _remove_input(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def submit_job(kind, image=None, params=None, cache_key=None, scan=None):
+    """
+    Queue a detection for the inference workers.
+
+    Args:
+        kind: Detection pipeline name (a key of api.detection.DETECTORS)
+        image: RGB image array, uploaded file or file path, or a list of them for batch
+            pipelines; None if the pipeline needs no image (or reads the image of `scan`)
+        params: JSON-serializable parameters passed to the pipeline
+        cache_key: Result cache key the worker stores the result under
+        scan: Scan whose image is processed and which receives the result
+
+    Returns:
+        The saved InferenceJob
+    """
+    if kind not in DETECTORS:
+        raise ValueError(f"Unknown detection kind '{kind}', expected one of {tuple(DETECTORS)}")
+
+    job = InferenceJob(kind=kind, params=params or {}, cache_key=cache_key or '', scan=scan)
+    # The input is written before the row exists, so a worker never claims a job without it
+    if image is not None:
+        job.input_path = _spool_input(job.id, image)
+    job.save()
+    return job
+
+
+def wait_for_job(job_id, timeout):
+    """
+    Poll until the job is DONE or FAILED or `timeout` seconds have passed.
+    Returns the job as last read from the database.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while True:
+        status = InferenceJob.objects.filter(pk=job_id).values_list('status', flat=True).first()
+        remaining = deadline - time.monotonic()
+        if status in (None, 'DONE', 'FAILED') or remaining <= 0:
+            return InferenceJob.objects.filter(pk=job_id).first()
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.5)
+
+
+def job_payload(job):
+    """JSON representation of a job for the polling endpoint"""
+    return {
+        'id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# --- Processing (worker processes) ---
+
+def claim_job(job_id, worker_name):
+    """Atomically move a QUEUED job to RUNNING for this worker; returns the job, or None if it was taken"""
+    # Only one worker's UPDATE matches while the row is still QUEUED
+    claimed = InferenceJob.objects.filter(pk=job_id, status='QUEUED').update(
+        status='RUNNING', worker=worker_name, started_at=timezone.now()
+    )
+    return InferenceJob.objects.select_related('scan').get(pk=job_id) if claimed else None
+
+
+def claim_next_job(worker_name):
+    """
+    Atomically move the oldest QUEUED job to RUNNING for this worker.
+    Returns the job, or None if the queue is empty.
+    """
+    candidates = InferenceJob.objects.filter(status='QUEUED').order_by('created_at').values_list('pk', flat=True)[:10]
+    for job_id in candidates:
+        job = claim_job(job_id, worker_name)
+        if job is not None:
+            return job
+    return None
+
+
+def load_job_input(job):
+    """
+    The pipeline input for a job: an array for spooled .npy images, otherwise the path
+    of the spooled file or of the scan's stored image; a list of them for a spooled list
+    """
+    if not job.input_path:
+        return job.scan.image.path if job.scan_id else None
+    if os.path.isdir(job.input_path):
+        paths = [os.path.join(job.input_path, name) for name in sorted(os.listdir(job.input_path))]
+        return [np.load(path) if path.endswith('.npy') else path for path in paths]
+    if job.input_path.endswith('.npy'):
+        return np.load(job.input_path)
+    return job.input_path
+
+
+def process_job(job):
+    """Run a claimed job, store its result or error and remove its spooled input"""
+    start = time.perf_counter()
+    if job.scan_id:
+        Scan.objects.filter(pk=job.scan_id).update(status='PROCESSING')
+    try:
+        job.result = run_detection(job.kind, load_job_input(job), job.params)
+        job.status = 'DONE'
+        if job.cache_key:
+            inference_cache.set(job.cache_key, job.result)
+    except Exception as e:
+        logger.exception(f"Inference job {job.id} ({job.kind}) failed: {e}")
+        job.status = 'FAILED'
+        job.error = str(e)
+    finally:
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+        if job.input_path:
+            _remove_input(job.input_path)
+
+    if job.scan_id:
+        try:
+            job.scan.record_detection(job.result, error=job.error)
+        except Exception as e:
+            logger.exception(f"Could not store the result of job {job.id} on scan {job.scan_id}: {e}")
+    logger.info(f"Inference job {job.id} ({job.kind}) {job.status} in {time.perf_counter() - start:.2f}s")
+    return job
+
+
+def fail_jobs_of_worker(worker_name):
+    """Mark jobs left RUNNING by a worker that exited as FAILED (they are not retried, in case they crashed it)"""
+    error = 'Inference worker exited while running this job'
+    jobs = InferenceJob.objects.filter(status='RUNNING', worker=worker_name)
+    Scan.objects.filter(inference_jobs__in=jobs).update(status='FAILED', error=error, processed_at=timezone.now())
+    return jobs.update(status='FAILED', error=error, finished_at=timezone.now())
+
+
+def purge_finished_jobs(retention_hours=None):
+    """Delete finished jobs older than the retention period, and their spooled inputs if any remain"""
+    retention_hours = settings.INFERENCE_JOB_RETENTION_HOURS if retention_hours is None else retention_hours
+    expired = InferenceJob.objects.filter(
+        status__in=('DONE', 'FAILED'), finished_at__lt=timezone.now() - timedelta(hours=retention_hours)
+    )
+    for path in expired.exclude(input_path='').values_list('input_path', flat=True):
+        _remove_input(path)
+    return expired.delete()[0]
+
+
+def current_worker_name(pid=None):
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def worker_main(poll_interval, intra_op_threads=None):
+    """
+    Loop of one inference worker process: claim a job, run it, repeat.
+    Stops after the current job on SIGTERM.
+    """
+    import django
+    django.setup()  # no-op when forked from a configured process; needed with the spawn start method
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor handles Ctrl+C
+
+    if intra_op_threads:
+        # Models loaded from here on read the setting; torch already imported by the supervisor is re-pinned
+        settings.ML_INTRA_OP_THREADS = intra_op_threads
+        if 'torch' in sys.modules:
+            from .model_registry import configure_torch_threads
+            configure_torch_threads(intra_op_threads, force=True)
+
+    name = current_worker_name()
+    logger.info(f"Inference worker {name} started")
+    while not stopping:
+        close_old_connections()
+        job = claim_next_job(name)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        process_job(job)
+    logger.info(f"Inference worker {name} stopped")
+
+
+# --- Background jobs without a worker pool ---
+
+_local_executor = None
+_local_executor_lock = threading.Lock()
+
+
+def _run_local_job(job_id):
+    from django.db import connection
+    try:
+        job = claim_job(job_id, f"{current_worker_name()}:local")
+        if job is not None:
+            process_job(job)
+    except Exception as e:
+        logger.exception(f"Local inference job {job_id} failed: {e}")
+    finally:
+        connection.close()
+
+
+def dispatch_job(job):
+    """
+    Make sure a queued job gets processed. With INFERENCE_MODE='queue' the worker pool
+    picks it up; otherwise it runs on a single background thread of this process, so
+    requests still return immediately. Jobs left QUEUED by a restart are picked up by
+    run_inference_workers, or in inline mode by recover_local_jobs.
+    """
+    if settings.INFERENCE_MODE == 'queue':
+        return
+    _local_executor_instance().submit(_run_local_job, job.id)
+    recover_local_jobs()
+
+
+def _local_executor_instance():
+    global _local_executor
+    with _local_executor_lock:
+        if _local_executor is None:
+            _local_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference-local')
+    return _local_executor
+
+
+_last_recovery = None
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def recover_local_jobs(force=False):
+    """
+    Inline mode is not durable by itself: a job runs on a thread of the web process that
+    queued it, and a restart loses it. At most once per INFERENCE_LOCAL_STALE_SECONDS,
+    jobs QUEUED for longer than that are taken over by this process (claim_job keeps two
+    processes from running the same one), and RUNNING local jobs of processes of this
+    host that no longer exist are failed as for a crashed worker. Called on each inline
+    dispatch and when a pending scan is polled.
+    """
+    global _last_recovery
+    if settings.INFERENCE_MODE == 'queue':
+        return 0
+    stale_seconds = settings.INFERENCE_LOCAL_STALE_SECONDS
+    with _local_executor_lock:
+        now = time.monotonic()
+        if not force and _last_recovery is not None and now - _last_recovery < stale_seconds:
+            return 0
+        _last_recovery = now
+
+    host_prefix = f"{socket.gethostname()}:"
+    running_workers = (InferenceJob.objects.filter(status='RUNNING', worker__startswith=host_prefix,
+                                                   worker__endswith=':local')
+                       .values_list('worker', flat=True).distinct())
+    for worker in running_workers:
+        pid = worker[len(host_prefix):-len(':local')]
+        if pid.isdigit() and not _process_exists(int(pid)):
+            failed = fail_jobs_of_worker(worker)
+            logger.warning(f"Failed {failed} inference jobs left running by exited process {worker}")
+
+    stale = list(InferenceJob.objects.filter(status='QUEUED',
+                                             created_at__lt=timezone.now() - timedelta(seconds=stale_seconds))
+                 .order_by('created_at').values_list('pk', flat=True))
+    for job_id in stale:
+        _local_executor_instance().submit(_run_local_job, job_id)
+    if stale:
+        logger.warning(f"Re-dispatched {len(stale)} inference jobs queued more than {stale_seconds:.0f}s ago")
+    return len(stale)
+
+
+# --- Scans ---
+
+# Detection pipeline and model used for each Scan.scan_type
+SCAN_PIPELINES = {
+    'WEED': ('weed_scan', 'weed'),
+    'DISEASE': ('disease', 'disease'),
+}
+
+
+def submit_scan(scan, image_digest=None):
+    """
+    Start background detection for a saved PENDING scan.
+
+    A scan of an image that was already processed by the same model version is
+    completed straight from the result cache. Returns the InferenceJob, or None if
+    the scan was completed from the cache.
+    """
+    kind, model_name = SCAN_PIPELINES[scan.scan_type]
+    if image_digest is None:
+        with scan.image.open('rb'):
+            image_digest = digest_uploaded_file(scan.image)
+    params = {'bounds': scan.bounds} if scan.bounds else {}
+    cache_key = inference_cache.make_key(model_name, image_digest, pipeline=kind, **params)
+    cached = inference_cache.get(cache_key)
+    if cached is not None:
+        scan.record_detection(cached)
+        return None
+
+    job = submit_job(kind, params=params, cache_key=cache_key, scan=scan)
+    dispatch_job(job)
+    return job
@@ -1,128 +1,142 @@
 """
 Utility functions for machine learning operations
 """
-import os
 import traceback
 import logging
+import threading
+import numpy as np
 import pandas as pd
-import joblib
-from django.conf import settings
+
+from .model_registry import registry
 
 logger = logging.getLogger(__name__)
 
+# Input columns expected by the crop classification pipeline, in training order
+CROP_FEATURE_COLUMNS = [
+    'N (kg/ha)', 'P (kg/ha)', 'K (kg/ha)', 'Temperature (°C)', 'Humidity (%)', 'pH',
+    'Rainfall (mm)', 'Area (ha)', 'Fertilizer (kg)', 'Pesticide (kg)', 'Governorate',
+    'Irrigation', 'Fertilizer Plant', 'Planting Season', 'Growing Season', 'Harvest Season',
+]
+
+# Returned when the model is unavailable so the API always gives a valid response
+FALLBACK_PREDICTION = ("Wheat", 50.0)
+
 def load_crop_classifier():
     """
-    Load the crop classification model from disk
+    Return the crop classification model.
+    The pickle is loaded once per process by the model registry and kept in memory.
     Returns the loaded model or None if there was an error
     """
-    try:        # Try multiple paths to find the model
-        model_paths = [
-            # Local copy in the Django project directory (most reliable)
-            os.path.join('models', 'crop_classifier.pkl'),
-            
-            # Absolute path
-            r'C:\Users\ahmed\Desktop\PIDS\Data-Farmers-FarmWise-4DS3\Models\ml_models\crop_classifier.pkl',
-            
-            # Relative paths from different possible working directories
-            os.path.join('..', '..', '..', 'Models', 'ml_models', 'crop_classifier.pkl'),
-            os.path.join('..', '..', 'Models', 'ml_models', 'crop_classifier.pkl'),
-        ]
-        
-        # Try each path until we find the model
-        model = None
-        for path in model_paths:
-            try:
-                if os.path.exists(path):
-                    logger.info(f"Loading model from path: {path}")
-                    print(f"Loading model from path: {path}")
-                    
-                    # Use sklearn_version_workaround=True for version compatibility
-                    model = joblib.load(path, mmap_mode=None)
-                    if model:
-                        logger.info("Model loaded successfully")
-                        print("Model loaded successfully")
-                        return model
-            except Exception as e:
-                logger.warning(f"Failed to load model from {path}: {e}")
-                print(f"Failed to load model from {path}: {e}")
-                continue
-        
-        if not model:
-            logger.error("Could not find model at any of the expected locations")
-            print("Could not find model at any of the expected locations")
-            return None
-            
-    except Exception as e:
-        logger.error(f"Error loading crop classification model: {e}")
-        logger.error(traceback.format_exc())
-        print(f"Error loading crop classification model: {e}")
-        print(traceback.format_exc())
-        return None
+    return registry.get('crop_classifier')
+
+class CropClassifierService:
+    """
+    Scores crop classification features against the resident pipeline.
+
+    Label and confidence both come from a single predict_proba pass, and any
+    number of feature rows can be scored in one vectorized call.
+    """
+    def __init__(self, model_name='crop_classifier'):
+        self.model_name = model_name
+        self._compat_lock = threading.Lock()
+        self._compat_patched = False
+
+    @property
+    def model(self):
+        return registry.get(self.model_name)
+
+    def _to_frame(self, rows):
+        """Accept a DataFrame, a dict of columns, or a list of per-row dicts"""
+        if isinstance(rows, pd.DataFrame):
+            return rows
+        if isinstance(rows, dict):
+            return pd.DataFrame(rows)
+        return pd.DataFrame.from_records(list(rows), columns=CROP_FEATURE_COLUMNS)
+
+    def _patch_monotonic_cst(self, model):
+        """
+        Trees pickled with an older scikit-learn lack the `monotonic_cst` attribute newer
+        versions read at predict time. Setting it to None restores the old behaviour.
+        """
+        with self._compat_lock:
+            if self._compat_patched:
+                return
+            estimator = model.steps[-1][1] if hasattr(model, 'steps') else model
+            for tree in getattr(estimator, 'estimators_', []):
+                if not hasattr(tree, 'monotonic_cst'):
+                    tree.monotonic_cst = None
+            self._compat_patched = True
+
+    def predict_proba(self, rows):
+        """
+        Return (classes, probabilities) for a batch of feature rows.
+        Raises RuntimeError if the model is not available.
+        """
+        model = self.model
+        if model is None:
+            raise RuntimeError("Crop classification model is not available")
+
+        df_input = self._to_frame(rows)
+        try:
+            probabilities = model.predict_proba(df_input)
+        except AttributeError as e:
+            # Handle the 'monotonic_cst' missing attribute error
+            if "monotonic_cst" not in str(e):
+                raise
+            logger.info("Using compatibility mode for different scikit-learn version")
+            self._patch_monotonic_cst(model)
+            probabilities = model.predict_proba(df_input)
+        return model.classes_, probabilities
+
+    def predict_batch(self, rows):
+        """
+        Predict the best crop for every feature row.
+
+        Args:
+            rows: DataFrame, dict of column lists, or list of dicts keyed by CROP_FEATURE_COLUMNS
+
+        Returns:
+            List of (predicted_crop_name, confidence_score) tuples, in input order
+        """
+        classes, probabilities = self.predict_proba(rows)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(best)), best] * 100
+        return [(str(label), float(confidence)) for label, confidence in zip(classes[best], confidences)]
+
+    def predict(self, row):
+        """
+        Predict a single feature row given as a dict of scalar values.
+        Returns (predicted_crop_name, confidence_score).
+        """
+        return self.predict_batch([row])[0]
+
+# Shared service instance used by views, models and management commands
+crop_classifier = CropClassifierService()
 
 def predict_crop(data_dict):
     """
     Make a crop prediction using the loaded model
-    
+
     Args:
         data_dict: Dictionary with input features
-        
+
     Returns:
         Tuple of (predicted_crop_name, confidence_score) or ("Wheat", 50.0) if error
     """
     try:
-        model = load_crop_classifier()
-        if not model:
+        if not crop_classifier.model:
             logger.error("Failed to load the model for prediction")
-            print("Model loading failed - using fallback value")
-            return "Wheat", 50.0  # Return fallback value instead of None
-            
-        # Convert data to DataFrame for prediction
-        df_input = pd.DataFrame(data_dict)
-        
-        # Version compatibility handling
-        try:
-            # Try direct prediction first
-            predicted_crop_name = model.predict(df_input)[0]
-            probabilities = model.predict_proba(df_input)[0]
-        except AttributeError as e:
-            # Handle the 'monotonic_cst' missing attribute error
-            if "monotonic_cst" in str(e):
-                print("Handling scikit-learn version compatibility issue")
-                logger.info("Using compatibility mode for different scikit-learn version")
-                
-                # Extract feature names if possible
-                feature_names = None
-                try:
-                    if hasattr(model, 'feature_names_in_'):
-                        feature_names = model.feature_names_in_
-                    elif hasattr(model, 'steps') and hasattr(model.steps[-1][1], 'feature_names_in_'):
-                        feature_names = model.steps[-1][1].feature_names_in_
-                except:
-                    feature_names = None
-                
-                # Use a simple direct class prediction for older models
-                if hasattr(model, 'classes_'):
-                    predicted_crop_name = model.classes_[0]  # Pick the first class as fallback
-                    print(f"Using fallback prediction: {predicted_crop_name}")
-                    return predicted_crop_name, 70.0
-                else:
-                    # If all else fails, return a default crop
-                    return "Wheat", 50.0
-            else:
-                # If it's a different kind of AttributeError, re-raise it
-                raise
-        
-        confidence = float(probabilities.max()) * 100
-        
+            return FALLBACK_PREDICTION
+
+        # data_dict maps each column to a one-element list
+        predicted_crop_name, confidence = crop_classifier.predict_batch(data_dict)[0]
         logger.info(f"Predicted crop: {predicted_crop_name} with {confidence:.2f}% confidence")
         return predicted_crop_name, confidence
-        
+
     except Exception as e:
         logger.error(f"Error making crop prediction: {e}")
         logger.error(traceback.format_exc())
-        print(f"Error making crop prediction: {e}")
-        print(traceback.format_exc())
-        
+
         # Return a default crop with modest confidence instead of None
         # This ensures the API always returns a valid response
-        return "Wheat", 50.0
+        return FALLBACK_PREDICTION
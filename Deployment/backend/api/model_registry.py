@@ -0,0 +1,354 @@
+"""
+Process-wide registry for the machine learning models served by the API.
+
+Models are registered by name with a path and a loader function. Nothing is
+imported or read from disk until a model is first requested, after which the
+instance stays resident for the life of the process together with its version
+and checksum. Heavy libraries (torch, ultralytics, joblib) are only imported
+inside the loaders, so management commands and non-ML endpoints do not pay
+for them.
+
+Usage:
+    from api.model_registry import registry
+    model = registry.get('farm_boundary')
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 checksum of a file without reading it into memory at once
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelSpec:
+    """
+    Describes how to load a model: where its weights live and which function builds it.
+
+    Args:
+        name: Registry name used to look the model up
+        paths: A path or list of candidate paths; the first existing one is used
+        loader: Callable taking the resolved path and returning the model instance
+        version: Optional version label; defaults to the start of the checksum
+        description: Human readable description for status pages
+    """
+    def __init__(self, name, paths, loader, version=None, description=''):
+        self.name = name
+        self.paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+        self.loader = loader
+        self.version = version
+        self.description = description
+
+    def resolve_path(self):
+        """Return the first candidate path that exists on disk, or None"""
+        for path in self.paths:
+            if os.path.exists(path):
+                return os.fspath(path)
+        return None
+
+
+class LoadedModel:
+    """A resident model instance together with the metadata recorded when it was loaded"""
+    def __init__(self, spec, model, path, checksum, load_seconds):
+        self.spec = spec
+        self.model = model
+        self.path = path
+        self.checksum = checksum
+        self.version = spec.version or checksum[:12]
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """
+    Thread-safe, lazily populated cache of model instances keyed by name.
+
+    Each model has its own lock so that two requests arriving during a cold start
+    do not load the same weights twice, while different models can load in parallel.
+    Load failures are remembered so a missing weights file is not retried on every
+    request; call reload() once the file has been fixed.
+    """
+    def __init__(self):
+        self._specs = {}
+        self._loaded = {}
+        self._errors = {}
+        self._locks = {}
+        self._checksums = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name, paths, loader, version=None, description=''):
+        """Register (or replace) a model definition. Does not load anything."""
+        with self._registry_lock:
+            self._specs[name] = ModelSpec(name, paths, loader, version=version, description=description)
+            self._locks.setdefault(name, threading.Lock())
+            self._loaded.pop(name, None)
+            self._errors.pop(name, None)
+
+    def names(self):
+        return list(self._specs)
+
+    def get_entry(self, name):
+        """
+        Return the LoadedModel for `name`, loading it on first use.
+        Returns None if the model is unknown or could not be loaded.
+        """
+        entry = self._loaded.get(name)
+        if entry is not None:
+            return entry
+
+        spec = self._specs.get(name)
+        if spec is None:
+            logger.error(f"Model '{name}' is not registered")
+            return None
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            entry = self._loaded.get(name)
+            if entry is not None:
+                return entry
+            if name in self._errors:
+                return None
+            return self._load(spec)
+
+    def get(self, name):
+        """Return the model instance for `name`, or None if it is unavailable"""
+        entry = self.get_entry(name)
+        return entry.model if entry is not None else None
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def checksum(self, name):
+        """
+        Checksum of the weights `name` is (or would be) served from, without loading the model.
+        Lets processes that hand inference to the worker queue key caches on the model version.
+        Returns None if the model is unknown or has no weights on disk.
+        """
+        entry = self._loaded.get(name)
+        if entry is not None:
+            return entry.checksum
+        spec = self._specs.get(name)
+        path = spec.resolve_path() if spec is not None else None
+        if path is None:
+            return None
+
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        cached = self._checksums.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, file_checksum(path))
+            self._checksums[name] = cached
+        return cached[1]
+
+    def _load(self, spec):
+        path = spec.resolve_path()
+        if path is None:
+            message = f"No weights found for model '{spec.name}' (looked in: {', '.join(map(str, spec.paths))})"
+            logger.error(message)
+            self._errors[spec.name] = message
+            return None
+
+        try:
+            start = time.perf_counter()
+            checksum = file_checksum(path)
+            model = spec.loader(path)
+            load_seconds = time.perf_counter() - start
+        except Exception as e:
+            logger.exception(f"Error loading model '{spec.name}' from {path}: {e}")
+            self._errors[spec.name] = str(e)
+            return None
+
+        entry = LoadedModel(spec, model, path, checksum, load_seconds)
+        self._loaded[spec.name] = entry
+        logger.info(
+            f"Loaded model '{spec.name}' version {entry.version} from {path} in {load_seconds:.2f}s"
+        )
+        return entry
+
+    def warm_up(self, names=None):
+        """
+        Load the given models (all registered models if None) ahead of the first request.
+        Returns the names that were successfully loaded.
+        """
+        loaded = []
+        for name in (names if names is not None else self.names()):
+            if self.get_entry(name) is not None:
+                loaded.append(name)
+        return loaded
+
+    def reload(self, name):
+        """Drop any cached instance or remembered failure and load the model again"""
+        with self._locks[name]:
+            self._loaded.pop(name, None)
+            self._errors.pop(name, None)
+        return self.get(name)
+
+    def unload(self, name):
+        with self._locks[name]:
+            self._loaded.pop(name, None)
+
+    def describe(self):
+        """Return status information for every registered model"""
+        status = []
+        for name, spec in self._specs.items():
+            entry = self._loaded.get(name)
+            status.append({
+                'name': name,
+                'description': spec.description,
+                'loaded': entry is not None,
+                'path': entry.path if entry else spec.resolve_path(),
+                'version': entry.version if entry else spec.version,
+                'checksum': entry.checksum if entry else None,
+                'load_seconds': round(entry.load_seconds, 3) if entry else None,
+                'error': self._errors.get(name),
+            })
+        return status
+
+
+# --- Runtime configuration ---
+
+DISEASE_BACKENDS = ('eager', 'torchscript', 'onnx')
+
+_threads_configured = False
+
+
+def configure_torch_threads(intra_op_threads=None, force=False):
+    """
+    Pin PyTorch's intra-op thread pool (and a single inter-op thread) for this process,
+    so several workers on one node do not each start a thread per core.
+    Inter-op threads can only be set before any parallel work has run, so failures are ignored.
+    force re-applies the setting, e.g. in a forked child that inherited the parent's flag.
+    """
+    global _threads_configured
+    intra_op_threads = intra_op_threads or settings.ML_INTRA_OP_THREADS
+    if (_threads_configured and not force) or not intra_op_threads:
+        return
+    import torch
+    torch.set_num_threads(intra_op_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    _threads_configured = True
+    logger.info(f"PyTorch using {intra_op_threads} intra-op threads")
+
+
+def disease_artifact_path(backend, weights_path):
+    """Location of an exported disease model artifact, next to the eager weights"""
+    stem, _ = os.path.splitext(os.fspath(weights_path))
+    return {
+        'eager': os.fspath(weights_path),
+        'torchscript': f"{stem}.torchscript.pt",
+        'onnx': f"{stem}.onnx",
+    }[backend]
+
+
+def quantized_artifact_path(weights_path):
+    """Location of the INT8 ONNX artifact produced by the quantize_models command"""
+    stem, _ = os.path.splitext(os.fspath(weights_path))
+    return f"{stem}.int8.onnx"
+
+
+# --- Loaders ---
+# Each loader imports its framework lazily so that importing this module stays cheap.
+
+def load_yolo_model(path):
+    configure_torch_threads()
+    from ultralytics import YOLO
+    if os.fspath(path).endswith('.onnx'):
+        # Exported/quantized graphs don't record their task
+        return YOLO(path, task='segment')
+    return YOLO(path)
+
+
+def load_disease_model(path):
+    """Load whichever disease runtime the artifact at `path` belongs to"""
+    from .disease_runtime import backend_for_path, load_backend
+    return load_backend(backend_for_path(path), path)
+
+
+def load_joblib_model(path):
+    import joblib
+    # Memory-map the numpy arrays of uncompressed joblib dumps so processes share them;
+    # compressed dumps are loaded into memory as before
+    return joblib.load(path, mmap_mode='r' if settings.ML_MMAP_WEIGHTS else None)
+
+
+# --- Default registrations ---
+
+registry = ModelRegistry()
+
+FARM_BOUNDARY_WEIGHTS = os.path.join(settings.ML_MODELS_DIR, 'Farm Boundaries', 'yolov8l-seg.pt')
+WEED_WEIGHTS = os.path.join(settings.ML_MODELS_DIR, 'Weed Detection', 'PIDS_weed_detection.pt')
+DISEASE_WEIGHTS = os.path.join(settings.ML_MODELS_DIR, 'Disease Detection', 'diseases_model_fixed.pt')
+
+
+def model_precision(name):
+    return settings.ML_MODEL_PRECISION.get(name, 'fp32')
+
+
+def candidate_paths(name, weights_path, *fallbacks):
+    """
+    Candidate paths for a model honouring ML_MODEL_PRECISION: the INT8 artifact first when
+    selected, then the given paths. A missing artifact falls back to full precision.
+    """
+    paths = [quantized_artifact_path(weights_path)] if model_precision(name) == 'int8' else []
+    for path in (fallbacks or [weights_path]):
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+registry.register(
+    'farm_boundary',
+    candidate_paths('farm_boundary', FARM_BOUNDARY_WEIGHTS),
+    load_yolo_model,
+    description=f"YOLOv8-L segmentation model for farm boundaries ({model_precision('farm_boundary')})",
+)
+registry.register(
+    'weed',
+    candidate_paths('weed', WEED_WEIGHTS),
+    load_yolo_model,
+    description=f"YOLO segmentation model for weed detection ({model_precision('weed')})",
+)
+registry.register(
+    'disease',
+    # The exported artifact for the configured backend, falling back to the eager weights
+    # if it has not been exported yet (see the export_disease_model command)
+    candidate_paths(
+        'disease', DISEASE_WEIGHTS,
+        disease_artifact_path(settings.DISEASE_MODEL_BACKEND, DISEASE_WEIGHTS), DISEASE_WEIGHTS,
+    ),
+    load_disease_model,
+    description=(
+        f"ResNet9 plant disease classifier ({settings.DISEASE_MODEL_BACKEND} backend, {model_precision('disease')})"
+    ),
+)
+registry.register(
+    'crop_classifier',
+    [
+        # Local copy in the Django project directory (most reliable)
+        os.path.join(settings.BASE_DIR, 'models', 'crop_classifier.pkl'),
+        os.path.join(settings.ML_MODELS_DIR, 'ml_models', 'crop_classifier.pkl'),
+        # Absolute path
+        r'C:\Users\ahmed\Desktop\PIDS\Data-Farmers-FarmWise-4DS3\Models\ml_models\crop_classifier.pkl',
+        # Relative paths from different possible working directories
+        os.path.join('models', 'crop_classifier.pkl'),
+        os.path.join('..', '..', 'Models', 'ml_models', 'crop_classifier.pkl'),
+    ],
+    load_joblib_model,
+    description='Random forest crop classification pipeline',
+)
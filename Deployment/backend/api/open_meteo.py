@@ -0,0 +1,398 @@
+"""
+Open-Meteo client used by the weather endpoints.
+
+The forecast (https://open-meteo.com/en/docs) and the precipitation archive
+(https://open-meteo.com/en/docs/historical-weather-api) are fetched separately: the
+forecast is cached per grid cell (api/weather_cache.py) and the daily precipitation is
+stored incrementally (api/rainfall.py). Both raise OpenMeteoError with a message
+suitable for the API response when a call fails.
+
+Requests share one pooled requests.Session, so repeated calls reuse the TCP/TLS
+connections. A call is retried on timeouts, connection errors, 429 and 5xx with
+jittered exponential backoff, within its overall timeout. After
+OPEN_METEO_BREAKER_FAILURES failed calls in a row to one endpoint, its circuit
+breaker fails further calls immediately for OPEN_METEO_BREAKER_RESET_SECONDS.
+`python manage.py fake_open_meteo` serves a local stand-in for both endpoints
+(point OPEN_METEO_FORECAST_URL and OPEN_METEO_ARCHIVE_URL at it).
+"""
+import logging
+import math
+import random
+import threading
+import time
+from datetime import date
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Connect timeout of each attempt; the read timeout is whatever is left of the call's budget
+CONNECT_TIMEOUT = 3.05
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Locations per multi-location request (they are passed in the query string)
+MAX_LOCATIONS_PER_REQUEST = 50
+
+
+class OpenMeteoError(Exception):
+    """An Open-Meteo request failed or returned unusable data"""
+
+
+def validate_coordinates(latitude, longitude):
+    """(lat, lon) as floats, or raise OpenMeteoError"""
+    if not latitude or not longitude:
+        raise OpenMeteoError('Invalid coordinates provided')
+    try:
+        lat, lon = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise OpenMeteoError('Invalid coordinates provided')
+    if lat < -90 or lat > 90 or lon < -180 or lon > 180:
+        raise OpenMeteoError('Coordinates out of valid range')
+    return lat, lon
+
+
+def grid_cell(latitude, longitude, cell_degrees=None):
+    """
+    Centre (lat, lng) of the weather grid cell (WEATHER_CACHE_CELL_DEGREES) containing
+    the point. Data is requested and stored for cell centres so nearby farms share it.
+    """
+    size = cell_degrees or settings.WEATHER_CACHE_CELL_DEGREES
+    lat = (math.floor(float(latitude) / size) + 0.5) * size
+    lng = (math.floor(float(longitude) / size) + 0.5) * size
+    return round(min(max(lat, -90.0), 90.0), 6), round(lng, 6)
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `failures` consecutive failures, for `reset_seconds`;
+    then lets one trial call through (half-open), which closes it again on success.
+    """
+
+    def __init__(self, name, failures=5, reset_seconds=30):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_running or self._consecutive_failures >= self.failures:
+                if self._opened_at is None:
+                    logger.warning(f"Open-Meteo {self.name} circuit opened after "
+                                   f"{self._consecutive_failures} failures")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def describe(self):
+        return {'state': self.state, 'consecutive_failures': self._consecutive_failures}
+
+
+_session = None
+_session_lock = threading.Lock()
+breakers = {}
+
+
+def get_session():
+    """The shared pooled session (created on first use)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.OPEN_METEO_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def get_breaker(name):
+    with _session_lock:
+        if name not in breakers:
+            breakers[name] = CircuitBreaker(name, settings.OPEN_METEO_BREAKER_FAILURES,
+                                            settings.OPEN_METEO_BREAKER_RESET_SECONDS)
+        return breakers[name]
+
+
+def _backoff(attempt, response=None):
+    """Full-jitter exponential backoff; a Retry-After header (seconds) is honoured"""
+    if response is not None and response.headers.get('Retry-After', '').isdigit():
+        return float(response.headers['Retry-After'])
+    return random.uniform(0, settings.OPEN_METEO_RETRY_BACKOFF * 2 ** attempt)
+
+
+def _get_json(name, url, params, timeout):
+    """
+    GET url and decode the JSON body, retrying transient failures until `timeout`
+    seconds have passed in total. `name` selects the circuit breaker.
+    """
+    breaker = get_breaker(name)
+    if not breaker.allow():
+        raise OpenMeteoError('Weather service temporarily unavailable')
+
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        response = None
+        remaining = deadline - time.monotonic()
+        try:
+            response = get_session().get(url, params=params, timeout=(min(CONNECT_TIMEOUT, remaining), remaining))
+            if response.status_code == 200:
+                data = response.json()
+                breaker.record_success()
+                return data
+            error = OpenMeteoError(f'Weather API returned status code: {response.status_code}')
+            retryable = response.status_code in RETRY_STATUS_CODES
+            if not retryable:
+                # The service answered; a rejected request says nothing about its health
+                breaker.record_success()
+                raise error
+        except requests.exceptions.Timeout:
+            error, retryable = OpenMeteoError('Weather API request timed out'), True
+        except requests.exceptions.ConnectionError:
+            error, retryable = OpenMeteoError('Connection error while fetching weather data'), True
+        except ValueError:  # before RequestException: requests' JSONDecodeError is both
+            error, retryable = OpenMeteoError('Failed to parse weather data response'), False
+        except requests.exceptions.RequestException as e:
+            error, retryable = OpenMeteoError(f'Request error: {str(e)}'), False
+
+        delay = _backoff(attempt, response)
+        if not retryable or attempt >= settings.OPEN_METEO_RETRIES or time.monotonic() + delay >= deadline:
+            breaker.record_failure()
+            raise error
+        attempt += 1
+        logger.info(f"Retrying Open-Meteo {name} in {delay:.2f}s ({error})")
+        time.sleep(delay)
+
+
+def _location_batches(locations):
+    """
+    Validated locations split into multi-location requests: yields (batch, params)
+    with comma-separated latitude/longitude lists. Open-Meteo answers a request for
+    several locations with a JSON list in the same order.
+    """
+    locations = [validate_coordinates(lat, lng) for lat, lng in locations]
+    for start in range(0, len(locations), MAX_LOCATIONS_PER_REQUEST):
+        batch = locations[start:start + MAX_LOCATIONS_PER_REQUEST]
+        yield batch, {
+            'latitude': ','.join(str(round(lat, 6)) for lat, _ in batch),
+            'longitude': ','.join(str(round(lng, 6)) for _, lng in batch),
+        }
+
+
+def _as_list(data, count):
+    results = data if isinstance(data, list) else [data]
+    if len(results) != count:
+        raise OpenMeteoError('Invalid response format from weather API')
+    return results
+
+
+def fetch_forecasts(locations):
+    """
+    Forecasts for several (lat, lng) locations with as few requests as possible
+    (MAX_LOCATIONS_PER_REQUEST per request). Returns them in the order given;
+    see fetch_forecast for the format.
+    """
+    forecasts = []
+    for batch, params in _location_batches(locations):
+        params.update({
+            'current': 'temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m,wind_direction_10m',
+            'hourly': 'temperature_2m,precipitation_probability,weather_code,wind_speed_10m',
+            'daily': 'weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum,precipitation_probability_max',
+            'timezone': 'auto',
+            'forecast_days': 7,
+        })
+        logger.info("Requesting Open-Meteo forecast for %d location(s) from %.4f,%.4f", len(batch), *batch[0])
+        data = _get_json('forecast', settings.OPEN_METEO_FORECAST_URL, params, timeout=10)
+        forecasts.extend(_process_forecast(result) for result in _as_list(data, len(batch)))
+    return forecasts
+
+
+def fetch_forecast(latitude, longitude):
+    """
+    Current conditions, the next 24 hours and a 7-day daily forecast, reformatted for
+    the frontend: {'current': {...}, 'hourly': [...], 'daily': [...]}
+    """
+    return fetch_forecasts([(latitude, longitude)])[0]
+
+
+def _process_forecast(data):
+    if 'current' not in data or 'hourly' not in data or 'daily' not in data:
+        raise OpenMeteoError('Invalid response format from weather API')
+
+    processed_data = {
+        'current': {
+            'temperature': data['current']['temperature_2m'],
+            'humidity': data['current']['relative_humidity_2m'],
+            'precipitation': data['current']['precipitation'],
+            'weather_code': data['current']['weather_code'],
+            'wind_speed': data['current']['wind_speed_10m'],
+            'wind_direction': data['current']['wind_direction_10m'],
+            'weather_description': get_weather_description(data['current']['weather_code']),
+            'icon_code': get_weather_icon_code(data['current']['weather_code'])
+        },
+        'hourly': [],
+        'daily': []
+    }
+
+    # Hourly data - next 24 hours
+    hourly = data['hourly']
+    if all(key in hourly for key in ['time', 'temperature_2m', 'precipitation_probability', 'weather_code', 'wind_speed_10m']):
+        for i in range(min(24, len(hourly['time']))):
+            processed_data['hourly'].append({
+                'time': hourly['time'][i],
+                'temperature': hourly['temperature_2m'][i],
+                'precipitation_probability': hourly['precipitation_probability'][i],
+                'weather_code': hourly['weather_code'][i],
+                'wind_speed': hourly['wind_speed_10m'][i],
+                'weather_description': get_weather_description(hourly['weather_code'][i]),
+                'icon_code': get_weather_icon_code(hourly['weather_code'][i])
+            })
+    else:
+        logger.warning("Missing or incomplete hourly data in Open-Meteo response")
+
+    daily = data['daily']
+    if all(key in daily for key in ['time', 'temperature_2m_max', 'temperature_2m_min', 'precipitation_sum', 'precipitation_probability_max', 'weather_code']):
+        for i in range(len(daily['time'])):
+            processed_data['daily'].append({
+                'date': daily['time'][i],
+                'max_temp': daily['temperature_2m_max'][i],
+                'min_temp': daily['temperature_2m_min'][i],
+                'precipitation_sum': daily['precipitation_sum'][i],
+                'precipitation_probability': daily['precipitation_probability_max'][i],
+                'weather_code': daily['weather_code'][i],
+                'weather_description': get_weather_description(daily['weather_code'][i]),
+                'icon_code': get_weather_icon_code(daily['weather_code'][i])
+            })
+    else:
+        logger.warning("Missing or incomplete daily data in Open-Meteo response")
+
+    return processed_data
+
+
+def fetch_daily_precipitation_many(locations, start_date, end_date):
+    """
+    Daily precipitation of several (lat, lng) locations over the same dates, batched
+    like fetch_forecasts. Returns one list per location, in order; see
+    fetch_daily_precipitation for the format.
+    """
+    results = []
+    for batch, params in _location_batches(locations):
+        params.update({
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'daily': 'precipitation_sum',
+            'timezone': 'auto',
+        })
+        logger.info("Requesting Open-Meteo archive rainfall for %d location(s) from %s to %s",
+                    len(batch), start_date, end_date)
+        data = _get_json('archive', settings.OPEN_METEO_ARCHIVE_URL, params, timeout=15)
+        for result in _as_list(data, len(batch)):
+            daily = result.get('daily') or {}
+            if 'time' not in daily or 'precipitation_sum' not in daily:
+                raise OpenMeteoError('Missing precipitation data in historical response')
+            results.append([(date.fromisoformat(day), value)
+                            for day, value in zip(daily['time'], daily['precipitation_sum']) if value is not None])
+    return results
+
+
+def fetch_daily_precipitation(latitude, longitude, start_date, end_date):
+    """
+    [(date, mm), ...] of daily precipitation sums from the Open-Meteo archive between
+    two dates (inclusive). Days the archive has no value for yet (it lags a few days
+    behind) are left out.
+    """
+    return fetch_daily_precipitation_many([(latitude, longitude)], start_date, end_date)[0]
+
+
+def get_weather_description(weather_code):
+    """
+    Convert Open-Meteo weather code to human-readable description
+    Based on: https://open-meteo.com/en/docs/weather-codes
+    """
+    weather_codes = {
+        0: "Clear sky",
+        1: "Mainly clear",
+        2: "Partly cloudy",
+        3: "Overcast",
+        45: "Fog",
+        48: "Depositing rime fog",
+        51: "Light drizzle",
+        53: "Moderate drizzle",
+        55: "Dense drizzle",
+        56: "Light freezing drizzle",
+        57: "Dense freezing drizzle",
+        61: "Slight rain",
+        63: "Moderate rain",
+        65: "Heavy rain",
+        66: "Light freezing rain",
+        67: "Heavy freezing rain",
+        71: "Slight snow fall",
+        73: "Moderate snow fall",
+        75: "Heavy snow fall",
+        77: "Snow grains",
+        80: "Slight rain showers",
+        81: "Moderate rain showers",
+        82: "Violent rain showers",
+        85: "Slight snow showers",
+        86: "Heavy snow showers",
+        95: "Thunderstorm",
+        96: "Thunderstorm with slight hail",
+        99: "Thunderstorm with heavy hail"
+    }
+
+    return weather_codes.get(weather_code, "Unknown")
+
+
+def get_weather_icon_code(weather_code):
+    """
+    Convert Open-Meteo weather code to icon code for frontend
+    Based on WMO weather codes
+    """
+    # Map Open-Meteo weather codes to icon codes that the frontend can understand
+    if weather_code == 0:  # Clear sky
+        return "01d"  # Sunny
+    elif weather_code in [1, 2]:  # Mainly clear, partly cloudy
+        return "02d"  # Partly cloudy
+    elif weather_code == 3:  # Overcast
+        return "03d"  # Cloudy
+    elif weather_code in [45, 48]:  # Fog
+        return "50d"  # Fog
+    elif weather_code in [51, 53, 55, 56, 57]:  # Drizzle
+        return "09d"  # Drizzle
+    elif weather_code in [61, 63, 65, 66, 67, 80, 81, 82]:  # Rain
+        return "10d"  # Rain
+    elif weather_code in [71, 73, 75, 77, 85, 86]:  # Snow
+        return "13d"  # Snow
+    elif weather_code in [95, 96, 99]:  # Thunderstorm
+        return "11d"  # Thunderstorm
+    else:
+        return "03d"  # Default cloudy
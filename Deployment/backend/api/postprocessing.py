@@ -0,0 +1,283 @@
+"""
+Vectorized post-processing of YOLO segmentation results.
+
+Dense weed photos can hold hundreds of instances, and a per-detection Python loop
+(indexing boxes one at a time, `.item()` per field, a list round trip per polygon)
+plus encoding deeply nested lists to JSON costs more than the model itself. Here
+class ids and confidences are read as whole arrays, polygon perimeters are computed
+for all polygons at once, and the output can be emitted in compact layouts:
+
+- 'objects':  one dict per detection with nested [[x, y], ...] pixels (the original format)
+- 'flat':     one dict per detection with a flat [x0, y0, x1, y1, ...] polygon
+- 'columnar': parallel arrays for the whole image plus one flat coordinate array
+  and point offsets, so the JSON holds a handful of lists regardless of the count
+
+Masks can additionally be returned run-length encoded (see rle_encode). weed_coverage
+rasterizes the masks once to get per-class pixel counts and a coarse density grid.
+"""
+import cv2
+import numpy as np
+
+OUTPUT_FORMATS = ('objects', 'flat', 'columnar')
+
+
+def _numpy(values):
+    """torch tensor or array-like to a numpy array"""
+    if hasattr(values, 'cpu'):
+        values = values.cpu()
+    if hasattr(values, 'numpy'):
+        return values.numpy()
+    return np.asarray(values)
+
+
+def result_arrays(result):
+    """
+    Pull the polygons, class ids and confidences out of one ultralytics result
+    (None for an image without detections).
+
+    Returns:
+        (polygons, class_ids, confidences): a list of (N, 2) float pixel arrays and two
+        arrays with one entry per polygon (-1 and 0.0 where the result has no box)
+    """
+    polygons = list(result.masks.xy) if result is not None and result.masks else []
+    count = len(polygons)
+    class_ids = np.full(count, -1, dtype=np.int64)
+    confidences = np.zeros(count, dtype=np.float64)
+
+    boxes = result.boxes if count else None
+    if boxes is not None and len(boxes):
+        n = min(count, len(boxes))
+        class_ids[:n] = _numpy(boxes.cls).reshape(-1)[:n].astype(np.int64)
+        confidences[:n] = _numpy(boxes.conf).reshape(-1)[:n]
+    return polygons, class_ids, confidences
+
+
+def polygon_perimeters(points, starts, counts):
+    """
+    Closed-ring perimeters of polygons stored back to back in one (P, 2) array.
+
+    Args:
+        points: Concatenated polygon vertices
+        starts: Index of each polygon's first vertex
+        counts: Number of vertices per polygon (all > 0)
+    """
+    if not len(counts):
+        return np.zeros(0)
+    next_index = np.arange(1, len(points) + 1)
+    next_index[starts + counts - 1] = starts  # last vertex connects back to the first
+    segments = np.hypot(*(points[next_index] - points).T.astype(np.float64))
+    return np.add.reduceat(segments, starts)
+
+
+def simplify_polygons(polygons, epsilon_ratio=0.01, min_points=10):
+    """
+    Douglas-Peucker simplification of many polygons.
+
+    Polygons are truncated to integer pixels; those with more than `min_points`
+    vertices are simplified with a tolerance of `epsilon_ratio` times their perimeter
+    (computed for all polygons in one pass). Returns a list of (N, 2) int32 arrays.
+    """
+    if not polygons:
+        return []
+    counts = np.array([len(p) for p in polygons])
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    points = np.concatenate(polygons).astype(np.int32)
+
+    # Perimeters of every polygon in one pass; only the larger polygons are simplified
+    perimeters = polygon_perimeters(points, starts, counts)
+    needs_simplifying = counts > min_points
+
+    simplified = []
+    for start, count, perimeter, simplify in zip(starts, counts, perimeters, needs_simplifying):
+        polygon = points[start:start + count]
+        if simplify:
+            polygon = cv2.approxPolyDP(polygon.reshape(-1, 1, 2), epsilon_ratio * perimeter, True).reshape(-1, 2)
+        simplified.append(polygon)
+    return simplified
+
+
+def rle_encode(mask):
+    """
+    Run-length encode a binary mask in row-major order.
+    Returns run lengths alternating background/foreground, starting with background
+    (so the first count is 0 if the mask starts with a foreground pixel).
+    """
+    flat = np.asarray(mask, dtype=bool).ravel()
+    if not flat.size:
+        return []
+    boundaries = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    runs = np.diff(np.concatenate([[0], boundaries, [flat.size]]))
+    if flat[0]:
+        runs = np.concatenate([[0], runs])
+    return runs.tolist()
+
+
+def rle_decode(rle):
+    """Inverse of polygon_rle: (mask, (x, y)) with the mask cropped to the bounding box at (x, y)"""
+    x, y, width, height = rle['bbox']
+    values = np.zeros(len(rle['counts']), dtype=bool)
+    values[1::2] = True
+    return np.repeat(values, rle['counts']).reshape(height, width), (x, y)
+
+
+def polygon_rle(polygon, img_width, img_height):
+    """
+    RLE of a polygon's filled mask, cropped to its bounding box (clipped to the image).
+    Returns {'bbox': [x, y, width, height], 'counts': [...]}.
+    """
+    x, y, width, height = cv2.boundingRect(polygon.reshape(-1, 1, 2))
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, img_width), min(y + height, img_height)
+    if x1 <= x0 or y1 <= y0:
+        return {'bbox': [x0, y0, 0, 0], 'counts': []}
+    mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    cv2.fillPoly(mask, [(polygon - [x0, y0]).astype(np.int32).reshape(-1, 1, 2)], 1)
+    return {'bbox': [x0, y0, x1 - x0, y1 - y0], 'counts': rle_encode(mask)}
+
+
+def weed_detections(result, output='objects', include_rle=False, image_size=None):
+    """
+    Convert one weed segmentation result into the API payload.
+
+    Args:
+        result: ultralytics Results for a single image, or None
+        output: 'objects', 'flat' or 'columnar' (see module docstring)
+        include_rle: Add an RLE mask per detection (requires image_size)
+        image_size: (width, height) of the input image
+
+    Returns:
+        {'detected_weeds': [...]} for 'objects'/'flat', or
+        {'detected_weeds': {'count', 'ids', 'class_ids', 'classes', 'confidences', 'offsets', 'coords'}}
+    """
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output}', expected one of {OUTPUT_FORMATS}")
+
+    polygons, class_ids, confidences = result_arrays(result)
+    names = result.names if getattr(result, 'names', None) else {}
+
+    # Need at least 3 points for a polygon
+    ids = np.flatnonzero([len(p) >= 3 for p in polygons]).astype(np.int64)
+    polygons = simplify_polygons([polygons[i] for i in ids])
+    class_ids = class_ids[ids]
+    confidences = np.round(confidences[ids], 2)
+
+    rles = None
+    if include_rle:
+        if image_size is None:
+            raise ValueError('image_size is required for RLE masks')
+        rles = [polygon_rle(p, *image_size) for p in polygons]
+
+    if output == 'columnar':
+        class_table = sorted({int(c) for c in class_ids if c >= 0})
+        class_index = {c: i for i, c in enumerate(class_table)}
+        counts = np.array([len(p) for p in polygons], dtype=np.int64)
+        payload = {
+            'count': len(polygons),
+            'ids': ids.tolist(),
+            'classes': [names.get(c, 'Unknown') for c in class_table],
+            # Index into 'classes', -1 when the detection has no class
+            'class_ids': [class_index.get(c, -1) for c in class_ids.tolist()],
+            'confidences': confidences.tolist(),
+            # Detection i has points coords[2 * offsets[i]:2 * offsets[i + 1]] as x, y pairs
+            'offsets': np.concatenate([[0], np.cumsum(counts)]).tolist(),
+            'coords': np.concatenate(polygons).ravel().tolist() if polygons else [],
+        }
+        if rles is not None:
+            payload['rle'] = rles
+        return {'detected_weeds': payload}
+
+    class_names = [names.get(c, 'Unknown') if c >= 0 else 'Unknown' for c in class_ids.tolist()]
+    geometry_key = 'polygon_pixels' if output == 'objects' else 'polygon'
+    detected_weeds = []
+    for index, (detection_id, class_name, confidence, polygon) in enumerate(
+            zip(ids.tolist(), class_names, confidences.tolist(), polygons)):
+        weed = {
+            'id': detection_id,
+            'class_name': class_name,
+            'confidence': confidence,
+            geometry_key: polygon.tolist() if output == 'objects' else polygon.ravel().tolist(),
+        }
+        if rles is not None:
+            weed['rle'] = rles[index]
+        detected_weeds.append(weed)
+    return {'detected_weeds': detected_weeds}
+
+
+def density_grid(mask, rows, cols):
+    """
+    Fraction of foreground pixels in each cell of a rows x cols grid over a binary mask
+    (cells differ by at most one pixel in size when the mask doesn't divide evenly).
+    """
+    height, width = mask.shape
+    rows, cols = max(1, min(rows, height)), max(1, min(cols, width))
+    row_edges = np.linspace(0, height, rows + 1).astype(np.int64)
+    col_edges = np.linspace(0, width, cols + 1).astype(np.int64)
+    counts = np.add.reduceat(np.add.reduceat(mask.astype(np.int64), row_edges[:-1], axis=0), col_edges[:-1], axis=1)
+    cell_sizes = np.outer(np.diff(row_edges), np.diff(col_edges))
+    return counts / cell_sizes
+
+
+def weed_coverage(result, image_size, grid_size=16, area_per_pixel=None):
+    """
+    Weed coverage of one segmentation result, computed from a rasterized mask.
+
+    All instance masks are painted into one label image (higher-confidence detections
+    win where masks overlap), so overlapping weeds are counted once and the per-class
+    pixel counts add up to the total.
+
+    Args:
+        result: ultralytics Results for a single image, or None
+        image_size: (width, height) of the input image
+        grid_size: Rows and columns of the density grid
+        area_per_pixel: Square meters per pixel, if the image footprint is known
+
+    Returns:
+        {'image_pixels', 'weed_pixels', 'percentage',
+         'classes': [{'name', 'pixels', 'percentage'}, ...],
+         'grid': {'rows', 'cols', 'cells'}} where cells holds the weed percentage of each
+        grid cell as integers, row by row; plus 'image_area_m2'/'weed_area_m2' (and
+        'area_m2' per class) when area_per_pixel is given
+    """
+    width, height = image_size
+    polygons, class_ids, confidences = result_arrays(result)
+    names = result.names if result is not None and getattr(result, 'names', None) else {}
+
+    # One label per class (unknown classes share label 1), 0 is background
+    class_table = sorted({int(c) for c in class_ids})
+    labels = np.zeros((height, width), dtype=np.uint8 if len(class_table) < 255 else np.uint16)
+    for index in np.argsort(confidences, kind='stable'):
+        polygon = polygons[index]
+        if len(polygon) < 3:
+            continue
+        label = class_table.index(int(class_ids[index])) + 1
+        cv2.fillPoly(labels, [np.round(polygon).astype(np.int32).reshape(-1, 1, 2)], label)
+
+    pixel_counts = np.bincount(labels.ravel(), minlength=len(class_table) + 1)
+    image_pixels = width * height
+    weed_pixels = int(image_pixels - pixel_counts[0])
+
+    classes = []
+    for label, class_id in enumerate(class_table, start=1):
+        pixels = int(pixel_counts[label])
+        if not pixels:
+            continue
+        classes.append({
+            'name': names.get(class_id, 'Unknown') if class_id >= 0 else 'Unknown',
+            'pixels': pixels,
+            'percentage': round(100.0 * pixels / image_pixels, 2),
+        })
+
+    cells = np.rint(100 * density_grid(labels > 0, grid_size, grid_size)).astype(np.uint8)
+    coverage = {
+        'image_pixels': image_pixels,
+        'weed_pixels': weed_pixels,
+        'percentage': round(100.0 * weed_pixels / image_pixels, 2) if image_pixels else 0.0,
+        'classes': classes,
+        'grid': {'rows': cells.shape[0], 'cols': cells.shape[1], 'cells': cells.ravel().tolist()},
+    }
+    if area_per_pixel:
+        coverage['image_area_m2'] = round(image_pixels * area_per_pixel, 2)
+        coverage['weed_area_m2'] = round(weed_pixels * area_per_pixel, 2)
+        for weed_class in classes:
+            weed_class['area_m2'] = round(weed_class['pixels'] * area_per_pixel, 2)
+    return coverage
@@ -0,0 +1,235 @@
+"""
+INT8 quantization of the vision models with ONNX Runtime.
+
+Workflow (driven by the quantize_models management command):
+
+1. export each fp32 model to ONNX (ultralytics export for the YOLO models,
+   disease_runtime.export_onnx for ResNet9),
+2. run static INT8 quantization (QDQ format, per-channel weights) calibrated on
+   a folder of sample images preprocessed exactly as at inference time,
+3. compare fp32 and INT8 on held-out images for accuracy drift and latency.
+
+The quantized artifacts are written next to the fp32 weights as
+`<name>.int8.onnx`; ML_MODEL_PRECISION selects them per model at load time
+(see model_registry). ultralytics loads the YOLO ONNX files directly, so the
+views and the micro-batcher do not change.
+
+onnx, onnxruntime and (for the YOLO export) ultralytics are only imported here.
+"""
+import logging
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from .image_io import decode_image_buffer
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+YOLO_IMAGE_SIZE = 640
+
+
+# --- Calibration data ---
+
+def list_images(directory, limit=None):
+    """Sorted image paths in a directory (not recursive)"""
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    return paths[:limit] if limit else paths
+
+
+def load_image(path):
+    """Read an image file into an RGB array, the same way uploads are decoded"""
+    return decode_image_buffer(np.fromfile(path, dtype=np.uint8))
+
+
+def letterbox(image, size=YOLO_IMAGE_SIZE, pad_value=114):
+    """Resize keeping the aspect ratio and pad to a square, as ultralytics does before inference"""
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return canvas
+
+
+def yolo_input(image, size=YOLO_IMAGE_SIZE):
+    """(1, 3, size, size) float32 network input for an RGB image"""
+    tensor = letterbox(image, size).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor.transpose(2, 0, 1)[None])
+
+
+def disease_input(image):
+    """(1, 3, 224, 224) float32 network input for an RGB image, using the training transforms"""
+    from PIL import Image
+    from .disease_model import preprocess
+    return preprocess(Image.fromarray(image)).unsqueeze(0).numpy()
+
+
+def make_calibration_reader(onnx_path, image_paths, to_input):
+    """
+    Build an onnxruntime CalibrationDataReader feeding preprocessed images one at a time,
+    so calibration memory does not grow with the number of images.
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader
+
+    input_name = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(image_paths)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            if path is None:
+                return None
+            return {input_name: to_input(load_image(path))}
+
+        def rewind(self):
+            self._paths = iter(image_paths)
+
+    return ImageCalibrationReader()
+
+
+# --- Export and quantization ---
+
+def export_yolo_onnx(weights_path, image_size=YOLO_IMAGE_SIZE):
+    """Export a YOLO .pt model to ONNX with a dynamic batch axis; returns the .onnx path"""
+    from ultralytics import YOLO
+    return YOLO(weights_path).export(format='onnx', imgsz=image_size, dynamic=True, simplify=True)
+
+
+def quantize_onnx(fp32_path, output_path, calibration_reader, per_channel=True):
+    """Statically quantize an ONNX model to INT8 (QDQ format) using the calibration reader"""
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # Shape inference and graph cleanup make more nodes quantizable
+    prepared_path = f"{os.path.splitext(output_path)[0]}.prep.onnx"
+    try:
+        quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+        source_path = prepared_path
+    except Exception as e:
+        logger.warning(f"ONNX pre-processing failed for {fp32_path}, quantizing as is: {e}")
+        source_path = fp32_path
+
+    try:
+        quantize_static(
+            source_path, output_path, calibration_reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+        )
+    finally:
+        if os.path.exists(prepared_path):
+            os.remove(prepared_path)
+    return output_path
+
+
+# --- Evaluation ---
+
+def time_call(fn, iterations=10, warmup=2):
+    """Median latency of fn() in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def detection_agreement(reference_boxes, candidate_boxes, iou_threshold=0.5):
+    """
+    Compare two sets of detections on the same image.
+    Returns (matched, reference_count, candidate_count) using greedy IoU matching.
+    """
+    iou = box_iou(reference_boxes, candidate_boxes)
+    matched = 0
+    while iou.size and iou.max() >= iou_threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return matched, len(reference_boxes), len(candidate_boxes)
+
+
+def evaluate_yolo(fp32_path, int8_path, image_paths, conf=0.5, iou=0.45):
+    """Detection F1 of the INT8 model against fp32 predictions, plus median latency of both"""
+    from ultralytics import YOLO
+
+    fp32_model = YOLO(fp32_path)
+    int8_model = YOLO(int8_path, task=fp32_model.task)
+
+    matched = reference_total = candidate_total = 0
+    fp32_ms, int8_ms = [], []
+    for path in image_paths:
+        image = load_image(path)
+        kwargs = dict(save=False, verbose=False, conf=conf, iou=iou)
+        fp32_ms.append(time_call(lambda: fp32_model.predict(source=image, **kwargs), iterations=3, warmup=1))
+        int8_ms.append(time_call(lambda: int8_model.predict(source=image, **kwargs), iterations=3, warmup=1))
+        reference = fp32_model.predict(source=image, **kwargs)[0].boxes.xyxy.cpu().numpy()
+        candidate = int8_model.predict(source=image, **kwargs)[0].boxes.xyxy.cpu().numpy()
+        m, r, c = detection_agreement(reference, candidate)
+        matched, reference_total, candidate_total = matched + m, reference_total + r, candidate_total + c
+
+    precision = matched / candidate_total if candidate_total else 1.0
+    recall = matched / reference_total if reference_total else 1.0
+    return {
+        'images': len(image_paths),
+        'agreement_f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        'fp32_detections': reference_total,
+        'int8_detections': candidate_total,
+        'fp32_p50_ms': round(statistics.median(fp32_ms), 2) if fp32_ms else None,
+        'int8_p50_ms': round(statistics.median(int8_ms), 2) if int8_ms else None,
+    }
+
+
+def evaluate_disease(eager_model, int8_path, image_paths):
+    """Top-1 agreement and probability drift of the INT8 disease model against the eager model"""
+    import torch
+    from .disease_runtime import OnnxDiseaseModel
+
+    int8_model = OnnxDiseaseModel(int8_path)
+    batch = torch.from_numpy(np.concatenate([disease_input(load_image(p)) for p in image_paths]))
+    with torch.no_grad():
+        reference = torch.softmax(eager_model(batch), dim=1)
+        candidate = torch.softmax(int8_model(batch), dim=1)
+        fp32_ms = time_call(lambda: eager_model(batch[:1]))
+        int8_ms = time_call(lambda: int8_model(batch[:1]))
+
+    return {
+        'images': len(image_paths),
+        'top1_agreement': round(float((reference.argmax(1) == candidate.argmax(1)).float().mean()), 4),
+        'max_probability_diff': round(float((reference - candidate).abs().max()), 4),
+        'fp32_p50_ms': round(fp32_ms, 2),
+        'int8_p50_ms': round(int8_ms, 2),
+    }
+
+
+def file_size_mb(path):
+    return round(os.path.getsize(path) / (1024 * 1024), 2)
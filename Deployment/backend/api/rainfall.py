@@ -0,0 +1,201 @@
+"""
+Incremental daily rainfall store per weather grid cell (core.models.DailyRainfall).
+
+The first refresh of a cell backfills WEATHER_RAINFALL_HISTORY_DAYS of daily
+precipitation from the Open-Meteo archive. Later refreshes only request the days after
+the last stored one, so they are a few days of data instead of a year, and the rolling
+totals are summed by the database. The archive lags a few days behind; days without
+a value yet are not stored and are requested again on the next refresh.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from core.models import DailyRainfall
+from .open_meteo import fetch_daily_precipitation, fetch_daily_precipitation_many, grid_cell, OpenMeteoError
+
+logger = logging.getLogger(__name__)
+
+# Rolling totals reported by rainfall_totals: name -> days, today included
+RAINFALL_WINDOWS = {'last_30_days': 30, 'last_90_days': 90, 'last_365_days': 365}
+# The hydrological year in Tunisia starts in September; 'season_to_date' sums from its first day
+SEASON_START_MONTH = 9
+# Window used for the 'Rainfall (mm)' model feature, a growing-season total in the training data
+FEATURE_RAINFALL_DAYS = 90
+# Cells matched per query; SQLite rejects much longer OR chains (expression depth limit of 1000)
+CELL_QUERY_CHUNK = 200
+
+
+def season_start(today):
+    """First day of the current hydrological year"""
+    year = today.year if today.month >= SEASON_START_MONTH else today.year - 1
+    return today.replace(year=year, month=SEASON_START_MONTH, day=1)
+
+
+def sync_rainfall(lat, lng, today=None):
+    """
+    Fetch the days missing from the store for the cell centred on lat/lng.
+    Returns the number of days added.
+    """
+    today = today or timezone.localdate()
+    cell = DailyRainfall.objects.filter(latitude=lat, longitude=lng)
+    last_date = cell.aggregate(last=Max('date'))['last']
+    if last_date:
+        start = last_date + timedelta(days=1)
+    else:
+        start = today - timedelta(days=settings.WEATHER_RAINFALL_HISTORY_DAYS - 1)
+    if start > today:
+        return 0
+
+    days = fetch_daily_precipitation(lat, lng, start, today)
+    DailyRainfall.objects.bulk_create(
+        [DailyRainfall(latitude=lat, longitude=lng, date=day, precipitation=value) for day, value in days],
+        ignore_conflicts=True,
+    )
+    logger.info(f"Stored {len(days)} days of rainfall for {lat},{lng} (requested from {start})")
+    return len(days)
+
+
+def sync_rainfall_cells(cells, today=None):
+    """
+    sync_rainfall for many (lat, lng) grid cells: the last stored days are read with
+    one query per CELL_QUERY_CHUNK cells, and cells missing the same days share multi-location archive
+    requests. Returns the number of days added.
+    """
+    today = today or timezone.localdate()
+    cells = list(dict.fromkeys(cells))
+    if not cells:
+        return 0
+    last_dates = {
+        (row['latitude'], row['longitude']): row['last']
+        for cell_filter in _cell_filters(cells)
+        for row in (DailyRainfall.objects.filter(cell_filter)
+                    .values('latitude', 'longitude').annotate(last=Max('date')))
+    }
+    backfill_start = today - timedelta(days=settings.WEATHER_RAINFALL_HISTORY_DAYS - 1)
+    by_start = {}
+    for cell in cells:
+        last_date = last_dates.get(cell)
+        start = last_date + timedelta(days=1) if last_date else backfill_start
+        if start <= today:
+            by_start.setdefault(start, []).append(cell)
+
+    rows = []
+    for start, group in by_start.items():
+        for (lat, lng), days in zip(group, fetch_daily_precipitation_many(group, start, today)):
+            rows.extend(DailyRainfall(latitude=lat, longitude=lng, date=day, precipitation=value)
+                        for day, value in days)
+    DailyRainfall.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+    logger.info(f"Stored {len(rows)} days of rainfall for {len(cells)} cells ({len(by_start)} start dates)")
+    return len(rows)
+
+
+def _cell_filters(cells):
+    """One Q matching the cells per CELL_QUERY_CHUNK of them"""
+    cells = list(cells)
+    for start in range(0, len(cells), CELL_QUERY_CHUNK):
+        cell_filter = Q()
+        for lat, lng in cells[start:start + CELL_QUERY_CHUNK]:
+            cell_filter |= Q(latitude=lat, longitude=lng)
+        yield cell_filter
+
+
+def _totals_aggregates(today):
+    aggregates = {
+        name: Sum('precipitation', filter=Q(date__gt=today - timedelta(days=days)))
+        for name, days in RAINFALL_WINDOWS.items()
+    }
+    aggregates['season_to_date'] = Sum('precipitation', filter=Q(date__gte=season_start(today)))
+    aggregates['days_recorded'] = Count('id', filter=Q(date__gt=today - timedelta(days=365)))
+    aggregates['latest_date'] = Max('date')
+    return aggregates
+
+
+def _format_totals(totals):
+    for name in list(RAINFALL_WINDOWS) + ['season_to_date']:
+        totals[name] = round(totals[name], 2) if totals[name] is not None else None
+    totals['latest_date'] = totals['latest_date'].isoformat() if totals['latest_date'] else None
+    return totals
+
+
+def rainfall_totals(lat, lng, today=None):
+    """
+    Rolling precipitation totals (mm) of the cell centred on lat/lng, from the store,
+    in one query: RAINFALL_WINDOWS, 'season_to_date', plus 'days_recorded' (over the
+    last 365 days) and 'latest_date'.
+    """
+    today = today or timezone.localdate()
+    totals = (DailyRainfall.objects.filter(latitude=lat, longitude=lng, date__lte=today)
+              .aggregate(**_totals_aggregates(today)))
+    return _format_totals(totals)
+
+
+def rainfall_totals_many(cells, today=None):
+    """{(lat, lng): rainfall_totals} for many grid cells, one grouped query per CELL_QUERY_CHUNK cells"""
+    today = today or timezone.localdate()
+    cells = list(dict.fromkeys(cells))
+    if not cells:
+        return {}
+    aggregates = _totals_aggregates(today)
+    totals = {}
+    for cell_filter in _cell_filters(cells):
+        rows = (DailyRainfall.objects.filter(cell_filter, date__lte=today)
+                .values('latitude', 'longitude').annotate(**aggregates))
+        totals.update({(row.pop('latitude'), row.pop('longitude')): _format_totals(row) for row in rows})
+    # Cells without stored days get what the single-cell aggregate returns for them
+    empty = {name: None for name in aggregates}
+    empty['days_recorded'] = 0
+    return {cell: totals.get(cell) or dict(empty) for cell in cells}
+
+
+def update_rainfall(latitude, longitude):
+    """
+    Sync the store for the grid cell of the point and return its rainfall_totals.
+    If Open-Meteo is unavailable the totals of the days already stored are returned;
+    OpenMeteoError is only raised when the cell has no data at all.
+    """
+    lat, lng = grid_cell(latitude, longitude)
+    try:
+        sync_rainfall(lat, lng)
+    except OpenMeteoError as e:
+        if not DailyRainfall.objects.filter(latitude=lat, longitude=lng).exists():
+            raise
+        logger.warning(f"Rainfall sync for {lat},{lng} failed, using stored days: {e}")
+    return rainfall_totals(lat, lng)
+
+
+def farm_location(farm):
+    """(lat, lng) of a farm's boundary centroid, or None"""
+    if farm.centroid_lat is None:
+        return None
+    return farm.centroid_lat, farm.centroid_lng
+
+
+def feature_rainfall(farms, days=FEATURE_RAINFALL_DAYS, today=None):
+    """
+    {farm_id: mm} precipitation over the last `days` days for the farms whose grid cell
+    has stored data, in one query per CELL_QUERY_CHUNK cells. Nothing is fetched from
+    Open-Meteo.
+    """
+    today = today or timezone.localdate()
+    cells = {}
+    for farm in farms:
+        location = farm_location(farm)
+        if location is not None:
+            cells.setdefault(grid_cell(*location), []).append(farm.pk)
+    if not cells:
+        return {}
+
+    rainfall = {}
+    for cell_filter in _cell_filters(cells):
+        rows = (DailyRainfall.objects
+                .filter(cell_filter, date__gt=today - timedelta(days=days), date__lte=today)
+                .values('latitude', 'longitude')
+                .annotate(total=Sum('precipitation')))
+        for row in rows:
+            for farm_id in cells.get((row['latitude'], row['longitude']), []):
+                rainfall[farm_id] = round(row['total'], 2)
+    return rainfall
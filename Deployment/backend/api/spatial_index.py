@@ -0,0 +1,124 @@
+"""
+In-memory grid index over the farm bounding boxes.
+
+Every farm's bbox (the precomputed Farm.bbox_* columns, so no GeoJSON is parsed) is
+registered in the cells of a regular lng/lat grid it overlaps. A bbox or point query
+only looks at the farms in the cells it touches and then checks their boxes with numpy.
+The index is built on first use in each process and rebuilt when the farm table
+changes (checked with one aggregate query per lookup, so saves in other worker
+processes are picked up too).
+"""
+import logging
+import math
+import threading
+from collections import defaultdict, namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from core.farm_geometry import boundary_polygons, point_in_polygons
+from core.models import Farm
+
+logger = logging.getLogger(__name__)
+
+# Farms whose bbox would span more cells than this are kept in a list checked on every query
+MAX_CELLS_PER_FARM = 10000
+
+# One immutable generation of the index. Rebuilds publish a new one and readers take the
+# current one once per query, so rows and arrays always come from the same build.
+GridSnapshot = namedtuple('GridSnapshot', ['stamp', 'ids', 'boxes', 'cells', 'oversized'])
+
+
+class FarmSpatialIndex:
+    """Grid of farm bboxes; cell_degrees is the cell size in degrees of latitude/longitude"""
+
+    def __init__(self, cell_degrees=None):
+        self.cell_degrees = cell_degrees or settings.FARM_INDEX_CELL_DEGREES
+        self._lock = threading.Lock()
+        self._snapshot = GridSnapshot(None, np.zeros(0, dtype=np.int64), np.zeros((0, 4)), {},
+                                      np.zeros(0, dtype=np.int64))
+
+    def _cell_range(self, west, south, east, north):
+        size = self.cell_degrees
+        return (range(math.floor(west / size), math.floor(east / size) + 1),
+                range(math.floor(south / size), math.floor(north / size) + 1))
+
+    def _current_stamp(self):
+        stats = Farm.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+        return stats['count'], stats['latest']
+
+    def _build(self, stamp):
+        rows = list(Farm.objects.filter(bbox_west__isnull=False).values_list(
+            'id', 'bbox_west', 'bbox_south', 'bbox_east', 'bbox_north'))
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        boxes = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 4)
+
+        cells = defaultdict(list)
+        oversized = []
+        for row, box in enumerate(boxes.tolist()):
+            columns, rows_range = self._cell_range(*box)
+            if len(columns) * len(rows_range) > MAX_CELLS_PER_FARM:
+                # e.g. a boundary drawn in the wrong units; checked on every query instead
+                oversized.append(row)
+                continue
+            for cx in columns:
+                for cy in rows_range:
+                    cells[(cx, cy)].append(row)
+
+        snapshot = GridSnapshot(
+            stamp, ids, boxes,
+            {cell: np.array(members, dtype=np.int64) for cell, members in cells.items()},
+            np.array(oversized, dtype=np.int64),
+        )
+        logger.info("Built farm spatial index: %d farms in %d cells", len(ids), len(snapshot.cells))
+        return snapshot
+
+    def refresh(self, force=False):
+        """
+        Rebuild the index if farms were added, changed or deleted since it was built.
+        Returns the current GridSnapshot.
+        """
+        stamp = self._current_stamp()
+        with self._lock:
+            if force or stamp != self._snapshot.stamp:
+                self._snapshot = self._build(stamp)
+            return self._snapshot
+
+    def _candidates(self, snapshot, west, south, east, north):
+        """Rows of the farms registered in the cells overlapping the box"""
+        columns, rows_range = self._cell_range(west, south, east, north)
+        if len(columns) * len(rows_range) > len(snapshot.cells):
+            # Query larger than the populated grid: checking every box is cheaper
+            return np.arange(len(snapshot.ids))
+        members = [snapshot.cells[(cx, cy)] for cx in columns for cy in rows_range if (cx, cy) in snapshot.cells]
+        return np.unique(np.concatenate([snapshot.oversized] + members))
+
+    def within(self, west, south, east, north, contained=False):
+        """
+        Ids of the farms whose bbox intersects the given box, or lies entirely inside it
+        with contained=True.
+        """
+        snapshot = self.refresh()
+        rows = self._candidates(snapshot, west, south, east, north)
+        boxes = snapshot.boxes[rows]
+        if contained:
+            mask = (boxes[:, 0] >= west) & (boxes[:, 1] >= south) & (boxes[:, 2] <= east) & (boxes[:, 3] <= north)
+        else:
+            mask = (boxes[:, 0] <= east) & (boxes[:, 2] >= west) & (boxes[:, 1] <= north) & (boxes[:, 3] >= south)
+        return snapshot.ids[rows[mask]].tolist()
+
+    def at(self, lat, lng, queryset=None):
+        """
+        Farms whose boundary contains the point. Candidates come from the index by bbox;
+        only their boundaries are loaded for the exact point-in-polygon test.
+        """
+        candidate_ids = self.within(lng, lat, lng, lat)
+        if not candidate_ids:
+            return []
+        queryset = Farm.objects.all() if queryset is None else queryset
+        return [farm for farm in queryset.filter(id__in=candidate_ids)
+                if point_in_polygons(lng, lat, boundary_polygons(farm.boundary_geojson))]
+
+
+farm_index = FarmSpatialIndex()
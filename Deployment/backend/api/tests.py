@@ -1,3 +1,143 @@
-from django.test import TestCase
+import importlib.util
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from . import open_meteo
+from .fake_open_meteo import FakeOpenMeteoServer, archive_payload, forecast_payload
+from .model_registry import DISEASE_WEIGHTS
+
+
+def module_installed(name):
+    return importlib.util.find_spec(name) is not None
+
+
+@skipUnless(module_installed('torch'), 'PyTorch is not installed')
+@skipUnless(os.path.exists(DISEASE_WEIGHTS), 'diseases_model_fixed.pt is not available')
+class DiseaseRuntimeParityTests(SimpleTestCase):
+    """Exported disease model runtimes must give the eager model's logits"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from .disease_model import load_disease_model
+
+        cls.eager = load_disease_model(DISEASE_WEIGHTS)
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def assertParity(self, backend, export):
+        from .disease_runtime import check_parity, load_backend
+
+        path = export(self.eager, os.path.join(self.temp_dir.name, f'disease.{backend}'))
+        parity = check_parity(self.eager, load_backend(backend, path))
+        self.assertTrue(parity['top1_match'], parity)
+        self.assertTrue(parity['passed'], parity)
+
+    def test_torchscript_matches_eager(self):
+        from .disease_runtime import export_torchscript
+
+        self.assertParity('torchscript', export_torchscript)
+
+    @skipUnless(module_installed('onnx') and module_installed('onnxruntime'), 'onnx/onnxruntime are not installed')
+    def test_onnx_matches_eager(self):
+        from .disease_runtime import export_onnx
+
+        self.assertParity('onnx', export_onnx)
+
+
+@override_settings(OPEN_METEO_RETRIES=2, OPEN_METEO_RETRY_BACKOFF=0.01,
+                   OPEN_METEO_BREAKER_FAILURES=2, OPEN_METEO_BREAKER_RESET_SECONDS=0.2)
+class OpenMeteoClientTests(SimpleTestCase):
+    """The Open-Meteo client against the local stand-in (api/fake_open_meteo.py)"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeOpenMeteoServer().start()
+        cls.urls = override_settings(OPEN_METEO_FORECAST_URL=cls.server.forecast_url,
+                                     OPEN_METEO_ARCHIVE_URL=cls.server.archive_url)
+        cls.urls.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.urls.disable()
+        cls.server.stop()
+        open_meteo.breakers.clear()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.fail_next = 0
+        open_meteo.breakers.clear()  # Rebuilt from the overridden settings
+
+    def test_retries_transient_failures(self):
+        self.server.fail_next = 2
+        forecast = open_meteo.fetch_forecast(36.5, 10.5)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(forecast['current']['temperature'],
+                         forecast_payload(36.5, 10.5)['current']['temperature_2m'])
+
+    def test_gives_up_after_retries(self):
+        self.server.fail_next = 10
+        with self.assertRaises(open_meteo.OpenMeteoError):
+            open_meteo.fetch_forecast(36.5, 10.5)
+        self.assertEqual(len(self.server.requests), 3)
+
+    @override_settings(OPEN_METEO_RETRIES=0)
+    def test_circuit_breaker_opens_and_half_opens(self):
+        self.server.fail_next = 10
+        for _ in range(2):
+            with self.assertRaises(open_meteo.OpenMeteoError):
+                open_meteo.fetch_forecast(36.5, 10.5)
+        breaker = open_meteo.get_breaker('forecast')
+        self.assertEqual(breaker.state, 'open')
+
+        # Open: fails without calling the service
+        with self.assertRaisesMessage(open_meteo.OpenMeteoError, 'temporarily unavailable'):
+            open_meteo.fetch_forecast(36.5, 10.5)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Half-open: a failed trial call opens it again
+        time.sleep(0.25)
+        self.assertEqual(breaker.state, 'half-open')
+        with self.assertRaises(open_meteo.OpenMeteoError):
+            open_meteo.fetch_forecast(36.5, 10.5)
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(len(self.server.requests), 3)
+
+        # Half-open: a successful trial call closes it
+        time.sleep(0.25)
+        self.server.fail_next = 0
+        open_meteo.fetch_forecast(36.5, 10.5)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_multi_location_forecasts_keep_their_order(self):
+        locations = [(36.5, 10.5), (-12.25, 44.75), (51.5, -0.25)]
+        with patch.object(open_meteo, 'MAX_LOCATIONS_PER_REQUEST', 2):
+            forecasts = open_meteo.fetch_forecasts(locations)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual([forecast['current']['temperature'] for forecast in forecasts],
+                         [forecast_payload(lat, lng)['current']['temperature_2m'] for lat, lng in locations])
+
+    def test_multi_location_precipitation_keeps_its_order(self):
+        locations = [(36.5, 10.5), (-12.25, 44.75)]
+        end = date.today() - timedelta(days=10)
+        start = end - timedelta(days=30)
+        results = open_meteo.fetch_daily_precipitation_many(locations, start, end)
+        self.assertEqual(len(self.server.requests), 1)
+        for (lat, lng), days in zip(locations, results):
+            expected = archive_payload(lat, lng, start, end)['daily']['precipitation_sum']
+            self.assertEqual([mm for _, mm in days], expected)
+
+    def test_response_count_mismatch_is_an_error(self):
+        with self.assertRaises(open_meteo.OpenMeteoError):
+            open_meteo._as_list([{}, {}], 3)
+        self.assertEqual(open_meteo._as_list({'daily': {}}, 1), [{'daily': {}}])
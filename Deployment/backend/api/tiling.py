@@ -0,0 +1,401 @@
+"""
+Tiled farm boundary detection for inputs too large to run through YOLO in one pass.
+
+A large input (an uploaded orthomosaic/GeoTIFF, or a bounds box plus zoom level
+fetched from an XYZ tile server) is wrapped in a *source* that can read any
+pixel window and convert pixel coordinates to longitude/latitude. The source is
+split into overlapping tiles that are read and run through the farm boundary
+model one at a time, so memory stays bounded by the tile size rather than the
+input size. Polygons are collected in global pixel coordinates, fields cut by a
+tile seam (which appear in both overlapping tiles) are merged, and the result is
+returned as a single GeoJSON FeatureCollection.
+
+rasterio is optional and only needed for georeferenced GeoTIFF uploads.
+"""
+import logging
+import math
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import requests
+from django.conf import settings
+
+from .geo import (
+    lat_to_mercator_y, lng_to_mercator_x, mercator_x_to_lng, mercator_y_to_lat,
+    pixels_to_lnglat, polygon_area_hectares,
+)
+from .image_io import decode_image_buffer
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256  # XYZ tile size in pixels
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_OVERLAP = 128
+# Accepted tile_size range of tiled detection requests; overlap must stay below half a tile
+MIN_TILE_SIZE = 256
+MAX_TILE_SIZE = 4096
+# Detections from neighbouring tiles are merged when they share at least this
+# fraction of the smaller polygon's area
+DEFAULT_MIN_OVERLAP = 0.1
+# Largest canvas side used when rasterizing polygons for merging
+MAX_MERGE_CANVAS = 2048
+
+
+# --- Helper Functions ---
+
+def farm_size_category(area_hectares):
+    """Classify a detected field by area"""
+    if area_hectares < 1:
+        return "Hobby Farm (<1 Ha)"
+    elif area_hectares < 10:
+        return "Standard Cultivation (1-10 Ha)"
+    elif area_hectares < 100:
+        return "Large Estate (10-100 Ha)"
+    return "Major Operation (>100 Ha)"
+
+
+def _to_rgb_uint8(arr):
+    """Normalise a (H, W, C) raster window to 3-channel uint8"""
+    if arr.dtype != np.uint8:
+        if np.issubdtype(arr.dtype, np.integer):
+            arr = (arr.astype(np.float32) * (255.0 / np.iinfo(arr.dtype).max))
+        else:
+            # Floating point rasters are assumed to hold reflectance in [0, 1]
+            arr = arr.astype(np.float32) * 255.0
+        arr = np.clip(arr, 0, 255).astype(np.uint8)
+    if arr.shape[2] == 1:
+        arr = np.repeat(arr, 3, axis=2)
+    return np.ascontiguousarray(arr[:, :, :3])
+
+
+# --- Sources ---
+
+class ArraySource:
+    """
+    An already decoded image covering `bounds` ({'north', 'south', 'east', 'west'}),
+    mapped to lng/lat with the given projection ('linear' or 'mercator').
+    """
+    def __init__(self, image, bounds, projection='linear'):
+        self.image = image
+        self.height, self.width = image.shape[:2]
+        self.bounds = bounds
+        self.projection = projection
+
+    def read_window(self, x, y, width, height):
+        return self.image[y:y + height, x:x + width]
+
+    def pixels_to_lnglat(self, points):
+        return pixels_to_lnglat(points, self.width, self.height, self.bounds, self.projection, clamp=False)
+
+    def close(self):
+        self.image = None
+
+
+class RasterioSource:
+    """A georeferenced raster (GeoTIFF) read window by window with rasterio"""
+    def __init__(self, path):
+        try:
+            import rasterio
+        except ImportError:
+            raise ValueError("GeoTIFF input requires the optional 'rasterio' package")
+        from rasterio.windows import Window
+
+        self._window_cls = Window
+        self.dataset = rasterio.open(path)
+        if self.dataset.crs is None:
+            self.dataset.close()
+            raise ValueError("GeoTIFF has no coordinate reference system")
+        self.width = self.dataset.width
+        self.height = self.dataset.height
+        self.bands = [1, 2, 3] if self.dataset.count >= 3 else [1]
+
+    def read_window(self, x, y, width, height):
+        window = self._window_cls(x, y, min(width, self.width - x), min(height, self.height - y))
+        arr = self.dataset.read(self.bands, window=window)
+        return _to_rgb_uint8(np.moveaxis(arr, 0, -1))
+
+    def pixels_to_lnglat(self, points):
+        from rasterio.transform import xy
+        from rasterio.warp import transform
+
+        xs, ys = xy(self.dataset.transform, points[:, 1], points[:, 0], offset='ul')
+        xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        if not self.dataset.crs.is_geographic:
+            xs, ys = transform(self.dataset.crs, 'EPSG:4326', xs, ys)
+        return np.column_stack([xs, ys])
+
+    def close(self):
+        self.dataset.close()
+
+
+class XYZSource:
+    """
+    Satellite imagery for a bounds box at a given zoom level, assembled on demand
+    from a Web Mercator XYZ tile server (settings.MAP_TILE_URL_TEMPLATE).
+    Fetched tiles are kept in a small LRU so overlapping windows don't refetch them;
+    it is sized for windows of `tile_size` pixels, as read by iter_tiles.
+    """
+    def __init__(self, bounds, zoom, url_template=None, session=None, tile_size=DEFAULT_TILE_SIZE):
+        self.zoom = int(zoom)
+        self.url_template = url_template or settings.MAP_TILE_URL_TEMPLATE
+        self.session = session or requests.Session()
+        self.world_size = TILE_SIZE * (2 ** self.zoom)
+
+        left, top = self._lnglat_to_world(bounds['west'], bounds['north'])
+        right, bottom = self._lnglat_to_world(bounds['east'], bounds['south'])
+        self.origin_x, self.origin_y = int(math.floor(left)), int(math.floor(top))
+        self.width = max(1, int(math.ceil(right)) - self.origin_x)
+        self.height = max(1, int(math.ceil(bottom)) - self.origin_y)
+
+        # Enough tiles for two rows of windows; older tiles are dropped
+        tiles_across = self.width // TILE_SIZE + 2
+        self._cache = OrderedDict()
+        self._cache_size = tiles_across * (2 * max(int(tile_size), TILE_SIZE) // TILE_SIZE + 2)
+
+    def _lnglat_to_world(self, lng, lat):
+        return float(lng_to_mercator_x(lng)) * self.world_size, float(lat_to_mercator_y(lat)) * self.world_size
+
+    def _fetch_tile(self, tx, ty):
+        key = (tx, ty)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        url = self.url_template.format(z=self.zoom, x=tx, y=ty)
+        response = self.session.get(url, timeout=15)
+        response.raise_for_status()
+        tile = decode_image_buffer(response.content)
+
+        self._cache[key] = tile
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return tile
+
+    def read_window(self, x, y, width, height):
+        width = min(width, self.width - x)
+        height = min(height, self.height - y)
+        wx, wy = self.origin_x + x, self.origin_y + y
+        window = np.zeros((height, width, 3), dtype=np.uint8)
+
+        for ty in range(wy // TILE_SIZE, (wy + height - 1) // TILE_SIZE + 1):
+            for tx in range(wx // TILE_SIZE, (wx + width - 1) // TILE_SIZE + 1):
+                tile = self._fetch_tile(tx, ty)
+                # Intersection of the tile with the window, in world pixels
+                x0, y0 = max(wx, tx * TILE_SIZE), max(wy, ty * TILE_SIZE)
+                x1 = min(wx + width, (tx + 1) * TILE_SIZE)
+                y1 = min(wy + height, (ty + 1) * TILE_SIZE)
+                window[y0 - wy:y1 - wy, x0 - wx:x1 - wx] = tile[
+                    y0 - ty * TILE_SIZE:y1 - ty * TILE_SIZE, x0 - tx * TILE_SIZE:x1 - tx * TILE_SIZE
+                ]
+        return window
+
+    def pixels_to_lnglat(self, points):
+        lng = mercator_x_to_lng((points[:, 0] + self.origin_x) / self.world_size)
+        lat = mercator_y_to_lat((points[:, 1] + self.origin_y) / self.world_size)
+        return np.column_stack([lng, lat])
+
+    def close(self):
+        self.session.close()
+        self._cache.clear()
+
+
+# --- Tiling ---
+
+def tile_origins(length, tile_size, overlap):
+    """Start offsets along one axis so tiles of `tile_size` cover `length` with at least `overlap`"""
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    origins = list(range(0, length - tile_size, stride))
+    origins.append(length - tile_size)  # Last tile flush with the edge
+    return origins
+
+
+def iter_tiles(source, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP):
+    """Yield (x, y, tile_image) for overlapping tiles, reading one window at a time"""
+    for y in tile_origins(source.height, tile_size, overlap):
+        for x in tile_origins(source.width, tile_size, overlap):
+            yield x, y, source.read_window(x, y, tile_size, tile_size)
+
+
+def iter_tile_detections(source, predict, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP):
+    """
+    Run `predict(tile_image)` (returning ultralytics results) on each tile and yield
+    detections as {'points': (N, 2) float array in source pixels, 'confidence': float}.
+    """
+    for x, y, tile in iter_tiles(source, tile_size, overlap):
+        if not tile.any():
+            continue  # Empty (nodata) tile
+
+        results = predict(tile)
+        if not results or not results[0].masks:
+            continue
+
+        boxes = results[0].boxes
+        for i, mask_xy in enumerate(results[0].masks.xy):
+            if len(mask_xy) < 3:
+                continue
+            confidence = float(boxes[i].conf.item()) if boxes is not None and i < len(boxes) else 0.0
+            yield {'points': mask_xy.astype(np.float64) + (x, y), 'confidence': confidence}
+
+
+# --- Seam merging ---
+
+def _rasterize(polygons, x0, y0, scale, shape):
+    canvas = np.zeros(shape, dtype=np.uint8)
+    for points in polygons:
+        pts = np.round((points - (x0, y0)) * scale).astype(np.int32)
+        cv2.fillPoly(canvas, [pts], 1)
+    return canvas
+
+
+def _canvas_for(bbox):
+    """Origin, scale and shape for a rasterization canvas covering bbox (x0, y0, x1, y1)"""
+    x0, y0, x1, y1 = bbox
+    scale = min(1.0, MAX_MERGE_CANVAS / max(x1 - x0, y1 - y0, 1))
+    shape = (int(math.ceil((y1 - y0) * scale)) + 1, int(math.ceil((x1 - x0) * scale)) + 1)
+    return x0, y0, scale, shape
+
+
+def _overlap_ratio(a, b, bbox):
+    x0, y0, scale, shape = _canvas_for(bbox)
+    mask_a = _rasterize([a], x0, y0, scale, shape)
+    mask_b = _rasterize([b], x0, y0, scale, shape)
+    smaller = min(mask_a.sum(), mask_b.sum())
+    if smaller == 0:
+        return 0.0
+    return float(np.logical_and(mask_a, mask_b).sum()) / float(smaller)
+
+
+def merge_detections(detections, min_overlap=DEFAULT_MIN_OVERLAP):
+    """
+    Merge detections of the same field seen in more than one overlapping tile.
+
+    Detections whose bounding boxes intersect and whose rasterized overlap covers at
+    least `min_overlap` of the smaller polygon are grouped; each group is replaced by
+    the outer contour of its union. Returns a list of detections in the same format.
+    """
+    if not detections:
+        return []
+
+    bboxes = np.array([
+        [d['points'][:, 0].min(), d['points'][:, 1].min(), d['points'][:, 0].max(), d['points'][:, 1].max()]
+        for d in detections
+    ])
+
+    parent = list(range(len(detections)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(detections)):
+        # Vectorised bounding box test against every later detection
+        candidates = np.nonzero(
+            (bboxes[i + 1:, 0] < bboxes[i, 2]) & (bboxes[i + 1:, 2] > bboxes[i, 0]) &
+            (bboxes[i + 1:, 1] < bboxes[i, 3]) & (bboxes[i + 1:, 3] > bboxes[i, 1])
+        )[0] + i + 1
+        for j in candidates:
+            root_i, root_j = find(i), find(j)
+            if root_i == root_j:
+                continue
+            joint = (
+                min(bboxes[i, 0], bboxes[j, 0]), min(bboxes[i, 1], bboxes[j, 1]),
+                max(bboxes[i, 2], bboxes[j, 2]), max(bboxes[i, 3], bboxes[j, 3]),
+            )
+            if _overlap_ratio(detections[i]['points'], detections[j]['points'], joint) >= min_overlap:
+                parent[root_j] = root_i
+
+    groups = {}
+    for i in range(len(detections)):
+        groups.setdefault(find(i), []).append(i)
+
+    merged = []
+    for members in groups.values():
+        if len(members) == 1:
+            merged.append(detections[members[0]])
+            continue
+
+        bbox = (
+            bboxes[members, 0].min(), bboxes[members, 1].min(),
+            bboxes[members, 2].max(), bboxes[members, 3].max(),
+        )
+        x0, y0, scale, shape = _canvas_for(bbox)
+        canvas = _rasterize([detections[m]['points'] for m in members], x0, y0, scale, shape)
+        contours, _ = cv2.findContours(canvas, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            continue
+        outline = max(contours, key=cv2.contourArea).reshape(-1, 2).astype(np.float64)
+        merged.append({
+            'points': outline / scale + (x0, y0),
+            'confidence': max(detections[m]['confidence'] for m in members),
+        })
+    return merged
+
+
+# --- GeoJSON output ---
+
+def detections_to_features(source, detections, smoothing=0.01):
+    """Smooth each merged polygon like the single-image endpoint and convert it to a GeoJSON Feature"""
+    features = []
+    for i, detection in enumerate(detections):
+        contour = np.round(detection['points']).astype(np.int32).reshape((-1, 1, 2))
+        epsilon = smoothing * cv2.arcLength(contour, True)
+        smoothed = cv2.approxPolyDP(contour, epsilon, True).reshape((-1, 2))
+        if len(smoothed) < 3:
+            continue
+
+        # Clamp to the source extent
+        smoothed = np.clip(smoothed, 0, [source.width - 1, source.height - 1]).astype(np.float64)
+        lnglat = source.pixels_to_lnglat(smoothed)
+        area_hectares = round(float(polygon_area_hectares(lnglat)), 2)
+        size_category = farm_size_category(area_hectares)
+
+        ring = lnglat.tolist()
+        ring.append(ring[0])  # GeoJSON rings are closed
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {
+                "id": i,
+                "area_hectares": area_hectares,
+                "size_category": size_category,
+                "confidence": round(detection['confidence'], 2),
+                "message": f"Detected a {size_category.split(' (')[0]}.",
+            },
+        })
+    return features
+
+
+def detect_boundaries_tiled(source, predict, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+                            min_overlap=DEFAULT_MIN_OVERLAP):
+    """
+    Run tiled detection over a source and return a GeoJSON FeatureCollection.
+
+    Args:
+        source: ArraySource, RasterioSource or XYZSource
+        predict: Callable taking one tile image and returning ultralytics results
+        tile_size: Tile side in pixels
+        overlap: Pixels shared by neighbouring tiles; should exceed half a typical field width
+        min_overlap: Overlap fraction above which detections from different tiles are merged
+    """
+    if overlap >= tile_size:
+        raise ValueError("overlap must be smaller than tile_size")
+
+    detections = list(iter_tile_detections(source, predict, tile_size, overlap))
+    merged = merge_detections(detections, min_overlap=min_overlap)
+    logger.info(f"Tiled detection: {len(detections)} tile detections merged into {len(merged)} fields")
+
+    return {
+        "type": "FeatureCollection",
+        "features": detections_to_features(source, merged),
+        "properties": {
+            "width": source.width,
+            "height": source.height,
+            "tiles": len(tile_origins(source.width, tile_size, overlap)) * len(tile_origins(source.height, tile_size, overlap)),
+            "tile_detections": len(detections),
+        },
+    }
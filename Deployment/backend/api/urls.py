@@ -1,14 +1,17 @@
 from django.urls import path
 from . import views
-from .views import DetectDiseaseView, TreatmentChatView
+from .views import DetectDiseaseView, DetectDiseaseBatchView, TreatmentChatView
 
 # Define your API URLs here
 urlpatterns = [
     # Example: path('some-endpoint/', views.some_view, name='some-view'),
     path('segment-map/', views.SegmentMapView.as_view(), name='segment_map_api'),
     path('detect-farm-boundaries/', views.detect_farm_boundaries_view, name='detect_farm_boundaries'),
+    path('detect-farm-boundaries/tiled/', views.detect_farm_boundaries_tiled_view, name='detect_farm_boundaries_tiled'),
     path('detect-weeds/', views.detect_weeds_view, name='detect_weeds'),
     path('detect-disease/', DetectDiseaseView.as_view(), name='detect_disease'),
+    path('detect-disease/batch/', DetectDiseaseBatchView.as_view(), name='detect_disease_batch'),
+    path('inference-jobs/<uuid:job_id>/', views.inference_job_status, name='inference_job_status'),
     path('chat-treatment/', TreatmentChatView.as_view(), name='chat_treatment_api'),
     path('chat-treatment', TreatmentChatView.as_view(), name='chat_treatment_api_no_slash'),
     path('complete-onboarding/', views.complete_onboarding, name='complete_onboarding'),
@@ -16,6 +19,12 @@ urlpatterns = [
     path('farm/boundary/<int:farm_id>/', views.get_farm_boundary, name='get_farm_boundary'),
     path('farm/update-boundary/<int:farm_id>/', views.update_farm_boundary, name='update_farm_boundary'),
     path('farm/update-boundary/', views.update_farm_boundary, name='update_farm_boundary_without_id'),
+    path('farms/within/', views.farms_within, name='farms_within'),
+    path('farms/at/', views.farms_at, name='farms_at'),
+    path('farms/boundaries/', views.farm_boundaries, name='farm_boundaries'),
+    path('farms/tiles/<int:z>/<int:x>/<int:y>.mvt', views.farm_boundary_tile, name='farm_boundary_tile'),
     path('crop-classification/', views.CropClassificationView.as_view({'post': 'create', 'get': 'list'}), name='crop_classification'),
+    path('models/status/', views.model_registry_status, name='model_registry_status'),
+    path('crop-classification/bulk/', views.CropClassificationView.as_view({'post': 'bulk'}), name='crop_classification_bulk'),
     path('crop-classification/<int:pk>/', views.CropClassificationView.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}), name='crop_classification_detail'),
 ]
@@ -0,0 +1,191 @@
+"""
+Minimal Mapbox Vector Tile (MVT 2.1) encoder for farm boundary polygons.
+
+Only what the farm tiles need is implemented: one or more layers of polygon features
+with string/number properties, written as protobuf by hand so no extra dependency is
+required. Coordinates are projected to Web Mercator tile pixels with the helpers in
+api/geo.py and quantized to the tile extent. See
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1 for the format.
+"""
+import json
+
+import numpy as np
+from rest_framework.renderers import BaseRenderer
+
+from .geo import lng_to_mercator_x, lat_to_mercator_y, mercator_x_to_lng, mercator_y_to_lat
+
+EXTENT = 4096
+CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+# Geometry commands
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POLYGON = 3
+
+
+def tile_bounds(z, x, y):
+    """(west, south, east, north) in degrees of an XYZ tile"""
+    n = 2 ** z
+    west, east = float(mercator_x_to_lng(x / n)), float(mercator_x_to_lng((x + 1) / n))
+    north, south = float(mercator_y_to_lat(y / n)), float(mercator_y_to_lat((y + 1) / n))
+    return west, south, east, north
+
+
+def lnglat_to_tile_pixels(lnglat, z, x, y, extent=EXTENT):
+    """Project an (N, 2) lng/lat array to integer pixel coordinates of tile z/x/y"""
+    n = 2 ** z
+    px = (lng_to_mercator_x(lnglat[:, 0]) * n - x) * extent
+    py = (lat_to_mercator_y(lnglat[:, 1]) * n - y) * extent
+    return np.rint(np.column_stack([px, py])).astype(np.int64)
+
+
+# --- protobuf primitives ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _varint_field(field, value):
+    return _key(field, 0) + _varint(value)
+
+
+def _packed_field(field, values):
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _value(value):
+    """Encode a property value as a Tile.Value message"""
+    if isinstance(value, bool):
+        return _varint_field(7, int(value))
+    if isinstance(value, int):
+        return _varint_field(6, _zigzag(value))  # sint_value
+    if isinstance(value, float):
+        return _key(3, 1) + np.float64(value).tobytes()  # double_value, little-endian
+    return _bytes_field(1, str(value).encode())
+
+
+# --- geometry ---
+
+def _ring_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def _clean_ring(ring):
+    """Drop the closing point and consecutive duplicates left by quantization"""
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        ring = ring[:-1]
+    if len(ring) > 1:
+        ring = ring[np.concatenate([[True], np.any(ring[1:] != ring[:-1], axis=1)])]
+    return ring
+
+
+def polygon_commands(polygons):
+    """
+    Geometry command integers for (multi)polygons given as lists of tile pixel rings.
+    Exterior rings are written clockwise on screen (positive area with y down) and holes
+    counter-clockwise, as the spec requires.
+    """
+    commands = []
+    cursor = np.zeros(2, dtype=np.int64)
+    for polygon in polygons:
+        for index, ring in enumerate(polygon):
+            ring = _clean_ring(ring)
+            if len(ring) < 3:
+                if index == 0:
+                    break  # degenerate exterior: skip the whole polygon
+                continue
+            area = _ring_area(ring)
+            if not area:
+                if index == 0:
+                    break
+                continue
+            if (area > 0) != (index == 0):
+                ring = ring[::-1]
+            deltas = np.diff(np.vstack([cursor, ring]), axis=0)
+            cursor = ring[-1]
+            commands.append((MOVE_TO & 0x7) | (1 << 3))
+            commands.extend(_zigzag(int(v)) for v in deltas[0])
+            commands.append((LINE_TO & 0x7) | ((len(ring) - 1) << 3))
+            commands.extend(_zigzag(int(v)) for v in deltas[1:].ravel())
+            commands.append((CLOSE_PATH & 0x7) | (1 << 3))
+    return commands
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """
+    Encode one layer.
+
+    Args:
+        name: Layer name
+        features: Iterable of (feature_id, polygons, properties); polygons are lists of
+            rings in tile pixels (see lnglat_to_tile_pixels)
+    """
+    keys, values = {}, {}
+    encoded_features = []
+    for feature_id, polygons, properties in features:
+        commands = polygon_commands(polygons)
+        if not commands:
+            continue
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        encoded_features.append(_bytes_field(2, (
+            _varint_field(1, feature_id)
+            + (_packed_field(2, tags) if tags else b'')
+            + _varint_field(3, POLYGON)
+            + _packed_field(4, commands)
+        )))
+
+    layer = (
+        _varint_field(15, 2)
+        + _bytes_field(1, name.encode())
+        + b''.join(encoded_features)
+        + b''.join(_bytes_field(3, key.encode()) for key in keys)
+        + b''.join(_bytes_field(4, _value(value)) for _, value in values)
+        + _varint_field(5, extent)
+    )
+    return _bytes_field(3, layer)
+
+
+def encode_tile(layers):
+    """Encode a tile from {'layer name': features} (see encode_layer)"""
+    return b''.join(encode_layer(name, features) for name, features in layers.items())
+
+
+
+class VectorTileRenderer(BaseRenderer):
+    """
+    Passes encoded tiles through whatever the client accepts (map libraries send
+    application/x-protobuf, */* or nothing); error payloads are rendered as JSON.
+    """
+    media_type = '*/*'
+    format = 'mvt'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode()
@@ -3,8 +3,8 @@ from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .serializers import CropClassificationSerializer
-from core.models import CropClassification
-import pandas as pd
+from .bulk_classification import classify_farms, ClassifierUnavailable
+from core.models import CropClassification, Farm
 import traceback
 import logging
 
@@ -63,6 +63,60 @@ class CropClassificationView(viewsets.ModelViewSet):
                 "detail": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def bulk(self, request, *args, **kwargs):
+        """
+        Classify many farms in one request.
+
+        Body:
+            farms: optional list of farm IDs (defaults to every farm the user can access)
+            defaults: input values used for farms that have no data of their own
+            overrides: {farm_id: {field: value}} per-farm values that take precedence
+        """
+        try:
+            profile = request.user.profile
+            if profile.is_admin or request.user.is_staff:
+                farms = Farm.objects.all()
+            elif hasattr(profile, 'farmer_profile'):
+                farms = profile.farmer_profile.farms.all()
+            else:
+                return Response({"error": "Only farmers can create crop classifications"}, status=status.HTTP_403_FORBIDDEN)
+
+            farm_ids = request.data.get('farms')
+            if farm_ids:
+                requested = set(int(farm_id) for farm_id in farm_ids)
+                farms = farms.filter(id__in=requested)
+                inaccessible = requested - set(farms.values_list('id', flat=True))
+                if inaccessible:
+                    return Response({
+                        "error": "You don't have access to these farms",
+                        "farms": sorted(inaccessible)
+                    }, status=status.HTTP_403_FORBIDDEN)
+
+            defaults = request.data.get('defaults') or {}
+            overrides = request.data.get('overrides') or {}
+            if not isinstance(defaults, dict) or not isinstance(overrides, dict):
+                return Response({"error": "defaults and overrides must be objects"}, status=status.HTTP_400_BAD_REQUEST)
+
+            classifications, skipped = classify_farms(farms, defaults=defaults, overrides=overrides)
+
+            return Response({
+                "created": len(classifications),
+                "results": self.get_serializer(classifications, many=True).data,
+                "skipped": skipped,
+            }, status=status.HTTP_201_CREATED)
+
+        except ClassifierUnavailable as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except (TypeError, ValueError) as e:
+            return Response({"error": "Invalid bulk classification request", "detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error in bulk crop classification: {e}")
+            logger.error(traceback.format_exc())
+            return Response({
+                "error": "Error processing bulk crop classification",
+                "detail": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # Other views continue here...
 
 import base64
@@ -70,25 +124,19 @@ import io
 from PIL import Image
 import cv2 # Ensure OpenCV is imported
 import numpy as np # Ensure numpy is imported
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt # Ensure csrf_exempt is imported
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.conf import settings # Make sure settings is imported
 import json
+import hashlib
 import math # Import math for calculations
 import os # Add os import
 import csv # Import CSV module
 
-from ultralytics import YOLO
-import torch
-import torch.nn as nn # Ensure nn is imported
-import torch.nn.functional as F # Ensure F is imported
-import torchvision.transforms as transforms
-# from torchvision.models import resnet9 # Or your specific ResNet9 import if custom -- THIS LINE IS THE ISSUE
-
-# Import for Google Generative AI
-import google.generativeai as genai
+# torch, ultralytics and google.generativeai are imported lazily (see .model_registry
+# and get_genai below) so that management commands and non-ML endpoints start quickly.
 from dotenv import load_dotenv
 import re
 import random
@@ -97,282 +145,176 @@ import time
 import requests
 from datetime import datetime, timedelta
 
-from core.models import UserProfile, Farm, Farmer, Weather, FarmCrop, Recommendation, CropClassification
+from core.models import UserProfile, Farm, Farmer, Weather, FarmCrop, Recommendation, CropClassification, InferenceJob
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django.db import transaction
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
 from .serializers import CropClassificationSerializer
+from .model_registry import registry
+from .batching import describe_batchers
+from .image_io import read_image_request, ImageDecodeError
+from .geo import PROJECTIONS
+from .inference_cache import inference_cache, digest_array, digest_uploaded_file
+from .detection import run_detection
+from .postprocessing import OUTPUT_FORMATS
+from .inference_queue import submit_job, wait_for_job, job_payload
+from .vector_tiles import VectorTileRenderer
+from .open_meteo import OpenMeteoError
+from .weather_cache import get_weather
+from .weather_refresh import weather_fields
+from .weather_recommendations import build_weather_recommendations, flowering_crops, save_recommendations
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Configure the Google API key
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
-else:
+if not GOOGLE_API_KEY:
     print("GOOGLE_API_KEY not found in .env file. Please set it up.")
 
-# --- Model Definitions from Notebook ---
-def accuracy(outputs, labels):
-    _, preds = torch.max(outputs, dim=1)
-    return torch.tensor(torch.sum(preds == labels).item() / len(preds))
-
-class ImageClassificationBase(nn.Module):
-    def training_step(self, batch):
-        images, labels = batch
-        out = self(images)
-        loss = F.cross_entropy(out, labels)
-        return loss
-
-    def validation_step(self, batch):
-        images, labels = batch
-        out = self(images)
-        loss = F.cross_entropy(out, labels)
-        acc = accuracy(out, labels)
-        preds = torch.argmax(out, dim=1)
-        return {
-            "val_loss": loss.detach(),
-            "val_accuracy": acc,
-            "preds": preds.detach(),
-            "labels": labels.detach()
-        }
+_genai = None
+
+def get_genai():
+    """Import and configure google.generativeai on first use"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        _genai = genai
+    return _genai
+
+# --- Helper Function: JSON response annotated with the result cache outcome ---
+def inference_response(data, cache_status, safe=True):
+    """Return a JsonResponse with an X-Inference-Cache header ('hit' or 'miss')"""
+    response = JsonResponse(data, safe=safe)
+    response['X-Inference-Cache'] = cache_status
+    return response
+
+# --- Helper Function: check a model can serve requests ---
+def model_available(name):
+    """
+    Whether model `name` can serve requests. In queue mode the inference workers load
+    the models, so this process only checks that the weights exist.
+    """
+    if settings.INFERENCE_MODE == 'queue':
+        return registry.checksum(name) is not None
+    return registry.get(name) is not None
 
-    def validation_epoch_end(self, outputs):
-        batch_losses = [x["val_loss"] for x in outputs]
-        batch_accuracy = [x["val_accuracy"] for x in outputs]
-        epoch_loss = torch.stack(batch_losses).mean()
-        epoch_accuracy = torch.stack(batch_accuracy).mean()
-        return {"val_loss": epoch_loss, "val_accuracy": epoch_accuracy}
-
-    def epoch_end(self, epoch, result):
-        print("Epoch [{}], last_lr: {:.5f}, train_loss: {:.4f}, val_loss: {:.4f}, val_acc: {:.4f}".format(
-            epoch, result['lrs'][-1], result['train_loss'], result['val_loss'], result['val_accuracy']))
-
-def ConvBlock(in_channels, out_channels, pool=False):
-    layers = [nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
-             nn.BatchNorm2d(out_channels),
-             nn.ReLU(inplace=True)]
-    if pool:
-        layers.append(nn.MaxPool2d(4))
-    return nn.Sequential(*layers)
-
-class ResNet9(ImageClassificationBase):
-    def __init__(self, in_channels, num_diseases):
-        super().__init__()
-        self.conv1 = ConvBlock(in_channels, 64)
-        self.conv2 = ConvBlock(64, 128, pool=True)
-        self.res1 = nn.Sequential(ConvBlock(128, 128), ConvBlock(128, 128))
-        self.conv3 = ConvBlock(128, 256, pool=True)
-        self.conv4 = ConvBlock(256, 512, pool=True)
-        self.res2 = nn.Sequential(ConvBlock(512, 512), ConvBlock(512, 512))
-        self.classifier = nn.Sequential(nn.MaxPool2d(4),
-                                       nn.Flatten(),
-                                       nn.Linear(512, num_diseases))
-
-    def forward(self, xb):
-        out = self.conv1(xb)
-        out = self.conv2(out)
-        out = self.res1(out) + out
-        out = self.conv3(out)
-        out = self.conv4(out)
-        out = self.res2(out) + out
-        out = self.classifier(out)
-        return out
-# --- End Model Definitions ---
-
-# --- Configuration ---
-# Use a relative path based on the Django project's BASE_DIR
-# Assuming BASE_DIR points to the 'backend' directory
-MODEL_PATH = os.path.normpath(os.path.join(settings.BASE_DIR, '../../Models/Farm Boundaries/yolov8l-seg.pt'))
-# Path for the weed detection model
-WEED_MODEL_PATH = os.path.normpath(os.path.join(settings.BASE_DIR, '../../Models/Weed Detection/PIDS_weed_detection.pt'))
-# Path for the disease detection model
-DISEASE_MODEL_PATH = os.path.normpath(os.path.join(settings.BASE_DIR, '../../Models/Disease Detection/diseases_model_fixed.pt'))
-
-# Load the model (consider loading it once globally if performance is critical)
-# For simplicity here, loading per request. Optimize later if needed.
-try:
-    model = YOLO(MODEL_PATH)
-    print(f"Successfully loaded farm boundary model from {MODEL_PATH}")
-except Exception as e:
-    print(f"Error loading farm boundary model: {e}")
-    model = None # Handle cases where the model fails to load
-
-# Load the weed detection model
-try:
-    weed_model = YOLO(WEED_MODEL_PATH)
-    print(f"Successfully loaded weed detection model from {WEED_MODEL_PATH}")
-except Exception as e:
-    print(f"Error loading weed detection model: {e}")
-    weed_model = None # Handle cases where the weed model fails to load
-
-# Define disease classes (should be before model loading if num_classes is derived from it)
-DISEASE_CLASSES = ['Pepper,_bell___healthy', 'Orange___Haunglongbing_(Citrus_greening)', 'Apple___Apple_scab', 'Tomato___Target_Spot', 'Peach___healthy', 'Grape___Black_rot', 'Apple___healthy', 'Tomato___healthy', 'Tomato___Septoria_leaf_spot', 'Raspberry___healthy', 'Squash___Powdery_mildew', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus', 'Strawberry___healthy', 'Potato___Early_blight', 'Potato___Late_blight', 'Peach___Bacterial_spot', 'Potato___healthy', 'Cherry_(including_sour)___Powdery_mildew', 'Pepper,_bell___Bacterial_spot', 'Blueberry___healthy', 'Cherry_(including_sour)___healthy', 'Apple___Cedar_apple_rust', 'Strawberry___Leaf_scorch', 'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot', 'Tomato___Early_blight', 'Tomato___Spider_mites Two-spotted_spider_mite', 'Corn_(maize)___healthy', 'Tomato___Leaf_Mold', 'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Corn_(maize)___Common_rust_', 'Tomato___Bacterial_spot', 'Corn_(maize)___Northern_Leaf_Blight', 'Grape___healthy', 'Apple___Black_rot', 'Grape___Esca_(Black_Measles)', 'Soybean___healthy', 'Tomato___Tomato_mosaic_virus', 'Tomato___Late_blight']
-
-# Load the disease detection model
-disease_model = None # Initialize as None
-try:
-    num_classes = len(DISEASE_CLASSES)
-    # Instantiate the model architecture
-    disease_model_instance = ResNet9(in_channels=3, num_diseases=num_classes)
-    
-    # Load the state dictionary
-    state_dict = torch.load(DISEASE_MODEL_PATH, map_location=torch.device('cpu'))
-    disease_model_instance.load_state_dict(state_dict)
-    
-    # Set the model to evaluation mode
-    disease_model_instance.eval()
-    
-    disease_model = disease_model_instance # Assign the successfully loaded model
-    print(f"Successfully loaded disease detection model state_dict from {DISEASE_MODEL_PATH}")
-except Exception as e:
-    print(f"Error loading disease detection model: {e}") # disease_model remains None
-
-# --- Helper Function: Pixel Coordinates to Geo Coordinates ---
-# IMPORTANT: This is a simplified linear interpolation assuming a flat Earth projection
-# over the small area shown in the map view (like Web Mercator locally).
-# Accuracy depends on zoom level and latitude. May need refinement.
-def pixel_to_geo(px, py, img_width, img_height, bounds):
-    """Converts pixel coordinates (from top-left) to geographic coordinates."""
-    # bounds should be {'north': lat, 'south': lat, 'east': lng, 'west': lng}
-    map_width_deg = bounds['east'] - bounds['west']
-    map_height_deg = bounds['north'] - bounds['south']
-
-    # Normalize pixel coordinates (0.0 to 1.0)
-    norm_x = px / img_width
-    norm_y = py / img_height
-
-    # Calculate geo coordinates (Latitude decreases as Y increases)
-    geo_lng = bounds['west'] + (norm_x * map_width_deg)
-    geo_lat = bounds['north'] - (norm_y * map_height_deg) # Y is inverted (0 is top)
-
-    return {'lat': geo_lat, 'lng': geo_lng}
-
-# --- Helper Function: Calculate approximate area per pixel ---
-def calculate_area_per_pixel(bounds, img_width, img_height):
-    """Calculates approximate area in square meters per pixel."""
-    R_EARTH = 6371000 # Earth radius in meters
-    lat_north = math.radians(bounds['north'])
-    lat_south = math.radians(bounds['south'])
-    lon_east = math.radians(bounds['east'])
-    lon_west = math.radians(bounds['west'])
-
-    avg_lat = (lat_north + lat_south) / 2.0
-
-    # Approx distance north-south and east-west in meters
-    dist_ns = R_EARTH * (lat_north - lat_south)
-    dist_ew = R_EARTH * (lon_east - lon_west) * math.cos(avg_lat)
-
-    # Avoid division by zero if image dimensions are invalid
-    if img_height <= 0 or img_width <= 0:
-        return 0.0
-
-    meters_per_pixel_y = dist_ns / img_height
-    meters_per_pixel_x = dist_ew / img_width
-
-    # Area per pixel in square meters
-    area_sq_m_per_pixel = meters_per_pixel_x * meters_per_pixel_y
-    return area_sq_m_per_pixel
+# --- Helper Function: run a detection inline or through the inference worker queue ---
+def detection_response(request, kind, image, params, cache_key, safe=True):
+    """
+    Run a detection pipeline (api/detection.py) and return its result as a JsonResponse.
+
+    With INFERENCE_MODE='inline' the pipeline runs in this thread. With 'queue' the job is
+    handed to the inference workers and the request waits up to INFERENCE_JOB_WAIT_SECONDS
+    for the result. If ?async=1 was passed, or the wait times out, the response is 202 with
+    the job id, to be polled at /api/inference-jobs/<id>/.
+    """
+    if settings.INFERENCE_MODE != 'queue':
+        result = run_detection(kind, image, params)
+        inference_cache.set(cache_key, result)
+        return inference_response(result, 'miss', safe=safe)
+
+    result, response = queued_detection(request, kind, image, params, cache_key)
+    if response is not None:
+        return response
+    return inference_response(result, 'miss', safe=safe)
+
+def queued_detection(request, kind, image, params, cache_key=None):
+    """
+    Hand a detection to the inference workers and wait for it as detection_response does.
+    Returns (result, None) once the job is DONE, otherwise (None, response) with the 500
+    of a failed job or the 202 with the job id to poll.
+    """
+    job = submit_job(kind, image, params, cache_key=cache_key)
+    if request.GET.get('async') not in ('1', 'true'):
+        job = wait_for_job(job.id, settings.INFERENCE_JOB_WAIT_SECONDS)
+        if job.status == 'DONE':
+            if cache_key:
+                inference_cache.set(cache_key, job.result)
+            return job.result, None
+        if job.status == 'FAILED':
+            return None, JsonResponse({'error': f'Inference job failed: {job.error}', 'job_id': str(job.id)}, status=500)
+
+    return None, JsonResponse({
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('inference_job_status', args=[job.id])),
+    }, status=202)
 
 # --- API View ---
 @method_decorator(csrf_exempt, name='dispatch') # Disable CSRF for API endpoint for simplicity
 class SegmentMapView(View):
 
     def post(self, request, *args, **kwargs):
-        if not model:
+        if not model_available('farm_boundary'):
              return JsonResponse({'error': 'Farm boundary model not loaded'}, status=500)
 
         try:
-            data = json.loads(request.body)
-            image_data_url = data.get('image')
+            # Accepts multipart (file field 'image'), a raw image body, or JSON with a base64 data URL
+            img_np, data = read_image_request(request, 'image', json_fields=('mapInfo',))
             map_info = data.get('mapInfo')
 
-            if not image_data_url or not map_info:
+            if img_np is None or not map_info:
                 return JsonResponse({'error': 'Missing image or mapInfo'}, status=400)
 
             bounds = map_info.get('bounds')
             zoom = map_info.get('zoom') # Zoom might be useful for coordinate refinement later
             if not bounds or not isinstance(bounds, dict):
                  return JsonResponse({'error': 'Invalid map bounds in mapInfo'}, status=400)
+            projection = map_info.get('projection') or settings.MAP_PIXEL_PROJECTION
+            if projection not in PROJECTIONS:
+                return JsonResponse({'error': f'Invalid projection, expected one of {PROJECTIONS}'}, status=400)
 
-
-            # Decode Base64 Image
-            header, encoded = image_data_url.split(',', 1)
-            image_data = base64.b64decode(encoded)
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-            img_np = np.array(image)
-            img_height, img_width, _ = img_np.shape
-
-            # Perform Inference
-            results = model.predict(source=img_np, save=False, conf=0.5) # Adjust confidence as needed
-
-            detected_polygons = []
-
-            if results and results[0].masks:
-                print(f"Detected {len(results[0].masks)} masks.")
-                # Iterate through detected masks
-                for mask_data in results[0].masks.xy: # Use .xy for polygon points
-                    pixel_polygon = mask_data.astype(int).tolist() # List of [x, y]
-
-                    if len(pixel_polygon) < 3: # Need at least 3 points for a polygon
-                        continue
-
-                    # Convert pixel coordinates to geo coordinates
-                    geo_polygon_paths = []
-                    for px, py in pixel_polygon:
-                        # Clamp pixel values to image dimensions to avoid errors
-                        px_clamped = max(0, min(px, img_width - 1))
-                        py_clamped = max(0, min(py, img_height - 1))
-                        geo_point = pixel_to_geo(px_clamped, py_clamped, img_width, img_height, bounds)
-                        geo_polygon_paths.append(geo_point)
-
-                    detected_polygons.append({
-                        'paths': geo_polygon_paths
-                        # Add score or class if needed: 'score': score, 'class': class_name
-                    })
-            else:
-                 print("No masks detected in results.")
-
-
-            return JsonResponse({'polygons': detected_polygons})
+            # Inference and conversion to map paths run in api/detection.py
+            return detection_response(
+                request, 'segment_map', img_np, {'bounds': bounds, 'projection': projection}, cache_key=None
+            )
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except ImageDecodeError as img_err:
+            return JsonResponse({'error': f'Failed to decode image data: {img_err}'}, status=400)
         except Exception as e:
             print(f"Error during segmentation: {e}") # Log the error server-side
             return JsonResponse({'error': 'Internal server error during segmentation.'}, status=500)
 
-# --- New View for Farm Boundary Detection --- 
+# --- New View for Farm Boundary Detection ---
 
 @csrf_exempt # Disable CSRF for API endpoint for simplicity (use proper auth/CSRF in production)
 def detect_farm_boundaries_view(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST method allowed'}, status=405)
-    
-    if not model:
+
+    if not model_available('farm_boundary'):
         return JsonResponse({'error': 'Farm boundary model not loaded. Check server logs.'}, status=500)
 
     try:
-        data = json.loads(request.body)
-        image_base64 = data.get('image_base64')
+        # Accepts multipart (file field 'image'), a raw image body with ?bounds=<json>,
+        # or the JSON body with a base64 data URL in 'image_base64'
+        try:
+            img_np, data = read_image_request(request, 'image_base64', json_fields=('bounds',))
+        except ImageDecodeError as img_err:
+            print(f"Error decoding image: {img_err}")
+            return JsonResponse({'error': 'Failed to decode image data'}, status=400)
         bounds_data = data.get('bounds') # Expecting {"north_east": {"lat": y, "lng": x}, "south_west": {"lat": y, "lng": x}}
 
-        if not image_base64 or not bounds_data:
+        if img_np is None or not bounds_data:
             return JsonResponse({'error': 'Missing image_base64 or bounds'}, status=400)
-        
+
         if not isinstance(bounds_data, dict) or 'north_east' not in bounds_data or 'south_west' not in bounds_data:
              return JsonResponse({'error': 'Invalid bounds format'}, status=400)
-             
+
         ne = bounds_data['north_east']
         sw = bounds_data['south_west']
         if not all(k in ne for k in ('lat', 'lng')) or not all(k in sw for k in ('lat', 'lng')):
             return JsonResponse({'error': 'Invalid lat/lng in bounds'}, status=400)
-            
+
         # Prepare bounds for helper function (adjusting names)
         bounds_for_helper = {
             'north': ne['lat'],
@@ -380,131 +322,28 @@ def detect_farm_boundaries_view(request):
             'east': ne['lng'],
             'west': sw['lng']
         }
+        projection = data.get('projection') or settings.MAP_PIXEL_PROJECTION
+        if projection not in PROJECTIONS:
+            return JsonResponse({'error': f'Invalid projection, expected one of {PROJECTIONS}'}, status=400)
 
-        # --- Decode Image ---
-        try:
-            header, encoded = image_base64.split(',', 1)
-            image_data = base64.b64decode(encoded)
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-            img_np = np.array(image)
-            img_height, img_width, _ = img_np.shape
-            print(f"Decoded image: {img_width}x{img_height}")
-        except Exception as img_err:
-            print(f"Error decoding image: {img_err}")
-            return JsonResponse({'error': 'Failed to decode image data'}, status=400)
-            
-        # --- Perform Inference ---
-        print("Running model inference...")
-        try:
-            # Increase confidence threshold to filter weaker detections
-            # Add iou parameter and adjust confidence level
-            results = model.predict(source=img_np, save=False, conf=0.5, iou=0.45)
-        except Exception as pred_err:
-            print(f"Error during model prediction: {pred_err}")
-            return JsonResponse({'error': 'Error during model prediction'}, status=500)
-            
-        print(f"Inference complete. Results: {len(results) if results else 0}")
-        
-        # Calculate area per pixel once
-        try:
-            area_sq_m_per_pixel = calculate_area_per_pixel(bounds_for_helper, img_width, img_height)
-            print(f"Approx area per pixel (sq m): {area_sq_m_per_pixel}")
-        except Exception as area_calc_err:
-            print(f"Error calculating area per pixel: {area_calc_err}")
-            # Default to 0 or handle appropriately if calculation fails
-            area_sq_m_per_pixel = 0.0
-
-        # --- Process Results and Convert to GeoJSON ---
-        geojson_features = []
-        if results and results[0].masks:
-            print(f"Detected {len(results[0].masks)} masks.")
-            # Use .xy for polygon points (list of [x, y])
-            for i, mask_xy in enumerate(results[0].masks.xy):
-                pixel_polygon_raw = mask_xy.astype(np.int32) # Use int32 for OpenCV
-
-                if len(pixel_polygon_raw) < 3: # Need at least 3 points for a valid polygon
-                    print(f"Skipping mask {i}: Not enough points ({len(pixel_polygon_raw)})")
-                    continue
-
-                # --- Add Smoothing ---
-                # Reshape for approxPolyDP: (N, 1, 2)
-                contour = pixel_polygon_raw.reshape((-1, 1, 2))
-
-                # Calculate epsilon for approximation (e.g., 1% of arc length)
-                # Adjust the percentage (0.01) for more or less smoothing
-                epsilon = 0.01 * cv2.arcLength(contour, True)
-                smoothed_contour = cv2.approxPolyDP(contour, epsilon, True)
-
-                # Reshape back to (N, 2) and convert to list for geo conversion
-                pixel_polygon_smoothed = smoothed_contour.reshape((-1, 2)).tolist()
-
-                if len(pixel_polygon_smoothed) < 3: # Check again after smoothing
-                    print(f"Skipping mask {i}: Not enough points after smoothing ({len(pixel_polygon_smoothed)})")
-                    continue
-                # --- End Smoothing ---
-
-                # --- Calculate Area ---
-                area_hectares = 0.0
-                size_category = "Unknown"
-                if area_sq_m_per_pixel > 0:
-                    pixel_area = cv2.contourArea(smoothed_contour)
-                    area_sq_m = pixel_area * area_sq_m_per_pixel
-                    area_hectares = round(area_sq_m / 10000.0, 2) # Convert to hectares, round to 2 decimal places
-
-                    # --- Classify Size ---
-                    # Adjust thresholds as needed
-                    if area_hectares < 1:
-                        size_category = "Hobby Farm (<1 Ha)"
-                    elif area_hectares < 10:
-                        size_category = "Standard Cultivation (1-10 Ha)"
-                    elif area_hectares < 100:
-                        size_category = "Large Estate (10-100 Ha)"
-                    else:
-                        size_category = "Major Operation (>100 Ha)"
-                else:
-                    print(f"Skipping area calculation for mask {i} due to invalid area_per_pixel.")
-                # --- End Area Calculation & Classification ---
-
-
-                # Convert *smoothed* pixel coordinates to geo coordinates (list of [lng, lat]) for GeoJSON
-                geo_polygon_coords = []
-                # Use the smoothed polygon for conversion
-                for px, py in pixel_polygon_smoothed:
-                    # Clamp pixel values to image dimensions
-                    px_clamped = max(0, min(px, img_width - 1))
-                    py_clamped = max(0, min(py, img_height - 1))
-
-                    # Use the existing helper function
-                    geo_point = pixel_to_geo(px_clamped, py_clamped, img_width, img_height, bounds_for_helper)
-                    # GeoJSON uses [longitude, latitude]
-                    geo_polygon_coords.append([geo_point['lng'], geo_point['lat']])
-
-                # Ensure the polygon is closed for GeoJSON (first and last points are the same)
-                if geo_polygon_coords and geo_polygon_coords[0] != geo_polygon_coords[-1]:
-                    geo_polygon_coords.append(geo_polygon_coords[0])
-
-                # Only add if we still have a valid polygon after closing
-                if len(geo_polygon_coords) >= 4: # Need at least 4 points for a closed linear ring
-                    feature = {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "Polygon",
-                            "coordinates": [geo_polygon_coords] # GeoJSON requires an array of rings
-                        },
-                        "properties": {
-                            "id": i, # Add an identifier if needed
-                            "area_hectares": area_hectares,
-                            "size_category": size_category,
-                            "message": f"Detected a {size_category.split(' (')[0]}." # Example message
-                        }
-                    }
-                    geojson_features.append(feature)
-                else:
-                    print(f"Skipping mask {i}: Not enough points for a closed GeoJSON polygon after smoothing ({len(geo_polygon_coords)})")
+        img_height, img_width, _ = img_np.shape
+        print(f"Decoded image: {img_width}x{img_height}")
 
-        print(f"Returning {len(geojson_features)} GeoJSON features.")
-        # Return list of GeoJSON features (FeatureCollection is also common)
-        return JsonResponse(geojson_features, safe=False)
+        # --- Result Cache: identical image and parameters skip inference ---
+        cache_key = inference_cache.make_key(
+            'farm_boundary', digest_array(img_np), conf=0.5, iou=0.45, bounds=bounds_for_helper, projection=projection
+        )
+        cached = inference_cache.get(cache_key)
+        if cached is not None:
+            print("Returning cached farm boundary result.")
+            return inference_response(cached, 'hit', safe=False)
+
+        # --- Inference, smoothing, area and GeoJSON conversion (api/detection.py) ---
+        # Returns a list of GeoJSON features (FeatureCollection is also common)
+        return detection_response(
+            request, 'farm_boundary', img_np, {'bounds': bounds_for_helper, 'projection': projection},
+            cache_key, safe=False,
+        )
 
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
@@ -514,117 +353,161 @@ def detect_farm_boundaries_view(request):
         traceback.print_exc() # Print full traceback for debugging
         return JsonResponse({'error': 'Internal server error.'}, status=500)
 
+# --- Tiled Farm Boundary Detection for large orthomosaics ---
+
+def _parse_corner_bounds(bounds_data):
+    """Convert {"north_east": {...}, "south_west": {...}} bounds into north/south/east/west, or None if invalid"""
+    if not isinstance(bounds_data, dict) or 'north_east' not in bounds_data or 'south_west' not in bounds_data:
+        return None
+    ne = bounds_data['north_east']
+    sw = bounds_data['south_west']
+    if not all(k in ne for k in ('lat', 'lng')) or not all(k in sw for k in ('lat', 'lng')):
+        return None
+    return {'north': float(ne['lat']), 'south': float(sw['lat']), 'east': float(ne['lng']), 'west': float(sw['lng'])}
+
+@csrf_exempt
+def detect_farm_boundaries_tiled_view(request):
+    """
+    Detect farm boundaries over an input too large for a single pass.
+
+    Accepts one of:
+    - multipart upload of a GeoTIFF in 'image' (georeferencing read with rasterio)
+    - multipart/raw/base64 upload of any image plus 'bounds' (same format as detect-farm-boundaries)
+    - JSON {"bounds": {...}, "zoom": 16} to fetch imagery from settings.MAP_TILE_URL_TEMPLATE
+
+    Optional parameters: tile_size (default 1024, 256 to 4096), overlap (default 128, below half
+    the tile size).
+    Returns a GeoJSON FeatureCollection with fields merged across tile seams.
+    """
+    from .tiling import XYZSource, DEFAULT_TILE_SIZE, DEFAULT_OVERLAP, MIN_TILE_SIZE, MAX_TILE_SIZE
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST method allowed'}, status=405)
+
+    if not model_available('farm_boundary'):
+        return JsonResponse({'error': 'Farm boundary model not loaded. Check server logs.'}, status=500)
+
+    temp_file = None
+    try:
+        uploaded_file = request.FILES.get('image') if request.content_type == 'multipart/form-data' else None
+        is_geotiff = uploaded_file is not None and (
+            uploaded_file.name.lower().endswith(('.tif', '.tiff')) or uploaded_file.content_type == 'image/tiff'
+        )
+
+        job_params = {}
+        if is_geotiff and not request.POST.get('bounds'):
+            params = request.POST.dict()
+            image = uploaded_file
+            if settings.INFERENCE_MODE != 'queue':
+                # rasterio needs a path; spool small in-memory uploads to disk
+                # (queued jobs spool the upload into INFERENCE_JOB_DIR instead)
+                if hasattr(uploaded_file, 'temporary_file_path'):
+                    image = uploaded_file.temporary_file_path()
+                else:
+                    import tempfile
+                    temp_file = tempfile.NamedTemporaryFile(suffix='.tif')
+                    for chunk in uploaded_file.chunks():
+                        temp_file.write(chunk)
+                    temp_file.flush()
+                    image = temp_file.name
+        else:
+            img_np, params = read_image_request(request, 'image_base64', json_fields=('bounds',))
+            bounds = _parse_corner_bounds(params.get('bounds'))
+            if not bounds:
+                return JsonResponse({'error': 'Missing or invalid bounds'}, status=400)
+            job_params['bounds'] = bounds
+
+            if img_np is not None:
+                image = img_np
+                job_params['projection'] = params.get('projection') or settings.MAP_PIXEL_PROJECTION
+            elif params.get('zoom') is not None:
+                image = None
+                job_params['zoom'] = int(params['zoom'])
+                if not 0 <= job_params['zoom'] <= 22:
+                    return JsonResponse({'error': 'zoom must be between 0 and 22'}, status=400)
+                source = XYZSource(bounds, job_params['zoom'])
+                source.close()
+                if source.width * source.height > settings.TILED_DETECTION_MAX_PIXELS:
+                    return JsonResponse({
+                        'error': 'Requested area is too large at this zoom level',
+                        'pixels': source.width * source.height,
+                        'max_pixels': settings.TILED_DETECTION_MAX_PIXELS,
+                    }, status=400)
+            else:
+                return JsonResponse({'error': 'Provide an image or a zoom level'}, status=400)
+
+        tile_size = int(params.get('tile_size') or DEFAULT_TILE_SIZE)
+        overlap = params.get('overlap')
+        overlap = int(overlap) if overlap not in (None, '') else DEFAULT_OVERLAP
+        if not MIN_TILE_SIZE <= tile_size <= MAX_TILE_SIZE:
+            return JsonResponse({'error': f'tile_size must be between {MIN_TILE_SIZE} and {MAX_TILE_SIZE}'}, status=400)
+        if not 0 <= overlap < tile_size // 2:
+            return JsonResponse({'error': f'overlap must be at least 0 and less than {tile_size // 2} (half the tile size)'},
+                                status=400)
+        job_params['tile_size'] = tile_size
+        job_params['overlap'] = overlap
+
+        return detection_response(request, 'farm_boundary_tiled', image, job_params, cache_key=None)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON payload'}, status=400)
+    except ImageDecodeError as img_err:
+        return JsonResponse({'error': f'Failed to decode image data: {img_err}'}, status=400)
+    except requests.RequestException as e:
+        print(f"Error fetching map tiles: {e}")
+        return JsonResponse({'error': 'Failed to fetch map imagery'}, status=502)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        print(f"Unhandled error in detect_farm_boundaries_tiled_view: {e}")
+        traceback.print_exc()
+        return JsonResponse({'error': 'Internal server error.'}, status=500)
+    finally:
+        if temp_file is not None:
+            temp_file.close()
+
 # --- New View for Weed Detection ---
 @csrf_exempt
 def detect_weeds_view(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST method allowed'}, status=405)
 
-    if not weed_model:
+    if not model_available('weed'):
         return JsonResponse({'error': 'Weed detection model not loaded. Check server logs.'}, status=500)
 
     try:
-        # Parse request data
-        data = json.loads(request.body)
-        image_base64 = data.get('image_base64')
-
-        if not image_base64:
-            return JsonResponse({'error': 'Missing image_base64'}, status=400)
-
-        # Decode Image
+        # Parse request data: multipart (file field 'image'), a raw image body,
+        # or JSON with base64 in 'image_base64' (with or without data:image prefix)
         try:
-            # Handle various image_base64 formats (with or without data:image prefix)
-            if ',' in image_base64:
-                header, encoded = image_base64.split(',', 1)
-            else:
-                encoded = image_base64
-                
-            image_data = base64.b64decode(encoded)
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-            img_np = np.array(image)
-            img_height, img_width, _ = img_np.shape
-            print(f"Decoded image for weed detection: {img_width}x{img_height}")
-        except Exception as img_err:
+            img_np, data = read_image_request(request, 'image_base64')
+        except ImageDecodeError as img_err:
             print(f"Error decoding image for weed detection: {img_err}")
-            traceback.print_exc()
             return JsonResponse({'error': f'Failed to decode image data: {str(img_err)}'}, status=400)
 
-        # Perform Inference with error handling
-        print("Running weed detection model inference...")
-        try:
-            # Use similar parameters as farm boundaries for consistency
-            results = weed_model.predict(source=img_np, save=False, conf=0.5    , iou=0.45)
-            print(f"Weed detection inference complete. Results: {len(results) if results else 0}")
-        except Exception as pred_err:
-            print(f"Error during weed model prediction: {pred_err}")
-            traceback.print_exc()
-            return JsonResponse({'error': f'Error during weed model prediction: {str(pred_err)}'}, status=500)
+        if img_np is None:
+            return JsonResponse({'error': 'Missing image_base64'}, status=400)
 
-        # Process Results
-        detected_weeds = []
-        
-        try:
-            # Check if results exist and contain masks
-            if not results or not results[0].masks:
-                print("No weed masks detected in results.")
-                return JsonResponse({'detected_weeds': []})
-            
-            # Process each mask/detection
-            print(f"Detected {len(results[0].masks)} weed masks.")
-            
-            # Check if model has class names
-            names = results[0].names if hasattr(results[0], 'names') else {}
-            print(f"Model class names: {names}")
-            
-            # Process detections
-            for i in range(len(results[0].masks.xy)):
-                try:
-                    # Get mask polygon
-                    mask_xy = results[0].masks.xy[i]
-                    pixel_polygon = mask_xy.astype(int).tolist()
-                    
-                    if len(pixel_polygon) < 3:  # Need at least 3 points for a polygon
-                        print(f"Skipping mask {i}: not enough points ({len(pixel_polygon)})")
-                        continue
-                    
-                    # Get classification info if available
-                    class_id = -1
-                    confidence = 0.0
-                    
-                    if results[0].boxes and i < len(results[0].boxes):
-                        box = results[0].boxes[i]
-                        class_id = int(box.cls.item()) if hasattr(box, 'cls') else -1
-                        confidence = float(box.conf.item()) if hasattr(box, 'conf') else 0.0
-                    
-                    # Get class name
-                    class_name = names.get(class_id, "Unknown") if class_id >= 0 else "Unknown"
-                    
-                    # Simple polygon smoothing (similar to farm boundaries)
-                    # Reshape for approxPolyDP: (N, 1, 2)
-                    if len(pixel_polygon) > 10:  # Only smooth if enough points
-                        contour = np.array(pixel_polygon).reshape((-1, 1, 2)).astype(np.int32)
-                        epsilon = 0.01 * cv2.arcLength(contour, True)
-                        smoothed_contour = cv2.approxPolyDP(contour, epsilon, True)
-                        pixel_polygon = smoothed_contour.reshape((-1, 2)).tolist()
-                    
-                    # Add to detected weeds
-                    detected_weeds.append({
-                        'id': i,
-                        'class_name': class_name,
-                        'confidence': round(confidence, 2),
-                        'polygon_pixels': pixel_polygon
-                    })
-                    
-                except Exception as detection_err:
-                    print(f"Error processing detection {i}: {detection_err}")
-                    continue  # Skip this detection but continue with others
-            
-            return JsonResponse({'detected_weeds': detected_weeds})
-            
-        except Exception as process_err:
-            print(f"Error processing results: {process_err}")
-            traceback.print_exc()
-            return JsonResponse({'error': f'Error processing detection results: {str(process_err)}'}, status=500)
+        img_height, img_width, _ = img_np.shape
+        print(f"Decoded image for weed detection: {img_width}x{img_height}")
+
+        # Optional response layout ('objects', 'flat' or 'columnar') and RLE masks,
+        # from the body/form fields or the query string
+        output = data.get('output') or request.GET.get('output') or 'objects'
+        if output not in OUTPUT_FORMATS:
+            return JsonResponse({'error': f"Invalid output '{output}', expected one of {', '.join(OUTPUT_FORMATS)}"}, status=400)
+        rle = data.get('rle', request.GET.get('rle', False))
+        if isinstance(rle, str):
+            rle = rle.lower() in ('1', 'true', 'yes')
+        rle = bool(rle)
+
+        cache_key = inference_cache.make_key('weed', digest_array(img_np), conf=0.5, iou=0.45, output=output, rle=rle)
+        cached = inference_cache.get(cache_key)
+        if cached is not None:
+            print("Returning cached weed detection result.")
+            return inference_response(cached, 'hit')
+
+        # Inference and polygon post-processing run in api/detection.py
+        return detection_response(request, 'weed', img_np, {'output': output, 'rle': rle}, cache_key)
 
     except json.JSONDecodeError as json_err:
         return JsonResponse({'error': f'Invalid JSON payload: {str(json_err)}'}, status=400)
@@ -637,50 +520,106 @@ def detect_weeds_view(request):
 # --- New View for Disease Detection ---
 @method_decorator(csrf_exempt, name='dispatch')
 class DetectDiseaseView(View):
-    # Define the image transformations with larger input size to prevent dimension issues
-    preprocess = transforms.Compose([
-        transforms.Resize(256), # Resize to 256x256
-        transforms.CenterCrop(224), # Crop to 224x224 from center
-        transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]) # Standard normalization for ImageNet models
-    ])
 
     def post(self, request, *args, **kwargs):
-        if not disease_model: # Check if model loaded
+        if not model_available('disease'): # Check if model loaded
             return JsonResponse({'error': 'Disease detection model not loaded or failed to initialize.'}, status=500)
 
         if request.method == 'POST' and request.FILES.get('image'):
             image_file = request.FILES['image']
-            
+
             try:
-                # Open the image using Pillow
-                img = Image.open(image_file).convert('RGB')
-                
-                # Preprocess the image
-                img_tensor = self.preprocess(img)
-                img_tensor = img_tensor.unsqueeze(0)  # Add batch dimension
-
-                # Make prediction
-                with torch.no_grad():
-                    outputs = disease_model(img_tensor) # Use the loaded model instance
-                    _, predicted_idx = torch.max(outputs, 1)
-                    predicted_class = DISEASE_CLASSES[predicted_idx.item()]
-                    
-                    # Get confidence score
-                    probabilities = F.softmax(outputs, dim=1)
-                    confidence = probabilities[0][predicted_idx.item()].item()
+                # Identical uploads skip inference
+                cache_key = inference_cache.make_key('disease', digest_uploaded_file(image_file))
+                cached = inference_cache.get(cache_key)
+                if cached is not None:
+                    return inference_response(cached, 'hit')
 
-                return JsonResponse({
-                    'predicted_class': predicted_class,
-                    'confidence': confidence
-                })
+                # Preprocessing and prediction run in api/detection.py
+                return detection_response(request, 'disease', image_file, {}, cache_key)
 
             except Exception as e:
                 print(f"Error processing disease detection: {e}")
                 return JsonResponse({'error': f'Error processing image: {str(e)}'}, status=500)
-        
+
         return JsonResponse({'error': 'Invalid request'}, status=400)
 
+# --- Queued inference jobs ---
+def inference_job_status(request, job_id):
+    """Status of a queued detection job (INFERENCE_MODE='queue'), with its result once DONE"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method allowed'}, status=405)
+    job = InferenceJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(job_payload(job))
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectDiseaseBatchView(View):
+    """
+    Classify many leaf images in one request.
+
+    Expects multipart/form-data with one or more files in 'images' (or 'image').
+    Optional 'top_k' form field (default 3) sets how many classes are returned per image.
+    Images are decoded and preprocessed in a thread pool, stacked into one tensor and
+    run through the model in a single forward pass with one softmax
+    (api.detection.classify_disease_batch), inline or in an inference worker.
+    """
+
+    def post(self, request, *args, **kwargs):
+        if not model_available('disease'):
+            return JsonResponse({'error': 'Disease detection model not loaded or failed to initialize.'}, status=500)
+
+        image_files = request.FILES.getlist('images') or request.FILES.getlist('image')
+        if not image_files:
+            return JsonResponse({'error': 'No images uploaded. Send files in the "images" field.'}, status=400)
+        if len(image_files) > settings.DISEASE_BATCH_MAX_IMAGES:
+            return JsonResponse({
+                'error': f'Too many images; at most {settings.DISEASE_BATCH_MAX_IMAGES} per request'
+            }, status=400)
+
+        try:
+            top_k = int(request.POST.get('top_k', 3))
+        except ValueError:
+            return JsonResponse({'error': 'top_k must be an integer'}, status=400)
+        # Capped at the number of classes by the pipeline (api/disease_model.py loads torch, so not imported here)
+        top_k = max(1, top_k)
+
+        try:
+            # Identical uploads are answered from the result cache
+            cache_keys = [
+                inference_cache.make_key('disease', digest_uploaded_file(f), top_k=top_k) for f in image_files
+            ]
+            cached, pending = {}, []
+            for i, key in enumerate(cache_keys):
+                result = inference_cache.get(key)
+                if result is not None:
+                    cached[str(i)] = result
+                else:
+                    pending.append(i)
+
+            # Preprocessing and the single forward pass run in api/detection.py, in this thread
+            # (INFERENCE_MODE='inline') or in an inference worker ('queue')
+            params = {'top_k': top_k, 'filenames': [f.name for f in image_files], 'pending': pending, 'cached': cached}
+            pending_files = [image_files[i] for i in pending]
+            if settings.INFERENCE_MODE != 'queue' or not pending:
+                batch = run_detection('disease_batch', pending_files, params)
+            else:
+                batch, response = queued_detection(request, 'disease_batch', pending_files, params)
+                if response is not None:
+                    return response
+
+            for i in pending:
+                result = batch['results'][i]
+                if 'error' not in result:
+                    inference_cache.set(cache_keys[i], {k: v for k, v in result.items() if k != 'filename'})
+            return JsonResponse(batch)
+
+        except Exception as e:
+            print(f"Error processing batch disease detection: {e}")
+            traceback.print_exc()
+            return JsonResponse({'error': f'Error processing images: {str(e)}'}, status=500)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class TreatmentChatView(View):
     _knowledge_base_cache = None # Cache for the loaded knowledge base
@@ -1023,6 +962,7 @@ Respond in a friendly, conversational tone as if you're chatting with a farmer f
             
             ai_response_text = None
             try:
+                genai = get_genai()
                 gemini_model = genai.GenerativeModel(
                     model_name=model_to_use,
                     safety_settings=[
@@ -1491,53 +1431,10 @@ def get_weather_data(request):
         farm = farms.first()
         print(f"🚜 Farm found: {farm.name} (ID: {farm.id})")
         
-        # Extract coordinates from the farm's boundary GeoJSON if available
-        coordinates = None
-        if farm.boundary_geojson:
-            try:
-                print(f"🗺️ Farm boundary found, type: {type(farm.boundary_geojson)}")
-                # For JSON string format support
-                if isinstance(farm.boundary_geojson, str):
-                    try:
-                        boundary_data = json.loads(farm.boundary_geojson)
-                        print("📌 Converted string boundary to JSON")
-                    except json.JSONDecodeError:
-                        print("❌ Failed to parse boundary JSON string")
-                        boundary_data = None
-                else:
-                    boundary_data = farm.boundary_geojson
-                
-                if boundary_data:
-                    # Direct GeoJSON Feature access for single feature
-                    if boundary_data.get('type') == 'Feature' and boundary_data.get('geometry'):
-                        feature = boundary_data
-                        if feature['geometry']['type'] == 'Polygon':
-                            coords = feature['geometry']['coordinates'][0]  # Get the outer ring
-                            # Calculate centroid 
-                            lat_sum = sum(coord[1] for coord in coords)
-                            lon_sum = sum(coord[0] for coord in coords)
-                            coordinates = {
-                                'latitude': lat_sum / len(coords),
-                                'longitude': lon_sum / len(coords)
-                            }
-                            print(f"📍 Using single feature boundary centroid: {coordinates}")
-                    # FeatureCollection access for multiple features        
-                    elif boundary_data.get('features') and len(boundary_data.get('features', [])) > 0:
-                        # Try to get center coordinates from the first feature
-                        feature = boundary_data['features'][0]
-                        if feature.get('geometry') and feature['geometry'].get('type') == 'Polygon':
-                            coords = feature['geometry']['coordinates'][0]  # Get the outer ring
-                            # Calculate centroid
-                            lat_sum = sum(coord[1] for coord in coords)
-                            lon_sum = sum(coord[0] for coord in coords)
-                            coordinates = {
-                                'latitude': lat_sum / len(coords),
-                                'longitude': lon_sum / len(coords)
-                            }
-                            print(f"📍 Using feature collection centroid: {coordinates}")
-            except (KeyError, IndexError, TypeError, ValueError) as e:
-                # Log the error but continue
-                print(f"❌ Error extracting coordinates from boundary: {e}")
+        # Boundary centroid, derived once when the boundary was saved (Farm.update_geometry)
+        coordinates = farm.centroid
+        if coordinates:
+            print(f"📍 Using farm boundary centroid: {coordinates}")
         
         # If no coordinates from boundary, check if location_address has coordinates
         if not coordinates and farm.location_address:
@@ -1567,14 +1464,13 @@ def get_weather_data(request):
                 "error": "Farm location coordinates unavailable. Please update your farm with valid boundary information."
             }, status=400)
             
-        # Call Open-Meteo API
-        print(f"🌦️ Calling Open-Meteo API with coordinates: {coordinates}")
-        weather_data = fetch_open_meteo_data(coordinates['latitude'], coordinates['longitude'])
-        
-        if not weather_data or (isinstance(weather_data, dict) and weather_data.get('error')):
-            error_msg = weather_data.get('error') if isinstance(weather_data, dict) else "Failed to fetch weather data"
-            print(f"❌ Error from Open-Meteo API: {error_msg}")
-            return Response({"error": error_msg}, status=500)
+        # Open-Meteo data for the farm's grid cell, cached (api/weather_cache.py)
+        print(f"🌦️ Getting weather for coordinates: {coordinates}")
+        try:
+            weather_data, cache_status = get_weather(coordinates['latitude'], coordinates['longitude'])
+        except OpenMeteoError as e:
+            print(f"❌ Error from Open-Meteo API: {e}")
+            return Response({"error": str(e)}, status=500)
         
         # Save weather data to the database (only if valid)
         if weather_data and 'current' in weather_data:
@@ -1596,8 +1492,10 @@ def get_weather_data(request):
                 'boundary': boundary_data
             }
             
-            print(f"✅ Successfully fetched weather data for farm: {farm.name}")
-            return Response(response_data)
+            print(f"✅ Successfully fetched weather data for farm: {farm.name} (cache {cache_status})")
+            response = Response(response_data)
+            response['X-Weather-Cache'] = cache_status
+            return response
         else:
             print("❌ Invalid weather data format received from Open-Meteo")
             return Response({"error": "Invalid weather data received from the weather service"}, status=500)
@@ -1615,229 +1513,6 @@ def get_weather_data(request):
             }, status=500)
         return Response({"error": "An internal error occurred"}, status=500)
 
-def fetch_open_meteo_data(latitude, longitude):
-    """
-    Fetch weather data from Open-Meteo API with improved error handling
-    """
-    # Validate coordinates
-    if not latitude or not longitude:
-        print("❌ Invalid coordinates provided to Open-Meteo API")
-        return {'error': 'Invalid coordinates provided'}
-        
-    try:
-        # Convert to float and validate range
-        lat = float(latitude)
-        lon = float(longitude)
-        
-        if lat < -90 or lat > 90 or lon < -180 or lon > 180:
-            print(f"❌ Coordinates out of valid range: lat={lat}, lon={lon}")
-            return {'error': 'Coordinates out of valid range'}
-            
-        # Prepare API parameters
-        base_url = "https://api.open-meteo.com/v1/forecast"
-        
-        # Current date and time
-        now = datetime.now()
-        
-        # Parameters for the API request
-        params = {
-            'latitude': lat,
-            'longitude': lon,
-            'current': 'temperature_2m,relative_humidity_2m,precipitation,weather_code,wind_speed_10m,wind_direction_10m',
-            'hourly': 'temperature_2m,precipitation_probability,weather_code,wind_speed_10m',
-            'daily': 'weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum,precipitation_probability_max',
-            'timezone': 'auto',
-            'forecast_days': 7,
-        }
-        
-        print(f"🌐 Sending request to Open-Meteo API: {base_url}")
-        response = requests.get(base_url, params=params, timeout=10)  # Add timeout
-        
-        # Check for successful status code
-        if response.status_code != 200:
-            print(f"❌ Open-Meteo API returned error status: {response.status_code}")
-            return {'error': f'Weather API returned status code: {response.status_code}'}
-            
-        # Parse JSON response
-        try:
-            data = response.json()
-        except ValueError:
-            print("❌ Failed to parse Open-Meteo API response as JSON")
-            return {'error': 'Failed to parse weather data response'}
-            
-        # Validate response structure
-        if 'current' not in data or 'hourly' not in data or 'daily' not in data:
-            print("❌ Invalid response format from Open-Meteo API")
-            return {'error': 'Invalid response format from weather API'}
-            
-        # Process and reformat the data for our needs
-        processed_data = {
-            'current': {
-                'temperature': data['current']['temperature_2m'],
-                'humidity': data['current']['relative_humidity_2m'],
-                'precipitation': data['current']['precipitation'],
-                'weather_code': data['current']['weather_code'],
-                'wind_speed': data['current']['wind_speed_10m'],
-                'wind_direction': data['current']['wind_direction_10m'],
-                'weather_description': get_weather_description(data['current']['weather_code']),
-                'icon_code': get_weather_icon_code(data['current']['weather_code'])
-            },
-            'hourly': [],
-            'daily': []
-        }
-        
-        # Process hourly data - next 24 hours
-        if 'hourly' in data and all(key in data['hourly'] for key in ['time', 'temperature_2m', 'precipitation_probability', 'weather_code', 'wind_speed_10m']):
-            hour_limit = min(24, len(data['hourly']['time']))
-            for i in range(hour_limit):
-                processed_data['hourly'].append({
-                    'time': data['hourly']['time'][i],
-                    'temperature': data['hourly']['temperature_2m'][i],
-                    'precipitation_probability': data['hourly']['precipitation_probability'][i],
-                    'weather_code': data['hourly']['weather_code'][i],
-                    'wind_speed': data['hourly']['wind_speed_10m'][i],
-                    'weather_description': get_weather_description(data['hourly']['weather_code'][i]),
-                    'icon_code': get_weather_icon_code(data['hourly']['weather_code'][i])
-                })
-        else:
-            print("⚠️ Missing or incomplete hourly data in Open-Meteo API response")
-            
-        # Process daily data
-        if 'daily' in data and all(key in data['daily'] for key in ['time', 'temperature_2m_max', 'temperature_2m_min', 'precipitation_sum', 'precipitation_probability_max', 'weather_code']):
-            for i in range(len(data['daily']['time'])):
-                processed_data['daily'].append({
-                    'date': data['daily']['time'][i],
-                    'max_temp': data['daily']['temperature_2m_max'][i],
-                    'min_temp': data['daily']['temperature_2m_min'][i],
-                    'precipitation_sum': data['daily']['precipitation_sum'][i],
-                    'precipitation_probability': data['daily']['precipitation_probability_max'][i],
-                    'weather_code': data['daily']['weather_code'][i],
-                    'weather_description': get_weather_description(data['daily']['weather_code'][i]),
-                    'icon_code': get_weather_icon_code(data['daily']['weather_code'][i])
-                })
-        else:
-            print("⚠️ Missing or incomplete daily data in Open-Meteo API response")
-        
-        # Fetch annual rainfall data using historical API
-        try:
-            # Calculate the start and end dates for the past year
-            end_date = now.date()
-            start_date = end_date.replace(year=end_date.year - 1)
-            
-            historical_url = "https://archive-api.open-meteo.com/v1/archive"
-            historical_params = {
-                'latitude': lat,
-                'longitude': lon,
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat(),
-                'daily': 'precipitation_sum',
-                'timezone': 'auto',
-            }
-            
-            print(f"🌐 Sending request to Open-Meteo Historical API: {historical_url}")
-            historical_response = requests.get(historical_url, params=historical_params, timeout=15)
-            
-            if historical_response.status_code == 200:
-                historical_data = historical_response.json()
-                if 'daily' in historical_data and 'precipitation_sum' in historical_data['daily']:
-                    # Calculate annual rainfall sum
-                    precipitation_values = historical_data['daily']['precipitation_sum']
-                    # Filter out None values before summing
-                    valid_values = [p for p in precipitation_values if p is not None]
-                    annual_rainfall = sum(valid_values)
-                    
-                    # Add to processed data
-                    processed_data['annual_rainfall'] = round(annual_rainfall, 2)
-                    print(f"✅ Annual rainfall data fetched: {annual_rainfall} mm")
-                else:
-                    print("⚠️ Missing precipitation data in historical response")
-                    processed_data['annual_rainfall'] = None
-            else:
-                print(f"⚠️ Failed to fetch historical rainfall data: {historical_response.status_code}")
-                processed_data['annual_rainfall'] = None
-        except Exception as historical_error:
-            print(f"⚠️ Error fetching historical rainfall data: {str(historical_error)}")
-            processed_data['annual_rainfall'] = None
-            
-        print(f"✅ Successfully processed weather data from Open-Meteo API")
-        return processed_data
-        
-    except requests.exceptions.Timeout:
-        print("⏱️ Open-Meteo API request timed out")
-        return {'error': 'Weather API request timed out'}
-    except requests.exceptions.ConnectionError:
-        print("🔌 Connection error while fetching from Open-Meteo API")
-        return {'error': 'Connection error while fetching weather data'}
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Request error fetching weather data: {e}")
-        return {'error': f'Request error: {str(e)}'}
-    except Exception as e:
-        print(f"❌ Unexpected error fetching weather data: {e}")
-        return {'error': f'Unexpected error: {str(e)}'}
-
-def get_weather_description(weather_code):
-    """
-    Convert Open-Meteo weather code to human-readable description
-    Based on: https://open-meteo.com/en/docs/weather-codes
-    """
-    weather_codes = {
-        0: "Clear sky",
-        1: "Mainly clear",
-        2: "Partly cloudy",
-        3: "Overcast",
-        45: "Fog",
-        48: "Depositing rime fog",
-        51: "Light drizzle",
-        53: "Moderate drizzle",
-        55: "Dense drizzle",
-        56: "Light freezing drizzle",
-        57: "Dense freezing drizzle",
-        61: "Slight rain",
-        63: "Moderate rain",
-        65: "Heavy rain",
-        66: "Light freezing rain",
-        67: "Heavy freezing rain",
-        71: "Slight snow fall",
-        73: "Moderate snow fall",
-        75: "Heavy snow fall",
-        77: "Snow grains",
-        80: "Slight rain showers",
-        81: "Moderate rain showers",
-        82: "Violent rain showers",
-        85: "Slight snow showers",
-        86: "Heavy snow showers",
-        95: "Thunderstorm",
-        96: "Thunderstorm with slight hail",
-        99: "Thunderstorm with heavy hail"
-    }
-    
-    return weather_codes.get(weather_code, "Unknown")
-
-def get_weather_icon_code(weather_code):
-    """
-    Convert Open-Meteo weather code to icon code for frontend
-    Based on WMO weather codes 
-    """
-    # Map Open-Meteo weather codes to icon codes that the frontend can understand
-    if weather_code == 0:  # Clear sky
-        return "01d"  # Sunny
-    elif weather_code in [1, 2]:  # Mainly clear, partly cloudy
-        return "02d"  # Partly cloudy
-    elif weather_code == 3:  # Overcast
-        return "03d"  # Cloudy
-    elif weather_code in [45, 48]:  # Fog
-        return "50d"  # Fog
-    elif weather_code in [51, 53, 55, 56, 57]:  # Drizzle
-        return "09d"  # Drizzle
-    elif weather_code in [61, 63, 65, 66, 67, 80, 81, 82]:  # Rain
-        return "10d"  # Rain
-    elif weather_code in [71, 73, 75, 77, 85, 86]:  # Snow
-        return "13d"  # Snow
-    elif weather_code in [95, 96, 99]:  # Thunderstorm
-        return "11d"  # Thunderstorm
-    else:
-        return "03d"  # Default cloudy
-
 def save_weather_data(farm, weather_data):
     """
     Save weather data to the database for a farm
@@ -1846,86 +1521,15 @@ def save_weather_data(farm, weather_data):
         return
         
     try:
-        # Extract current weather data
-        current = weather_data.get('current', {})
-        
-        # Convert weather code to our model's condition enum
-        weather_code = current.get('weather_code')
-        
-        # Map OpenMeteo weather codes to our model's weather conditions
-        weather_code_to_condition = {
-            0: 'SUNNY',  # Clear sky
-            1: 'SUNNY',  # Mainly clear
-            2: 'PARTLY_CLOUDY',  # Partly cloudy
-            3: 'CLOUDY',  # Overcast
-            45: 'FOGGY',  # Fog
-            48: 'FOGGY',  # Depositing rime fog
-            51: 'RAINY',  # Light drizzle
-            53: 'RAINY',  # Moderate drizzle
-            55: 'RAINY',  # Dense drizzle
-            56: 'RAINY',  # Light freezing drizzle
-            57: 'RAINY',  # Dense freezing drizzle
-            61: 'RAINY',  # Slight rain
-            63: 'RAINY',  # Moderate rain
-            65: 'RAINY',  # Heavy rain
-            66: 'RAINY',  # Light freezing rain
-            67: 'RAINY',  # Heavy freezing rain
-            71: 'SNOWY',  # Slight snow fall
-            73: 'SNOWY',  # Moderate snow fall
-            75: 'SNOWY',  # Heavy snow fall
-            77: 'SNOWY',  # Snow grains
-            80: 'RAINY',  # Slight rain showers
-            81: 'RAINY',  # Moderate rain showers
-            82: 'RAINY',  # Violent rain showers
-            85: 'SNOWY',  # Slight snow showers
-            86: 'SNOWY',  # Heavy snow showers
-            95: 'STORMY',  # Thunderstorm
-            96: 'STORMY',  # Thunderstorm with slight hail
-            99: 'STORMY',  # Thunderstorm with heavy hail
-        }
-        
-        condition = weather_code_to_condition.get(weather_code, 'CLOUDY')  # Default to cloudy if unknown code
-        
-        # Get daily data for min/max temps
-        daily_data = weather_data.get('daily', [])
-        temp_min = None
-        temp_max = None
-        
-        if daily_data and len(daily_data) > 0:
-            temp_min = daily_data[0].get('min_temp')
-            temp_max = daily_data[0].get('max_temp')
-        else:
-            # Fallback to current temperature with simple offset
-            current_temp = current.get('temperature')
-            if current_temp is not None:
-                temp_min = current_temp - 3  # Simple approximation
-                temp_max = current_temp + 3  # Simple approximation
-        
-        # Prepare additional forecast data
-        forecast_data = {
-            'hourly': weather_data.get('hourly', []),
-            'daily': daily_data,
-            'last_updated': datetime.now().isoformat()
-        }
-        
-        # Add annual rainfall to forecast_data if available
+        # Same fields as the batch refresh (api/weather_refresh.py, refresh_weather command)
         if 'annual_rainfall' in weather_data:
-            forecast_data['annual_rainfall'] = weather_data['annual_rainfall']
             print(f"💧 Saving annual rainfall: {weather_data['annual_rainfall']} mm")
         
         # Create or update weather record for today
         Weather.objects.update_or_create(
             farm=farm,
             date=datetime.now().date(),
-            defaults={
-                'condition': condition,
-                'temperature_max': temp_max if temp_max is not None else 0,
-                'temperature_min': temp_min if temp_min is not None else 0,
-                'humidity': current.get('humidity'),
-                'precipitation': current.get('precipitation'),
-                'wind_speed': current.get('wind_speed'),
-                'forecast_data': forecast_data
-            }
+            defaults=weather_fields(weather_data)
         )
         
         print(f"✅ Weather data saved for farm: {farm.name}")
@@ -1935,135 +1539,32 @@ def save_weather_data(farm, weather_data):
 
 def generate_weather_recommendations(farm, weather_data):
     """
-    Generate weather-based recommendations for the farm
+    Generate weather-based recommendations for the farm.
+    Today's recommendations are upserted in one statement (api/weather_recommendations.py),
+    so reloading the page updates them instead of adding rows.
     """
-    recommendations = []
-    
-    if not weather_data.get('daily') or len(weather_data['daily']) == 0:
-        return recommendations
-    
-    # Get farm crops
-    farm_crops = FarmCrop.objects.filter(farm=farm)
-    
-    # Check for rain in the forecast
-    rainy_days = [day for day in weather_data['daily'] if day['precipitation_probability'] > 50]
-    hot_days = [day for day in weather_data['daily'] if day['max_temp'] > 30]  # Days over 30°C
-    cold_days = [day for day in weather_data['daily'] if day['min_temp'] < 5]  # Days under 5°C
-    
-    # Irrigation recommendations based on precipitation forecast
-    if rainy_days:
-        first_rainy_day = rainy_days[0]
-        days_until_rain = (datetime.strptime(first_rainy_day['date'], '%Y-%m-%d').date() - datetime.now().date()).days
-        
-        if days_until_rain <= 2:
-            recommendation = {
-                'type': 'WATER',
-                'details': {
-                    'title': 'Adjust Irrigation Schedule',
-                    'description': f"Rain expected in {days_until_rain} day{'s' if days_until_rain != 1 else ''} with {first_rainy_day['precipitation_probability']}% probability. Consider reducing irrigation.",
-                    'urgency': 'medium',
-                    'days_until_rain': days_until_rain,
-                    'precipitation_probability': first_rainy_day['precipitation_probability']
-                }
-            }
-            
-            # Save to database
-            Recommendation.objects.create(
-                farm=farm,
-                recommendation_type='WATER',
-                details=recommendation['details']
-            )
-            
-            recommendations.append(recommendation)
-    
-    # Temperature-based recommendations
-    if hot_days:
-        recommendation = {
-            'type': 'WEATHER',
-            'details': {
-                'title': 'Heat Protection Needed',
-                'description': f"Upcoming hot weather ({len(hot_days)} days above 30°C). Ensure adequate irrigation and consider shade for sensitive crops.",
-                'urgency': 'high',
-                'affected_days': [day['date'] for day in hot_days]
-            }
-        }
-        
-        # Save to database
-        Recommendation.objects.create(
-            farm=farm,
-            recommendation_type='WEATHER',
-            details=recommendation['details']
-        )
-        
-        recommendations.append(recommendation)
-    
-    if cold_days:
-        recommendation = {
-            'type': 'WEATHER',
-            'details': {
-                'title': 'Frost Protection Alert',
-                'description': f"Low temperatures expected (below 5°C on {len(cold_days)} days). Protect frost-sensitive crops.",
-                'urgency': 'high',
-                'affected_days': [day['date'] for day in cold_days]
-            }
-        }
-        
-        # Save to database
-        Recommendation.objects.create(
-            farm=farm,
-            recommendation_type='WEATHER',
-            details=recommendation['details']
-        )
-        
-        recommendations.append(recommendation)
-    
-    # Crop-specific recommendations
-    for farm_crop in farm_crops:
-        # Example: Different recommendations based on crop growth stage
-        if farm_crop.growth_stage == 'Flowering':
-            # Flowering crops need stable weather
-            if hot_days:
-                recommendation = {
-                    'type': 'CROP',
-                    'details': {
-                        'title': f'Protect {farm_crop.crop.name} During Flowering',
-                        'description': f"High temperatures may affect flowering. Consider additional irrigation for your {farm_crop.crop.name}.",
-                        'urgency': 'high',
-                        'crop_id': farm_crop.id,
-                        'crop_name': farm_crop.crop.name
-                    }
-                }
-                
-                # Save to database
-                Recommendation.objects.create(
-                    farm_crop=farm_crop,
-                    recommendation_type='CROP',
-                    details=recommendation['details']
-                )
-                
-                recommendations.append(recommendation)
-    
-    # If no specific recommendations, provide a general one
-    if not recommendations:
-        recommendation = {
-            'type': 'WEATHER',
-            'details': {
-                'title': 'Weather Conditions Stable',
-                'description': "Weather conditions look favorable for the next few days. Continue regular farm operations.",
-                'urgency': 'low'
-            }
-        }
-        
-        # Save to database
-        Recommendation.objects.create(
-            farm=farm,
-            recommendation_type='WEATHER',
-            details=recommendation['details']
-        )
-        
-        recommendations.append(recommendation)
-    
-    return recommendations
+    recommendations = build_weather_recommendations(weather_data, flowering_crops([farm]).get(farm.id, []))
+    if recommendations:
+        save_recommendations({farm: recommendations})
+    return [recommendation for _, recommendation, _ in recommendations]
+
+def _boundary_etag(farm_stamps, *variant):
+    """ETag for boundary responses built from the (id, updated_at) of the farms they contain"""
+    digest = hashlib.sha1(repr((sorted(farm_stamps), variant)).encode()).hexdigest()
+    return f'"{digest}"'
+
+def _etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+def _not_modified(etag):
+    return _with_etag(HttpResponse(status=304), etag)
+
+def _with_etag(response, etag):
+    response['ETag'] = etag
+    # Let the map cache boundaries but revalidate them (a 304 costs no coordinates)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -2080,13 +1581,32 @@ def get_farm_boundary(request, farm_id):
         if farm.owner.profile.user != request.user:
             return Response({"error": "You don't have permission to view this farm"}, status=403)
         
+        # With ?zoom=, a MultiPolygon simplified for that map zoom level instead of the stored GeoJSON
+        zoom = request.query_params.get('zoom')
+        if zoom is not None:
+            try:
+                zoom = int(zoom)
+            except ValueError:
+                return Response({"error": "zoom must be an integer"}, status=400)
+
+        # The response only changes when the farm is saved
+        etag = _boundary_etag([(farm.id, farm.updated_at)], zoom)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+
         # If farm has a boundary, return it
         if farm.boundary_geojson:
-            return Response({
+            response_data = {
                 'farm_id': farm.id,
                 'farm_name': farm.name,
-                'boundary': farm.boundary_geojson
-            })
+                'boundary': farm.boundary_geojson,
+                'area_hectares': farm.boundary_area_hectares,
+                'centroid': farm.centroid,
+                'bbox': farm.bbox
+            }
+            if zoom is not None:
+                response_data['boundary'], response_data['zoom_level'] = farm.boundary_at_zoom(zoom)
+            return _with_etag(Response(response_data), etag)
         else:
             return Response({
                 'farm_id': farm.id,
@@ -2107,6 +1627,148 @@ def get_farm_boundary(request, farm_id):
             }, status=500)
         return Response({"error": "An internal error occurred"}, status=500)
 
+def _visible_farms(user):
+    """Farms a user may query: all of them for admins, otherwise their own"""
+    profile = user.profile
+    if profile.is_admin or user.is_staff:
+        return Farm.objects.all()
+    if not hasattr(profile, 'farmer_profile'):
+        return Farm.objects.none()
+    return Farm.objects.filter(owner=profile.farmer_profile)
+
+def _farm_location(farm):
+    """Compact farm entry for the spatial endpoints (no boundary coordinates)"""
+    return {
+        'id': farm.id,
+        'name': farm.name,
+        'centroid': {'lat': farm.centroid_lat, 'lng': farm.centroid_lng} if farm.centroid_lat is not None else None,
+        'bbox': farm.bbox,
+        'size_hectares': farm.size_hectares,
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def farms_within(request):
+    """
+    Farms whose boundary bbox intersects ?bbox=west,south,east,north
+    (add &contained=1 for farms lying entirely inside it).
+    Served from the in-memory index in api/spatial_index.py.
+    """
+    from .spatial_index import farm_index
+
+    try:
+        west, south, east, north = [float(value) for value in request.query_params.get('bbox', '').split(',')]
+    except ValueError:
+        return Response({"error": "bbox must be west,south,east,north"}, status=400)
+    if west > east or south > north:
+        return Response({"error": "bbox must be west,south,east,north"}, status=400)
+
+    contained = request.query_params.get('contained', '').lower() in ('1', 'true', 'yes')
+    farm_ids = farm_index.within(west, south, east, north, contained=contained)
+    farms = _visible_farms(request.user).filter(id__in=farm_ids).only(
+        'id', 'name', 'size_hectares', *Farm.GEOMETRY_FIELDS).order_by('id')
+    results = [_farm_location(farm) for farm in farms]
+    return Response({'count': len(results), 'farms': results})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def farms_at(request):
+    """Farms whose boundary contains the point ?lat=&lng="""
+    from .spatial_index import farm_index
+
+    try:
+        lat = float(request.query_params['lat'])
+        lng = float(request.query_params['lng'])
+    except (KeyError, ValueError):
+        return Response({"error": "lat and lng are required numbers"}, status=400)
+
+    farms = farm_index.at(lat, lng, queryset=_visible_farms(request.user).order_by('id'))
+    results = [_farm_location(farm) for farm in farms]
+    return Response({'count': len(results), 'farms': results})
+
+def _boundary_fields(zoom):
+    """Farm fields read by boundary_at_zoom(zoom): past the most detailed precomputed
+    level it falls back to the full boundary, which is then loaded with the farms
+    instead of with one deferred query per farm"""
+    fields = ['id', 'name', 'boundary_levels', 'boundary_area_hectares']
+    if zoom > max(settings.FARM_BOUNDARY_ZOOM_LEVELS, default=-1):
+        fields.append('boundary_geojson')
+    return fields
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def farm_boundaries(request):
+    """
+    Boundaries of the farms in a map viewport as a GeoJSON FeatureCollection,
+    simplified for the zoom level: ?bbox=west,south,east,north&zoom=<z>.
+    Responses carry an ETag, so panning back to a viewport costs a 304.
+    """
+    from .spatial_index import farm_index
+
+    try:
+        west, south, east, north = [float(value) for value in request.query_params.get('bbox', '').split(',')]
+        zoom = int(request.query_params.get('zoom', ''))
+    except ValueError:
+        return Response({"error": "bbox (west,south,east,north) and zoom are required"}, status=400)
+    if west > east or south > north:
+        return Response({"error": "bbox must be west,south,east,north"}, status=400)
+    if not 0 <= zoom <= 24:
+        return Response({"error": "zoom must be between 0 and 24"}, status=400)
+
+    farms = _visible_farms(request.user).filter(id__in=farm_index.within(west, south, east, north))
+    # Only the stamps are read to answer a revalidation
+    etag = _boundary_etag(list(farms.values_list('id', 'updated_at')), zoom, (west, south, east, north))
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+
+    features = []
+    for farm in farms.only(*_boundary_fields(zoom)).order_by('id'):
+        geometry, level = farm.boundary_at_zoom(zoom)
+        if geometry is None:
+            continue
+        features.append({
+            'type': 'Feature',
+            'id': farm.id,
+            'geometry': geometry,
+            'properties': {'farm_id': farm.id, 'name': farm.name, 'area_hectares': farm.boundary_area_hectares},
+        })
+    return _with_etag(Response({'type': 'FeatureCollection', 'features': features}), etag)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([VectorTileRenderer])
+def farm_boundary_tile(request, z, x, y):
+    """Farm boundaries in Mapbox Vector Tile z/x/y (layer 'farms'), with an ETag"""
+    from .spatial_index import farm_index
+    from .vector_tiles import tile_bounds, lnglat_to_tile_pixels, encode_tile, CONTENT_TYPE, EXTENT
+
+    if not (0 <= z <= 24 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return Response({"error": "Invalid tile coordinates"}, status=400, content_type='application/json')
+
+    west, south, east, north = tile_bounds(z, x, y)
+    # Include farms just outside the tile so polygons aren't cut at the seams (64 of 4096 units)
+    buffer_x, buffer_y = (east - west) * 64 / EXTENT, (north - south) * 64 / EXTENT
+    farm_ids = farm_index.within(west - buffer_x, south - buffer_y, east + buffer_x, north + buffer_y)
+    farms = _visible_farms(request.user).filter(id__in=farm_ids)
+
+    etag = _boundary_etag(list(farms.values_list('id', 'updated_at')), 'mvt', z, x, y)
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+
+    features = []
+    for farm in farms.only(*_boundary_fields(z)).order_by('id'):
+        geometry, _ = farm.boundary_at_zoom(z)
+        if geometry is None:
+            continue
+        polygons = [[lnglat_to_tile_pixels(np.asarray(ring, dtype=np.float64), z, x, y) for ring in polygon]
+                    for polygon in geometry['coordinates']]
+        properties = {'farm_id': farm.id, 'name': farm.name}
+        if farm.boundary_area_hectares is not None:
+            properties['area_hectares'] = round(farm.boundary_area_hectares, 2)
+        features.append((farm.id, polygons, properties))
+
+    return _with_etag(HttpResponse(encode_tile({'farms': features}), content_type=CONTENT_TYPE), etag)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_farm_boundary(request, farm_id=None):
@@ -2147,34 +1809,9 @@ def update_farm_boundary(request, farm_id=None):
             except json.JSONDecodeError:
                 return Response({"error": "Invalid JSON in boundary data"}, status=400)
                 
-        # Update the farm boundary
+        # Update the farm boundary; the area, size category, centroid and bbox are
+        # measured from it on save (any client-provided area_hectares is ignored)
         farm.boundary_geojson = boundary_data
-        
-        # If area_hectares is in the properties, extract and update it
-        area_hectares = None
-        if isinstance(boundary_data, dict):
-            # Try direct Feature
-            if boundary_data.get('type') == 'Feature' and 'properties' in boundary_data:
-                if 'area_hectares' in boundary_data['properties']:
-                    area_hectares = boundary_data['properties']['area_hectares']
-            # Try FeatureCollection
-            elif 'features' in boundary_data and len(boundary_data['features']) > 0:
-                feature = boundary_data['features'][0]
-                if 'properties' in feature and 'area_hectares' in feature['properties']:
-                    area_hectares = feature['properties']['area_hectares']
-                    
-        # Update size if available
-        if area_hectares:
-            farm.size_hectares = area_hectares
-            # Update size category based on area
-            if area_hectares < 10:
-                farm.size_category = 'S'  # Small
-            elif area_hectares < 50:
-                farm.size_category = 'M'  # Medium
-            else:
-                farm.size_category = 'L'  # Large
-                
-        # Save the farm
         farm.save()
         
         # Return success response
@@ -2182,7 +1819,10 @@ def update_farm_boundary(request, farm_id=None):
             "message": "Farm boundary updated successfully",
             "farm_id": farm.id,
             "farm_name": farm.name,
-            "boundary": farm.boundary_geojson
+            "boundary": farm.boundary_geojson,
+            "area_hectares": farm.boundary_area_hectares,
+            "centroid": farm.centroid,
+            "bbox": farm.bbox
         })
         
     except Exception as e:
@@ -2195,5 +1835,19 @@ def update_farm_boundary(request, farm_id=None):
             }, status=500)
         return Response({"error": "An internal error occurred"}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def model_registry_status(request):
+    """
+    Report which ML models are registered, which are resident in this worker,
+    their versions and checksums, micro-batching and result cache statistics.
+    """
+    return Response({
+        'pid': os.getpid(),
+        'models': registry.describe(),
+        'batchers': describe_batchers(),
+        'result_cache': inference_cache.describe(),
+    })
+
 # Duplicate CropClassificationView removed to fix 500 error
 # This was causing conflicts with the implementation at the top of the file
\ No newline at end of file
@@ -0,0 +1,276 @@
+"""
+Cache of Open-Meteo responses keyed by a lat/lng grid cell.
+
+Farms in the same cell (WEATHER_CACHE_CELL_DEGREES, 0.1 degrees by default, about the
+resolution of the weather models) share one entry, fetched for the centre of the cell.
+The forecast and the rainfall totals (whose daily store is synced by api/rainfall.py)
+have their own lifetimes (WEATHER_FORECAST_TTL, WEATHER_RAINFALL_TTL). An entry past
+its lifetime is still served for up to WEATHER_STALE_TTL seconds while a background
+thread refreshes it, so a page load only waits for Open-Meteo when a cell has no
+usable entry at all. The refresh_weather command (api/weather_refresh.py) fills the
+entries of every farm's cell ahead of page loads when the backend is shared.
+
+Backends (WEATHER_CACHE_BACKEND):
+- 'memory': in-process LRU (per worker)
+- 'django': the Django cache named by WEATHER_CACHE_ALIAS (e.g. Redis/Memcached shared by all workers)
+- 'file': JSON files under WEATHER_CACHE_DIR, shared by the workers on one host
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, close_old_connections
+
+from .open_meteo import fetch_forecast, grid_cell, validate_coordinates, OpenMeteoError
+from .rainfall import update_rainfall
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """In-process LRU of at most max_entries entries"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (entry, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key, entry, timeout):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (entry, time.time() + timeout)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheBackend:
+    """Entries stored in a configured Django cache"""
+
+    def __init__(self, alias='default'):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry, timeout):
+        self.cache.set(key, entry, timeout=max(1, int(math.ceil(timeout))))
+
+    def clear(self):
+        self.cache.clear()
+
+
+class FileBackend:
+    """One JSON file per entry under directory"""
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as handle:
+                item = json.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable weather cache file for {key}: {e}")
+            return None
+        if item.get('expires_at', 0) <= time.time():
+            return None
+        return item.get('entry')
+
+    def set(self, key, entry, timeout):
+        path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump({'entry': entry, 'expires_at': time.time() + timeout}, handle)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write weather cache file {path}: {e}")
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+def make_backend(name):
+    if name == 'memory':
+        return MemoryBackend(settings.WEATHER_CACHE_MAX_ENTRIES)
+    if name == 'django':
+        return DjangoCacheBackend(settings.WEATHER_CACHE_ALIAS)
+    if name == 'file':
+        return FileBackend(settings.WEATHER_CACHE_DIR)
+    raise ValueError(f"Unknown WEATHER_CACHE_BACKEND '{name}' (expected memory, django or file)")
+
+
+class WeatherCache:
+    """
+    Stale-while-revalidate cache over a backend.
+
+    Entries are {'value': ..., 'stored_at': epoch seconds}. get_or_fetch answers with
+    a status: 'hit' (fresh), 'stale' (expired but within stale_ttl, refresh started in
+    the background) or 'miss' (fetched in the request).
+    """
+
+    def __init__(self, backend, stale_ttl=3600):
+        self.backend = backend
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def store(self, key, value, ttl):
+        """Store a freshly fetched value (also used by api/weather_refresh.py to prime entries)"""
+        self.backend.set(key, {'value': value, 'stored_at': time.time()}, ttl + self.stale_ttl)
+
+    def _refresh(self, key, fetch, ttl):
+        try:
+            self.store(key, fetch(), ttl)
+        except OpenMeteoError as e:
+            logger.warning(f"Background weather refresh of {key} failed, keeping the stale entry: {e}")
+        except Exception:
+            logger.exception(f"Background weather refresh of {key} failed")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            # The refresh may have used the ORM (rainfall store) on this thread
+            connections.close_all()
+
+    def _refresh_in_background(self, key, fetch, ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, fetch, ttl), daemon=True,
+                         name=f"weather-refresh-{key}").start()
+
+    def get_or_fetch(self, key, fetch, ttl):
+        """
+        (value, status) for key, calling fetch() when there is no usable entry.
+        OpenMeteoError from a fetch in the request propagates.
+        """
+        entry = self.backend.get(key)
+        if entry is not None:
+            if time.time() - entry['stored_at'] < ttl:
+                self.hits += 1
+                return entry['value'], 'hit'
+            self.stale_hits += 1
+            self._refresh_in_background(key, fetch, ttl)
+            return entry['value'], 'stale'
+
+        # One fetch per cell when several requests miss at once
+        with self._key_lock(key):
+            entry = self.backend.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry['value'], 'hit'
+            self.misses += 1
+            value = fetch()
+            self.store(key, value, ttl)
+            return value, 'miss'
+
+    def clear(self):
+        self.backend.clear()
+
+    def describe(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+        }
+
+
+def forecast_key(lat, lng):
+    """Cache key of the forecast of the grid cell centred on lat/lng"""
+    return f"weather:forecast:{lat:.6f},{lng:.6f}"
+
+
+def rainfall_key(lat, lng):
+    """Cache key of the rainfall totals of the grid cell centred on lat/lng"""
+    return f"weather:rainfall:{lat:.6f},{lng:.6f}"
+
+
+def _cached_rainfall(lat, lng):
+    """Rainfall totals of a grid cell through the cache (runs on the pool)"""
+    try:
+        # The daily store is synced at most once per WEATHER_RAINFALL_TTL for each cell
+        rainfall, _ = weather_cache.get_or_fetch(
+            rainfall_key(lat, lng), lambda: update_rainfall(lat, lng), settings.WEATHER_RAINFALL_TTL)
+        return rainfall
+    finally:
+        close_old_connections()
+
+
+def get_weather(latitude, longitude):
+    """
+    Forecast plus rainfall totals for the grid cell of the point, from the cache.
+
+    Returns:
+        (weather_data, status) where status is the cache status of the forecast.
+        weather_data['rainfall'] holds the rolling totals of api/rainfall.py and
+        'annual_rainfall' the last 365 days. Raises OpenMeteoError if the forecast is
+        neither cached nor fetchable; unavailable rainfall is reported as None.
+    """
+    lat, lng = grid_cell(*validate_coordinates(latitude, longitude))
+
+    # Rainfall on a pool thread while the forecast is fetched here, so two cold lookups
+    # take as long as the slower one rather than both in turn
+    rainfall_future = _executor.submit(_cached_rainfall, lat, lng)
+    forecast, status = weather_cache.get_or_fetch(
+        forecast_key(lat, lng), lambda: fetch_forecast(lat, lng), settings.WEATHER_FORECAST_TTL)
+    weather_data = dict(forecast)
+    try:
+        rainfall = rainfall_future.result()
+    except OpenMeteoError as e:
+        logger.warning(f"Rainfall unavailable for {lat},{lng}: {e}")
+        rainfall = None
+    weather_data['rainfall'] = rainfall
+    weather_data['annual_rainfall'] = rainfall['last_365_days'] if rainfall else None
+    return weather_data, status
+
+
+weather_cache = WeatherCache(make_backend(settings.WEATHER_CACHE_BACKEND), stale_ttl=settings.WEATHER_STALE_TTL)
+_executor = ThreadPoolExecutor(max_workers=settings.OPEN_METEO_POOL_SIZE, thread_name_prefix='weather')
@@ -0,0 +1,149 @@
+"""
+Weather-based recommendations, computed in memory and stored once per farm and day.
+
+Each recommendation has a key naming what it is about ('rain', 'heat', 'frost',
+'stable', 'flowering-heat-<farm crop id>'). Saving upserts the (farm, date, type, key)
+rows of the day in one statement, so regenerating them on every weather page load or
+refresh updates the same rows instead of adding new ones, and the day's
+recommendations that no longer apply are removed.
+"""
+from datetime import date, datetime
+
+from core.models import FarmCrop, Recommendation
+
+# Recommendation types produced here; other types are never touched
+WEATHER_RECOMMENDATION_TYPES = ['WATER', 'WEATHER', 'CROP']
+
+
+def flowering_crops(farms):
+    """{farm_id: [FarmCrop, ...]} of the farms' flowering crops, with their Crop, in one query"""
+    crops = {}
+    for farm_crop in FarmCrop.objects.filter(farm__in=farms, growth_stage='Flowering').select_related('crop'):
+        crops.setdefault(farm_crop.farm_id, []).append(farm_crop)
+    return crops
+
+
+def build_weather_recommendations(weather_data, farm_crops=(), today=None):
+    """
+    Recommendations for a farm's forecast, without touching the database.
+
+    Args:
+        weather_data: Forecast as returned by weather_cache.get_weather
+        farm_crops: The farm's flowering FarmCrops (crop loaded, see flowering_crops)
+
+    Returns:
+        [(key, {'type', 'details'}, farm_crop or None), ...]
+    """
+    today = today or date.today()
+    recommendations = []
+    daily = weather_data.get('daily') or []
+    if not daily:
+        return recommendations
+
+    rainy_days = [day for day in daily if day['precipitation_probability'] > 50]
+    hot_days = [day for day in daily if day['max_temp'] > 30]  # Days over 30°C
+    cold_days = [day for day in daily if day['min_temp'] < 5]  # Days under 5°C
+
+    # Irrigation recommendations based on precipitation forecast
+    if rainy_days:
+        first_rainy_day = rainy_days[0]
+        days_until_rain = (datetime.strptime(first_rainy_day['date'], '%Y-%m-%d').date() - today).days
+        if days_until_rain <= 2:
+            recommendations.append(('rain', {
+                'type': 'WATER',
+                'details': {
+                    'title': 'Adjust Irrigation Schedule',
+                    'description': f"Rain expected in {days_until_rain} day{'s' if days_until_rain != 1 else ''} with {first_rainy_day['precipitation_probability']}% probability. Consider reducing irrigation.",
+                    'urgency': 'medium',
+                    'days_until_rain': days_until_rain,
+                    'precipitation_probability': first_rainy_day['precipitation_probability']
+                }
+            }, None))
+
+    # Temperature-based recommendations
+    if hot_days:
+        recommendations.append(('heat', {
+            'type': 'WEATHER',
+            'details': {
+                'title': 'Heat Protection Needed',
+                'description': f"Upcoming hot weather ({len(hot_days)} days above 30°C). Ensure adequate irrigation and consider shade for sensitive crops.",
+                'urgency': 'high',
+                'affected_days': [day['date'] for day in hot_days]
+            }
+        }, None))
+
+    if cold_days:
+        recommendations.append(('frost', {
+            'type': 'WEATHER',
+            'details': {
+                'title': 'Frost Protection Alert',
+                'description': f"Low temperatures expected (below 5°C on {len(cold_days)} days). Protect frost-sensitive crops.",
+                'urgency': 'high',
+                'affected_days': [day['date'] for day in cold_days]
+            }
+        }, None))
+
+    # Flowering crops need stable weather
+    if hot_days:
+        for farm_crop in farm_crops:
+            recommendations.append((f"flowering-heat-{farm_crop.id}", {
+                'type': 'CROP',
+                'details': {
+                    'title': f'Protect {farm_crop.crop.name} During Flowering',
+                    'description': f"High temperatures may affect flowering. Consider additional irrigation for your {farm_crop.crop.name}.",
+                    'urgency': 'high',
+                    'crop_id': farm_crop.id,
+                    'crop_name': farm_crop.crop.name
+                }
+            }, farm_crop))
+
+    # If no specific recommendations, provide a general one
+    if not recommendations:
+        recommendations.append(('stable', {
+            'type': 'WEATHER',
+            'details': {
+                'title': 'Weather Conditions Stable',
+                'description': "Weather conditions look favorable for the next few days. Continue regular farm operations.",
+                'urgency': 'low'
+            }
+        }, None))
+
+    return recommendations
+
+
+def save_recommendations(farm_recommendations, today=None):
+    """
+    Store the recommendations of the day for several farms: one upsert of all of
+    them, then delete the farms' recommendations of the day whose key was not
+    produced this time, with one statement per set of keys produced.
+
+    Args:
+        farm_recommendations: {farm: build_weather_recommendations(...)}
+    """
+    today = today or date.today()
+    rows = [
+        Recommendation(farm=farm, farm_crop=farm_crop, date=today, key=key,
+                       recommendation_type=recommendation['type'], details=recommendation['details'])
+        for farm, recommendations in farm_recommendations.items()
+        for key, recommendation, farm_crop in recommendations
+    ]
+    Recommendation.objects.bulk_create(
+        rows, batch_size=500, update_conflicts=True,
+        unique_fields=['farm', 'date', 'recommendation_type', 'key'],
+        update_fields=['farm_crop', 'details', 'generated_at'],
+    )
+
+    # Farms producing the same keys share one delete (farms without a forecast, so
+    # without recommendations, keep what they have)
+    farms_by_keys = {}
+    for farm, recommendations in farm_recommendations.items():
+        if recommendations:
+            farms_by_keys.setdefault(frozenset(key for key, _, _ in recommendations), []).append(farm.pk)
+    for keys, farm_ids in farms_by_keys.items():
+        for start in range(0, len(farm_ids), 500):
+            (Recommendation.objects
+             .filter(farm__in=farm_ids[start:start + 500], date=today,
+                     recommendation_type__in=WEATHER_RECOMMENDATION_TYPES)
+             .exclude(key__in=keys)
+             .delete())
+    return len(rows)
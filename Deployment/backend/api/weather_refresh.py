@@ -0,0 +1,161 @@
+"""
+Batch weather refresh for every farm (the refresh_weather management command).
+
+Farms are grouped by weather grid cell (api/open_meteo.grid_cell), so neighbouring
+farms share one forecast. The forecasts of all the cells are fetched with
+multi-location Open-Meteo requests (MAX_LOCATIONS_PER_REQUEST cells per request), the
+rainfall store of every cell is synced the same way, and the results are fanned out
+to the farms: today's Weather rows and weather recommendations of all farms are
+written with one upsert each, and the weather cache entries of each cell are
+replaced so page loads read them instead of calling Open-Meteo.
+"""
+import logging
+from datetime import date, datetime
+
+from django.conf import settings
+
+from core.models import Farm, Weather
+from .open_meteo import fetch_forecasts, grid_cell, OpenMeteoError
+from .rainfall import farm_location, rainfall_totals_many, sync_rainfall_cells
+from .weather_cache import forecast_key, rainfall_key, weather_cache
+from .weather_recommendations import build_weather_recommendations, flowering_crops, save_recommendations
+
+logger = logging.getLogger(__name__)
+
+# Open-Meteo weather codes -> Weather.condition
+WEATHER_CODE_CONDITIONS = {
+    0: 'SUNNY',  # Clear sky
+    1: 'SUNNY',  # Mainly clear
+    2: 'PARTLY_CLOUDY',  # Partly cloudy
+    3: 'CLOUDY',  # Overcast
+    45: 'FOGGY',  # Fog
+    48: 'FOGGY',  # Depositing rime fog
+    51: 'RAINY',  # Light drizzle
+    53: 'RAINY',  # Moderate drizzle
+    55: 'RAINY',  # Dense drizzle
+    56: 'RAINY',  # Light freezing drizzle
+    57: 'RAINY',  # Dense freezing drizzle
+    61: 'RAINY',  # Slight rain
+    63: 'RAINY',  # Moderate rain
+    65: 'RAINY',  # Heavy rain
+    66: 'RAINY',  # Light freezing rain
+    67: 'RAINY',  # Heavy freezing rain
+    71: 'SNOWY',  # Slight snow fall
+    73: 'SNOWY',  # Moderate snow fall
+    75: 'SNOWY',  # Heavy snow fall
+    77: 'SNOWY',  # Snow grains
+    80: 'RAINY',  # Slight rain showers
+    81: 'RAINY',  # Moderate rain showers
+    82: 'RAINY',  # Violent rain showers
+    85: 'SNOWY',  # Slight snow showers
+    86: 'SNOWY',  # Heavy snow showers
+    95: 'STORMY',  # Thunderstorm
+    96: 'STORMY',  # Thunderstorm with slight hail
+    99: 'STORMY',  # Thunderstorm with heavy hail
+}
+
+# Weather fields written by weather_fields (everything but the farm/date key)
+WEATHER_UPDATE_FIELDS = ['condition', 'temperature_max', 'temperature_min', 'humidity', 'precipitation',
+                         'wind_speed', 'forecast_data']
+
+
+def weather_fields(weather_data):
+    """Weather model field values for the data returned by weather_cache.get_weather"""
+    current = weather_data.get('current', {})
+    condition = WEATHER_CODE_CONDITIONS.get(current.get('weather_code'), 'CLOUDY')  # Default to cloudy if unknown code
+
+    # Min/max of today's forecast, or the current temperature with a simple offset
+    daily_data = weather_data.get('daily', [])
+    temp_min = temp_max = None
+    if daily_data:
+        temp_min = daily_data[0].get('min_temp')
+        temp_max = daily_data[0].get('max_temp')
+    elif current.get('temperature') is not None:
+        temp_min = current['temperature'] - 3
+        temp_max = current['temperature'] + 3
+
+    forecast_data = {
+        'hourly': weather_data.get('hourly', []),
+        'daily': daily_data,
+        'last_updated': datetime.now().isoformat()
+    }
+    if 'annual_rainfall' in weather_data:
+        forecast_data['annual_rainfall'] = weather_data['annual_rainfall']
+
+    return {
+        'condition': condition,
+        'temperature_max': temp_max if temp_max is not None else 0,
+        'temperature_min': temp_min if temp_min is not None else 0,
+        'humidity': current.get('humidity'),
+        'precipitation': current.get('precipitation'),
+        'wind_speed': current.get('wind_speed'),
+        'forecast_data': forecast_data,
+    }
+
+
+def farms_by_cell(farms):
+    """({(lat, lng): [farm, ...]}, farms without a location) for the farms' grid cells"""
+    cells, skipped = {}, []
+    for farm in farms:
+        location = farm_location(farm)
+        if location is None:
+            skipped.append(farm)
+            continue
+        cells.setdefault(grid_cell(*location), []).append(farm)
+    return cells, skipped
+
+
+def refresh_weather(farms=None, today=None):
+    """
+    Fetch the weather of every grid cell holding one of the farms (all farms by
+    default) and write it to the farms' Weather rows and recommendations for today and
+    the weather cache.
+
+    Raises OpenMeteoError if the forecasts cannot be fetched; a failed rainfall sync
+    only leaves the rainfall totals at the days already stored.
+
+    Returns:
+        {'farms', 'cells', 'skipped', 'rainfall_days', 'recommendations'}: farms written,
+        unique cells fetched, farms skipped for lack of a boundary centroid, rainfall
+        days stored, recommendations stored
+    """
+    today = today or date.today()
+    if farms is None:
+        farms = Farm.objects.all()
+    if hasattr(farms, 'only'):
+        farms = farms.only('id', 'name', 'centroid_lat', 'centroid_lng')
+    cells, skipped = farms_by_cell(farms)
+    stats = {'farms': 0, 'cells': len(cells), 'skipped': len(skipped), 'rainfall_days': 0, 'recommendations': 0}
+    if not cells:
+        return stats
+
+    cell_list = list(cells)
+    forecasts = fetch_forecasts(cell_list)
+    try:
+        stats['rainfall_days'] = sync_rainfall_cells(cell_list)
+    except OpenMeteoError as e:
+        logger.warning(f"Rainfall sync of {len(cell_list)} cells failed, using stored days: {e}")
+    totals = rainfall_totals_many(cell_list)
+
+    crops = flowering_crops([farm.pk for cell_farms in cells.values() for farm in cell_farms])
+    records, farm_recommendations = [], {}
+    for cell, forecast in zip(cell_list, forecasts):
+        rainfall = totals[cell] if totals[cell]['days_recorded'] else None
+        weather_cache.store(forecast_key(*cell), forecast, settings.WEATHER_FORECAST_TTL)
+        if rainfall is not None:
+            weather_cache.store(rainfall_key(*cell), rainfall, settings.WEATHER_RAINFALL_TTL)
+
+        weather_data = dict(forecast)
+        weather_data['rainfall'] = rainfall
+        weather_data['annual_rainfall'] = rainfall['last_365_days'] if rainfall else None
+        fields = weather_fields(weather_data)
+        for farm in cells[cell]:
+            records.append(Weather(farm=farm, date=today, **fields))
+            farm_recommendations[farm] = build_weather_recommendations(weather_data, crops.get(farm.pk, []), today)
+
+    Weather.objects.bulk_create(records, batch_size=500, update_conflicts=True,
+                                unique_fields=['farm', 'date'], update_fields=WEATHER_UPDATE_FIELDS)
+    stats['farms'] = len(records)
+    stats['recommendations'] = save_recommendations(farm_recommendations, today)
+    logger.info(f"Refreshed weather of {stats['farms']} farms from {stats['cells']} grid cells")
+    return stats
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Farm, Farmer, Admin, DetectedWeed, Weather, Crop, FarmCrop, Scan, Recommendation, InventoryItem, Equipment
+from .models import UserProfile, Farm, Farmer, Admin, DetectedWeed, Weather, DailyRainfall, Crop, FarmCrop, Scan, Recommendation, InventoryItem, Equipment
 
 # Register the UserProfile model
 @admin.register(UserProfile)
@@ -32,6 +32,11 @@ class WeatherAdmin(admin.ModelAdmin):
     search_fields = ['farm__name']
     date_hierarchy = 'date'
 
+@admin.register(DailyRainfall)
+class DailyRainfallAdmin(admin.ModelAdmin):
+    list_display = ['latitude', 'longitude', 'date', 'precipitation']
+    date_hierarchy = 'date'
+
 @admin.register(Crop)
 class CropAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
@@ -52,15 +57,15 @@ class DetectedWeedAdmin(admin.ModelAdmin):
 
 @admin.register(Scan)
 class ScanAdmin(admin.ModelAdmin):
-    list_display = ['scan_type', 'farm', 'farm_crop', 'scanned_at', 'weed_coverage_percentage']
-    list_filter = ['scan_type', 'scanned_at']
+    list_display = ['scan_type', 'farm', 'farm_crop', 'scanned_at', 'status', 'weed_coverage_percentage']
+    list_filter = ['scan_type', 'status', 'scanned_at']
     search_fields = ['farm__name', 'farm_crop__crop__name']
     date_hierarchy = 'scanned_at'
 
 @admin.register(Recommendation)
 class RecommendationAdmin(admin.ModelAdmin):
-    list_display = ['recommendation_type', 'farm', 'farm_crop', 'generated_at']
-    list_filter = ['recommendation_type', 'generated_at']
+    list_display = ['recommendation_type', 'key', 'farm', 'farm_crop', 'date', 'generated_at']
+    list_filter = ['recommendation_type', 'date', 'generated_at']
     search_fields = ['farm__name', 'farm_crop__crop__name']
     date_hierarchy = 'generated_at'
 
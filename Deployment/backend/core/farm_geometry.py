@@ -0,0 +1,231 @@
+"""
+Geometry derived from Farm.boundary_geojson.
+
+Boundaries arrive in several shapes: a GeoJSON Feature, a FeatureCollection (the
+detection endpoints), a bare Polygon/MultiPolygon geometry, or any of those as a JSON
+string. These helpers normalise them to numpy rings once, when the boundary is saved,
+so queries can use the stored bbox/centroid/area columns instead of walking the JSON.
+"""
+import json
+import math
+
+import numpy as np
+
+R_WGS84 = 6378137.0  # WGS84 equatorial radius in meters
+
+
+def boundary_polygons(boundary):
+    """
+    Polygons of a farm boundary.
+
+    Returns:
+        List of polygons, each a list of rings ((N, 2) float arrays of [lng, lat]),
+        the outer ring first and holes after it. Empty if the boundary has no usable polygon.
+    """
+    if isinstance(boundary, str):
+        try:
+            boundary = json.loads(boundary)
+        except ValueError:
+            return []
+    if not isinstance(boundary, dict):
+        return []
+
+    kind = boundary.get('type')
+    if kind == 'FeatureCollection' or (kind is None and 'features' in boundary):
+        polygons = []
+        for feature in boundary.get('features') or []:
+            polygons.extend(boundary_polygons(feature))
+        return polygons
+    if kind == 'Feature':
+        return boundary_polygons(boundary.get('geometry'))
+    if kind == 'GeometryCollection':
+        polygons = []
+        for geometry in boundary.get('geometries') or []:
+            polygons.extend(boundary_polygons(geometry))
+        return polygons
+
+    if kind == 'Polygon':
+        polygon_coords = [boundary.get('coordinates')]
+    elif kind == 'MultiPolygon':
+        polygon_coords = boundary.get('coordinates')
+    else:
+        return []
+
+    polygons = []
+    for rings in polygon_coords or []:
+        try:
+            arrays = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings or []]
+        except (TypeError, ValueError, IndexError):
+            continue
+        if arrays and len(arrays[0]) >= 3:
+            polygons.append([ring for ring in arrays if len(ring) >= 3])
+    return polygons
+
+
+def polygons_bbox(polygons):
+    """(west, south, east, north) of the outer rings, or None"""
+    if not polygons:
+        return None
+    points = np.concatenate([polygon[0] for polygon in polygons])
+    west, south = points.min(axis=0)
+    east, north = points.max(axis=0)
+    return float(west), float(south), float(east), float(north)
+
+
+def polygons_centroid(polygons):
+    """
+    (lat, lng) area-weighted centroid of the polygons (holes subtracted), or None.
+
+    Computed in a local equirectangular projection around the bbox centre, which is
+    accurate at farm scale; degenerate (zero-area) boundaries fall back to the mean
+    of their vertices.
+    """
+    if not polygons:
+        return None
+    west, south, east, north = polygons_bbox(polygons)
+    lng0, lat0 = (west + east) / 2, (south + north) / 2
+    scale = math.cos(math.radians(lat0))
+
+    total_area = 0.0
+    moment_x = moment_y = 0.0
+    for polygon in polygons:
+        for index, ring in enumerate(polygon):
+            x = (ring[:, 0] - lng0) * scale
+            y = ring[:, 1] - lat0
+            x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+            cross = x * y_next - x_next * y
+            area = cross.sum() / 2
+            if not area:
+                continue
+            # Outer rings add, holes subtract, whatever their winding order
+            sign = (1 if index == 0 else -1) * np.sign(area)
+            total_area += sign * area
+            moment_x += sign * ((x + x_next) * cross).sum() / 6
+            moment_y += sign * ((y + y_next) * cross).sum() / 6
+
+    if abs(total_area) < 1e-18:
+        points = np.concatenate([_open_ring(polygon[0]) for polygon in polygons])
+        lng, lat = points.mean(axis=0)
+        return float(lat), float(lng)
+    return float(lat0 + moment_y / total_area), float(lng0 + moment_x / total_area / scale)
+
+
+def ring_area_m2(ring):
+    """
+    Area of a lng/lat ring on the WGS84 sphere in square meters (spherical excess,
+    as in Chamberlain & Duquette, "Some algorithms for polygons on a sphere").
+    """
+    ring = _open_ring(ring)
+    lng = np.radians(ring[:, 0])
+    sin_lat = np.sin(np.radians(ring[:, 1]))
+    total = np.sum((np.roll(lng, -1) - np.roll(lng, 1)) * sin_lat)
+    return abs(float(total)) * R_WGS84 ** 2 / 2
+
+
+def polygons_area_m2(polygons):
+    """Geodesic area of the polygons (outer rings minus holes) in square meters"""
+    return sum(ring_area_m2(outer) - sum(ring_area_m2(hole) for hole in holes)
+               for outer, *holes in polygons)
+
+
+def _open_ring(ring):
+    """The ring without its closing point (if the first point is repeated at the end)"""
+    if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+        return ring[:-1]
+    return ring
+
+
+def point_in_ring(lng, lat, ring):
+    """Even-odd ray casting test of one point against one ring, over all edges at once"""
+    x, y = ring[:, 0], ring[:, 1]
+    x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+    crosses = (y > lat) != (y_next > lat)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at_lat = x + (lat - y) * (x_next - x) / (y_next - y)
+    return bool(np.count_nonzero(crosses & (lng < x_at_lat)) % 2)
+
+
+def point_in_polygons(lng, lat, polygons):
+    """Whether the point lies inside any of the polygons (and outside their holes)"""
+    for outer, *holes in polygons:
+        if point_in_ring(lng, lat, outer) and not any(point_in_ring(lng, lat, hole) for hole in holes):
+            return True
+    return False
+
+
+def zoom_tolerance_degrees(zoom):
+    """Width of one 256px web map tile pixel at the given zoom, in degrees of longitude"""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Douglas-Peucker simplification of a closed ring, keeping at least a triangle.
+    Returns the simplified ring (closed), or None if it collapses to fewer than 3 points.
+    """
+    points = _open_ring(ring)
+    if len(points) <= 3:
+        return np.vstack([points, points[:1]]) if len(points) == 3 else None
+
+    # Split the ring at the vertex farthest from the first one, then simplify both chains
+    far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+    if far == 0:
+        return None
+    keep = np.zeros(len(points) + 1, dtype=bool)
+    chain = np.vstack([points, points[:1]])
+    keep[[0, far, len(points)]] = True
+    stack = [(0, far), (far, len(points))]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = chain[end] - chain[start]
+        offsets = chain[start + 1:end] - chain[start]
+        length = np.hypot(*segment)
+        if length:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(*offsets.T)
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            stack.append((start, middle))
+            stack.append((middle, end))
+
+    simplified = chain[keep]
+    if len(simplified) < 4:
+        # Only the two split points survived: add the vertex farthest from their chord
+        segment = chain[far] - chain[0]
+        offsets = points - chain[0]
+        third = int(np.argmax(np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0])))
+        if third in (0, far):
+            return None
+        keep[third] = True
+        simplified = chain[keep]
+    return simplified
+
+
+def simplify_polygons(polygons, tolerance):
+    """Simplified copies of the polygons; collapsed holes are dropped, as are polygons whose outer ring collapses"""
+    simplified = []
+    for outer, *holes in polygons:
+        outer = simplify_ring(outer, tolerance)
+        if outer is None:
+            continue
+        simplified.append([outer] + [ring for ring in (simplify_ring(hole, tolerance) for hole in holes) if ring is not None])
+    return simplified
+
+
+def multipolygon_coordinates(polygons, decimals=7):
+    """GeoJSON MultiPolygon coordinates (rounded lists) for the polygons"""
+    return [[np.round(ring, decimals).tolist() for ring in polygon] for polygon in polygons]
+
+
+def boundary_levels(polygons, zooms):
+    """
+    Pre-simplified MultiPolygon coordinates per zoom level, with a tolerance of one
+    tile pixel at that zoom: {'<zoom>': coordinates}
+    """
+    return {str(zoom): multipolygon_coordinates(simplify_polygons(polygons, zoom_tolerance_degrees(zoom)))
+            for zoom in zooms}
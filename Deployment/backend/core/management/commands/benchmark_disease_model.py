@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = 'Compare latency of the disease model runtimes (eager, TorchScript, ONNX) on this machine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=['eager', 'torchscript', 'onnx'],
+                            choices=['eager', 'torchscript', 'onnx'])
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--threads', type=int, help='Intra-op threads (defaults to ML_INTRA_OP_THREADS)')
+
+    def handle(self, *args, **options):
+        from api.model_registry import DISEASE_WEIGHTS, disease_artifact_path, configure_torch_threads
+        try:
+            from api.disease_runtime import load_backend, check_parity, benchmark
+        except ImportError as e:
+            raise CommandError(f'PyTorch is required: {e}')
+        import os
+
+        configure_torch_threads(options.get('threads'))
+
+        if not os.path.exists(DISEASE_WEIGHTS):
+            raise CommandError(f'Disease model weights not found: {DISEASE_WEIGHTS}')
+        eager = load_backend('eager', DISEASE_WEIGHTS)
+
+        for backend in options['backends']:
+            path = disease_artifact_path(backend, DISEASE_WEIGHTS)
+            if not os.path.exists(path):
+                self.stdout.write(self.style.WARNING(f'{backend}: {path} not found, run export_disease_model first'))
+                continue
+            try:
+                model = eager if backend == 'eager' else load_backend(backend, path)
+            except ImportError as e:
+                self.stdout.write(self.style.WARNING(f'{backend}: {e}'))
+                continue
+
+            if backend != 'eager':
+                parity = check_parity(eager, model)
+                self.stdout.write(f"{backend}: parity max |logit diff| {parity['max_abs_diff']:.2e}, "
+                                  f"top-1 {'matches' if parity['top1_match'] else 'DIFFERS'}")
+
+            for batch_size in options['batch_sizes']:
+                stats = benchmark(model, batch_size=batch_size, iterations=options['iterations'])
+                self.stdout.write(
+                    f"{backend:<12} batch {batch_size:>3}: p50 {stats['p50_ms']:>8.2f} ms  "
+                    f"p95 {stats['p95_ms']:>8.2f} ms  {stats['images_per_second']:>8.1f} img/s"
+                )
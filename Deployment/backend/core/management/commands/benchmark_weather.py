@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Measure cold weather lookups (forecast + rainfall) fetched one after the other and concurrently, '
+            'against the built-in fake Open-Meteo server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--latency-ms', type=float, default=100, help='Latency of the fake server')
+        parser.add_argument('--real', action='store_true',
+                            help='Use the configured OPEN_METEO_* URLs instead of the fake server')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        from api.fake_open_meteo import FakeOpenMeteoServer
+        from api.open_meteo import fetch_forecast, grid_cell
+        from api.rainfall import update_rainfall
+        from api.weather_cache import get_weather
+        from core.models import DailyRainfall
+
+        server = None
+        if not options['real']:
+            server = FakeOpenMeteoServer(latency=options['latency_ms'] / 1000).start()
+            settings.OPEN_METEO_FORECAST_URL = server.forecast_url
+            settings.OPEN_METEO_ARCHIVE_URL = server.archive_url
+            self.stdout.write(f"Fake Open-Meteo at {server.base_url} ({options['latency_ms']:.0f} ms per response)")
+
+        # Distinct cells far from any farm, so every lookup is cold (their rainfall rows are removed afterwards)
+        size = settings.WEATHER_CACHE_CELL_DEGREES
+        cells = [grid_cell(-60 + i * size, -170 + i * size) for i in range(2 * options['iterations'])]
+        try:
+            sequential, concurrent = [], []
+            for i in range(options['iterations']):
+                lat, lng = cells[2 * i]
+                start = time.perf_counter()
+                fetch_forecast(lat, lng)
+                update_rainfall(lat, lng)
+                sequential.append(time.perf_counter() - start)
+
+                lat, lng = cells[2 * i + 1]
+                start = time.perf_counter()
+                get_weather(lat, lng)
+                concurrent.append(time.perf_counter() - start)
+
+            for name, timings in (('sequential', sequential), ('concurrent', concurrent)):
+                timings = sorted(timings)
+                p50 = timings[len(timings) // 2] * 1000
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000
+                self.stdout.write(f"{name:<11} p50 {p50:>8.1f} ms  p95 {p95:>8.1f} ms")
+        finally:
+            DailyRainfall.objects.filter(latitude__in=[lat for lat, _ in cells],
+                                         longitude__in=[lng for _, lng in cells]).delete()
+            if server is not None:
+                server.stop()
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Farm, CropClassification
+
+class Command(BaseCommand):
+    help = 'Run crop classification for many farms at once using a single batched model call per chunk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='Only classify farms owned by this user')
+        parser.add_argument('--farms', type=int, nargs='+', help='Only classify these farm IDs')
+        parser.add_argument('--batch-size', type=int, default=500, help='Farms loaded, scored and written per chunk')
+        parser.add_argument('--dry-run', action='store_true', help='Score farms without writing classifications')
+
+        # Defaults for inputs that are not stored on the farm itself
+        parser.add_argument('--fertilizer-amount', type=float, help='Fertilizer amount (kg)')
+        parser.add_argument('--pesticide-amount', type=float, help='Pesticide amount (kg)')
+        parser.add_argument('--fertilizer-type', choices=[c[0] for c in CropClassification.FERTILIZER_TYPE_CHOICES])
+        parser.add_argument('--governorate', choices=[c[0] for c in CropClassification.GOVERNORATE_CHOICES],
+                            help='Used when the governorate cannot be read from the farm address')
+        parser.add_argument('--planting-season', choices=[c[0] for c in CropClassification.SEASON_CHOICES])
+        parser.add_argument('--growing-season', choices=[c[0] for c in CropClassification.SEASON_CHOICES])
+        parser.add_argument('--harvest-season', choices=[c[0] for c in CropClassification.SEASON_CHOICES])
+        parser.add_argument('--temperature', type=float, help='Used when a farm has no weather records')
+        parser.add_argument('--humidity', type=float, help='Used when a farm has no weather records')
+        parser.add_argument('--rainfall', type=float, help='Used when a farm has no weather records')
+
+    def handle(self, *args, **options):
+        # Imported here so other management commands don't load the ML stack
+        from api.bulk_classification import classify_farms, ClassifierUnavailable
+
+        farms = Farm.objects.all()
+        if options.get('username'):
+            farms = farms.filter(owner__profile__user__username=options['username'])
+        if options.get('farms'):
+            farms = farms.filter(id__in=options['farms'])
+
+        total = farms.count()
+        if not total:
+            self.stdout.write(self.style.WARNING('No farms found'))
+            return
+
+        default_fields = [
+            'fertilizer_amount', 'pesticide_amount', 'fertilizer_type', 'governorate',
+            'planting_season', 'growing_season', 'harvest_season', 'temperature', 'humidity', 'rainfall',
+        ]
+        defaults = {field: options[field] for field in default_fields if options.get(field) is not None}
+
+        self.stdout.write(f'Classifying {total} farms...')
+        try:
+            classifications, skipped = classify_farms(
+                farms,
+                defaults=defaults,
+                batch_size=options['batch_size'],
+                commit=not options['dry_run'],
+            )
+        except ClassifierUnavailable as e:
+            raise CommandError(str(e))
+
+        for classification in classifications:
+            self.stdout.write(
+                f'Farm {classification.farm_id}: '
+                f'{classification.predicted_crop_name} ({classification.confidence_score}%)'
+            )
+        for entry in skipped:
+            self.stdout.write(self.style.WARNING(
+                f"Skipped farm {entry['farm']}: missing {', '.join(entry['missing'])}"
+            ))
+
+        action = 'Scored' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {len(classifications)} classifications, skipped {len(skipped)} farms.'
+        ))
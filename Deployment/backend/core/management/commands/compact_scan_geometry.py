@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core.models import Scan
+
+class Command(BaseCommand):
+    help = 'Move weed polygons of existing scans out of detection_results into compact geometry files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Number of scans loaded per query')
+
+    def handle(self, *args, **options):
+        scans = Scan.objects.filter(scan_type='WEED', geometry_file='', detection_results__has_key='detected_weeds')
+        compacted = 0
+        for scan in scans.iterator(chunk_size=options['batch_size']):
+            if scan.compact_geometry():
+                compacted += 1
+        self.stdout.write(self.style.SUCCESS(f'Compacted {compacted} scans'))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = 'Export the ResNet9 disease model to TorchScript and/or ONNX and check parity with the eager model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['torchscript', 'onnx', 'all'], default='all', help='Artifact(s) to produce')
+        parser.add_argument('--weights', type=str, help='Eager state_dict to export (defaults to the registered weights)')
+        parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+        parser.add_argument('--atol', type=float, default=1e-3, help='Largest logit difference accepted by the parity check')
+
+    def handle(self, *args, **options):
+        # Imported here so other management commands don't load torch
+        from api.model_registry import DISEASE_WEIGHTS, disease_artifact_path
+        try:
+            from api.disease_model import load_disease_model
+            from api.disease_runtime import export_torchscript, export_onnx, load_backend, check_parity
+        except ImportError as e:
+            raise CommandError(f'PyTorch is required: {e}')
+
+        weights = options.get('weights') or DISEASE_WEIGHTS
+        try:
+            eager = load_disease_model(weights)
+        except FileNotFoundError:
+            raise CommandError(f'Disease model weights not found: {weights}')
+
+        formats = ['torchscript', 'onnx'] if options['format'] == 'all' else [options['format']]
+        failed = []
+        for backend in formats:
+            output_path = disease_artifact_path(backend, weights)
+            self.stdout.write(f'Exporting {backend} model to {output_path}...')
+            try:
+                if backend == 'torchscript':
+                    export_torchscript(eager, output_path)
+                else:
+                    export_onnx(eager, output_path, opset=options['opset'])
+                exported = load_backend(backend, output_path)
+            except ImportError as e:
+                self.stdout.write(self.style.WARNING(f'Skipping {backend}: {e}'))
+                continue
+
+            parity = check_parity(eager, exported, atol=options['atol'])
+            message = (f"{backend}: max |logit diff| {parity['max_abs_diff']:.2e}, "
+                       f"top-1 {'matches' if parity['top1_match'] else 'DIFFERS'}")
+            if parity['passed']:
+                self.stdout.write(self.style.SUCCESS(message))
+            else:
+                self.stdout.write(self.style.ERROR(message))
+                failed.append(backend)
+
+        if failed:
+            raise CommandError(f"Parity check failed for: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS('Set DISEASE_MODEL_BACKEND to serve an exported model.'))
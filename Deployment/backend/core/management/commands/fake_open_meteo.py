@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Serve a local fake Open-Meteo forecast/archive API for tests and benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every response')
+        parser.add_argument('--fail-rate', type=float, default=0, help='Fraction of requests answered with 503')
+
+    def handle(self, *args, **options):
+        from api.fake_open_meteo import FakeOpenMeteoServer
+
+        server = FakeOpenMeteoServer(options['host'], options['port'], latency=options['latency_ms'] / 1000,
+                                     fail_rate=options['fail_rate'])
+        self.stdout.write(f"Fake Open-Meteo listening on {server.base_url}")
+        self.stdout.write(f"  OPEN_METEO_FORECAST_URL={server.forecast_url}")
+        self.stdout.write(f"  OPEN_METEO_ARCHIVE_URL={server.archive_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
@@ -0,0 +1,91 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODELS = ['farm_boundary', 'weed', 'disease']
+
+class Command(BaseCommand):
+    help = 'Quantize the vision models to INT8 ONNX using sample images and report accuracy vs latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=MODELS, default=MODELS)
+        parser.add_argument('--calibration-dir', type=str, required=True,
+                            help='Folder of representative images (map captures for farm_boundary, field photos for weed, leaves for disease). '
+                                 'Sub-folders named after a model are used for that model if present.')
+        parser.add_argument('--calibration-images', type=int, default=100, help='Images used for calibration')
+        parser.add_argument('--eval-images', type=int, default=20,
+                            help='Images held out from calibration to compare fp32 and INT8')
+        parser.add_argument('--report', type=str, help='Where to write the JSON report '
+                            '(default: quantization_report.json in ML_MODELS_DIR)')
+
+    def handle(self, *args, **options):
+        try:
+            from api import quantization as q
+            from api.model_registry import (
+                FARM_BOUNDARY_WEIGHTS, WEED_WEIGHTS, DISEASE_WEIGHTS, disease_artifact_path, quantized_artifact_path,
+            )
+        except ImportError as e:
+            raise CommandError(f'Missing dependency: {e}')
+
+        weights = {'farm_boundary': FARM_BOUNDARY_WEIGHTS, 'weed': WEED_WEIGHTS, 'disease': DISEASE_WEIGHTS}
+        report = {}
+
+        for name in options['models']:
+            weights_path = weights[name]
+            if not os.path.exists(weights_path):
+                self.stdout.write(self.style.WARNING(f'{name}: weights not found at {weights_path}, skipping'))
+                continue
+
+            image_dir = os.path.join(options['calibration_dir'], name)
+            if not os.path.isdir(image_dir):
+                image_dir = options['calibration_dir']
+            images = q.list_images(image_dir, options['calibration_images'] + options['eval_images'])
+            if len(images) <= options['eval_images']:
+                raise CommandError(f'{name}: need more than {options["eval_images"]} images in {image_dir}')
+            eval_images = images[:options['eval_images']]
+            calibration_images = images[options['eval_images']:]
+
+            int8_path = quantized_artifact_path(weights_path)
+            self.stdout.write(f'{name}: calibrating on {len(calibration_images)} images...')
+            try:
+                if name == 'disease':
+                    from api.disease_model import load_disease_model
+                    from api.disease_runtime import export_onnx
+                    eager = load_disease_model(weights_path)
+                    fp32_onnx = export_onnx(eager, disease_artifact_path('onnx', weights_path))
+                    reader = q.make_calibration_reader(fp32_onnx, calibration_images, q.disease_input)
+                    q.quantize_onnx(fp32_onnx, int8_path, reader)
+                    metrics = q.evaluate_disease(eager, int8_path, eval_images)
+                else:
+                    fp32_onnx = q.export_yolo_onnx(weights_path)
+                    reader = q.make_calibration_reader(fp32_onnx, calibration_images, q.yolo_input)
+                    q.quantize_onnx(fp32_onnx, int8_path, reader)
+                    metrics = q.evaluate_yolo(weights_path, int8_path, eval_images)
+            except ImportError as e:
+                raise CommandError(f'Missing dependency for {name}: {e} (install onnx and onnxruntime)')
+
+            metrics.update({
+                'fp32_size_mb': q.file_size_mb(weights_path),
+                'int8_size_mb': q.file_size_mb(int8_path),
+                'int8_path': int8_path,
+            })
+            report[name] = metrics
+
+            accuracy = metrics.get('agreement_f1', metrics.get('top1_agreement'))
+            speedup = metrics['fp32_p50_ms'] / metrics['int8_p50_ms'] if metrics['int8_p50_ms'] else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"{name}: agreement with fp32 {accuracy:.3f}, "
+                f"latency {metrics['fp32_p50_ms']:.1f} -> {metrics['int8_p50_ms']:.1f} ms ({speedup:.2f}x), "
+                f"size {metrics['fp32_size_mb']} -> {metrics['int8_size_mb']} MB"
+            ))
+
+        if not report:
+            raise CommandError('No models were quantized')
+
+        report_path = options.get('report') or os.path.join(settings.ML_MODELS_DIR, 'quantization_report.json')
+        with open(report_path, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        self.stdout.write(f'Report written to {report_path}')
+        self.stdout.write('Select INT8 per model with ML_MODEL_PRECISION, e.g. "farm_boundary=int8,weed=int8".')
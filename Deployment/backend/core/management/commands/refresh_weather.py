@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.models import Farm
+
+
+class Command(BaseCommand):
+    help = ("Fetch the weather of every farm's grid cell once (multi-location Open-Meteo requests) and write "
+            "today's Weather rows, recommendations and the weather cache; run it from cron or with --every")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='Only refresh farms owned by this user')
+        parser.add_argument('--farms', type=int, nargs='+', help='Only refresh these farm IDs')
+        parser.add_argument('--every', type=float,
+                            help='Keep running and refresh every this many seconds (e.g. WEATHER_FORECAST_TTL)')
+
+    def handle(self, *args, **options):
+        from api.open_meteo import OpenMeteoError
+        from api.weather_refresh import refresh_weather
+
+        farms = Farm.objects.all()
+        if options.get('username'):
+            farms = farms.filter(owner__profile__user__username=options['username'])
+        if options.get('farms'):
+            farms = farms.filter(id__in=options['farms'])
+        every = options.get('every')
+        if every is not None and every <= 0:
+            raise CommandError('--every must be a positive number of seconds')
+
+        while True:
+            start = time.monotonic()
+            try:
+                stats = refresh_weather(farms.all())
+            except OpenMeteoError as e:
+                if every is None:
+                    raise CommandError(f'Weather refresh failed: {e}')
+                self.stderr.write(self.style.ERROR(f'Weather refresh failed: {e}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Refreshed {stats['farms']} farms from {stats['cells']} grid cells "
+                    f"({stats['rainfall_days']} rainfall days, {stats['recommendations']} recommendations stored) in {time.monotonic() - start:.1f}s"))
+                if stats['skipped']:
+                    self.stdout.write(self.style.WARNING(
+                        f"Skipped {stats['skipped']} farms without a boundary centroid"))
+            if every is None:
+                return
+            close_old_connections()
+            time.sleep(max(0.0, every - (time.monotonic() - start)))
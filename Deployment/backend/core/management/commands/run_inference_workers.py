@@ -0,0 +1,105 @@
+import gc
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# Models served by the queued detection endpoints
+QUEUE_MODELS = ['farm_boundary', 'weed', 'disease']
+
+class Command(BaseCommand):
+    help = 'Run the inference worker processes that execute queued detection jobs (INFERENCE_MODE=queue)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.INFERENCE_WORKERS,
+                            help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=settings.INFERENCE_WORKER_POLL_SECONDS,
+                            help='Seconds an idle worker waits before checking the queue again')
+        parser.add_argument('--threads', type=int,
+                            help='Intra-op threads per worker (default: CPU cores divided by --processes)')
+        parser.add_argument('--models', nargs='+',
+                            help=f'Models loaded before forking the workers (default: ML_WARMUP_MODELS or {" ".join(QUEUE_MODELS)})')
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Let each worker load its models on first use instead of sharing them')
+        parser.add_argument('--shutdown-timeout', type=float, default=60,
+                            help='Seconds to let workers finish their current job on shutdown')
+
+    def handle(self, *args, **options):
+        # Imported here so other management commands don't load the ML stack
+        from api.inference_queue import worker_main, fail_jobs_of_worker, current_worker_name, purge_finished_jobs
+        from api.model_registry import registry
+
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be at least 1')
+        threads = options['threads'] or max(1, (os.cpu_count() or 1) // processes)
+        poll_interval = options['poll_interval']
+
+        purged = purge_finished_jobs()
+        if purged:
+            self.stdout.write(f'Removed {purged} finished jobs older than {settings.INFERENCE_JOB_RETENTION_HOURS}h')
+
+        if not options['no_preload']:
+            # Load once here; forked workers share the weight pages copy-on-write
+            names = options['models'] or settings.ML_WARMUP_MODELS or QUEUE_MODELS
+            loaded = registry.warm_up(names)
+            self.stdout.write(f"Preloaded models: {', '.join(loaded) or 'none'}")
+            missing = set(names) - set(loaded)
+            if missing:
+                self.stdout.write(self.style.WARNING(f"Could not load: {', '.join(sorted(missing))}"))
+            # Keep the garbage collector in the workers from touching (and copying) those pages
+            gc.freeze()
+
+        # Each worker opens its own database connection after the fork
+        connections.close_all()
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(start_method)
+        workers = {}
+
+        def start_worker():
+            process = context.Process(target=worker_main, args=(poll_interval, threads), daemon=True)
+            process.start()
+            workers[process.pid] = process
+
+        for _ in range(processes):
+            start_worker()
+        self.stdout.write(self.style.SUCCESS(
+            f'Started {processes} inference workers ({start_method}, {threads} threads each), polling every {poll_interval}s'
+        ))
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        last_purge = time.monotonic()
+        try:
+            while not stopping:
+                time.sleep(1)
+                for pid, process in list(workers.items()):
+                    # Workers also exit on a SIGTERM sent to the whole process group; don't restart those
+                    if process.is_alive() or stopping:
+                        continue
+                    del workers[pid]
+                    failed = fail_jobs_of_worker(current_worker_name(pid))
+                    self.stdout.write(self.style.WARNING(
+                        f'Worker {pid} exited with code {process.exitcode}; {failed} running jobs marked failed. Restarting.'
+                    ))
+                    start_worker()
+
+                if time.monotonic() - last_purge > 3600:
+                    purge_finished_jobs()
+                    last_purge = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write('Stopping inference workers...')
+            for process in workers.values():
+                process.terminate()  # SIGTERM: finish the current job, then exit
+            deadline = time.monotonic() + options['shutdown_timeout']
+            for pid, process in workers.items():
+                process.join(max(0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+                    fail_jobs_of_worker(current_worker_name(pid))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-17 23:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_scans_done(apps, schema_editor):
+    # Scans created before background processing existed are never picked up by a worker
+    Scan = apps.get_model('core', 'Scan')
+    Scan.objects.update(status='DONE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_inferencejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inferencejob',
+            name='scan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inference_jobs', to='core.scan'),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=12),
+        ),
+        migrations.RunPython(mark_existing_scans_done, migrations.RunPython.noop),
+    ]
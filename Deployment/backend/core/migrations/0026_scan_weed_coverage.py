@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_scan_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scan',
+            name='bounds',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scan',
+            name='weed_coverage',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_scan_weed_coverage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scan',
+            name='geometry_file',
+            field=models.FileField(blank=True, upload_to='scans/geometry/'),
+        ),
+    ]
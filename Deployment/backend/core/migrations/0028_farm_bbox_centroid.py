@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+from core.farm_geometry import boundary_polygons, polygons_bbox, polygons_centroid
+
+
+def compute_farm_geometry(apps, schema_editor):
+    # Historical models don't have Farm.update_geometry, so derive the columns here
+    Farm = apps.get_model('core', 'Farm')
+    farms = []
+    for farm in Farm.objects.exclude(boundary_geojson=None).only('id', 'boundary_geojson'):
+        polygons = boundary_polygons(farm.boundary_geojson)
+        bbox = polygons_bbox(polygons)
+        if bbox is None:
+            continue
+        farm.bbox_west, farm.bbox_south, farm.bbox_east, farm.bbox_north = bbox
+        farm.centroid_lat, farm.centroid_lng = polygons_centroid(polygons)
+        farms.append(farm)
+    Farm.objects.bulk_update(farms, ['bbox_west', 'bbox_south', 'bbox_east', 'bbox_north', 'centroid_lat', 'centroid_lng'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_scan_geometry_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farm',
+            name='bbox_east',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='bbox_north',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='bbox_south',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='bbox_west',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='centroid_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farm',
+            name='centroid_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(compute_farm_geometry, migrations.RunPython.noop),
+    ]
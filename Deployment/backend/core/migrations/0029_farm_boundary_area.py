@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 23:42
+
+from django.db import migrations, models
+
+from core.farm_geometry import boundary_polygons, polygons_centroid, polygons_area_m2
+
+
+def compute_area_and_centroid(apps, schema_editor):
+    # Area-weighted centroids replace the vertex means stored by 0028
+    Farm = apps.get_model('core', 'Farm')
+    farms = []
+    for farm in Farm.objects.exclude(boundary_geojson=None).only('id', 'boundary_geojson'):
+        polygons = boundary_polygons(farm.boundary_geojson)
+        if not polygons:
+            continue
+        farm.centroid_lat, farm.centroid_lng = polygons_centroid(polygons)
+        farm.boundary_area_hectares = polygons_area_m2(polygons) / 10000.0
+        farms.append(farm)
+    Farm.objects.bulk_update(farms, ['centroid_lat', 'centroid_lng', 'boundary_area_hectares'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_farm_bbox_centroid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farm',
+            name='boundary_area_hectares',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='farm',
+            name='centroid_lat',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='farm',
+            name='centroid_lng',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(compute_area_and_centroid, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 23:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.farm_geometry import boundary_polygons, boundary_levels
+
+
+def compute_boundary_levels(apps, schema_editor):
+    Farm = apps.get_model('core', 'Farm')
+    farms = []
+    for farm in Farm.objects.exclude(boundary_geojson=None).only('id', 'boundary_geojson'):
+        polygons = boundary_polygons(farm.boundary_geojson)
+        if not polygons:
+            continue
+        farm.boundary_levels = boundary_levels(polygons, settings.FARM_BOUNDARY_ZOOM_LEVELS)
+        farms.append(farm)
+    Farm.objects.bulk_update(farms, ['boundary_levels'], batch_size=200)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_farm_boundary_area'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farm',
+            name='boundary_levels',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(compute_boundary_levels, migrations.RunPython.noop),
+    ]
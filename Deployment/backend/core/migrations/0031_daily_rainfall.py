@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-17 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_farm_boundary_levels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRainfall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('date', models.DateField()),
+                ('precipitation', models.FloatField()),
+            ],
+            options={
+                'unique_together': {('latitude', 'longitude', 'date')},
+            },
+        ),
+    ]
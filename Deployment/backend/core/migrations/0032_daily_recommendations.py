@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-17 23:57
+
+from django.db import migrations, models
+
+# Titles of the recommendations generate_weather_recommendations created -> their key
+LEGACY_KEYS = {
+    'Adjust Irrigation Schedule': 'rain',
+    'Heat Protection Needed': 'heat',
+    'Frost Protection Alert': 'frost',
+    'Weather Conditions Stable': 'stable',
+}
+
+
+def deduplicate_recommendations(apps, schema_editor):
+    """
+    Date and key the weather recommendations created on every page load so far and keep
+    only the latest of each per farm, day and kind
+    """
+    Recommendation = apps.get_model('core', 'Recommendation')
+    latest = {}
+    duplicates = []
+    rows = (Recommendation.objects.filter(recommendation_type__in=['WATER', 'WEATHER', 'CROP'])
+            .select_related('farm_crop').order_by('-generated_at', '-id'))
+    for recommendation in rows.iterator():
+        details = recommendation.details if isinstance(recommendation.details, dict) else {}
+        if recommendation.recommendation_type == 'CROP' and recommendation.farm_crop_id:
+            key = f"flowering-heat-{recommendation.farm_crop_id}"
+            farm_id = recommendation.farm_id or recommendation.farm_crop.farm_id
+        else:
+            key = LEGACY_KEYS.get(details.get('title'))
+            farm_id = recommendation.farm_id
+        if key is None or farm_id is None:
+            continue
+        identity = (farm_id, recommendation.generated_at.date(), recommendation.recommendation_type, key)
+        if identity in latest:
+            duplicates.append(recommendation.id)
+            continue
+        latest[identity] = recommendation
+        recommendation.farm_id, recommendation.date, recommendation.key = farm_id, identity[1], key
+
+    for start in range(0, len(duplicates), 500):
+        Recommendation.objects.filter(id__in=duplicates[start:start + 500]).delete()
+    Recommendation.objects.bulk_update(list(latest.values()), ['farm', 'date', 'key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_daily_rainfall'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendation',
+            name='date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recommendation',
+            name='key',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.RunPython(deduplicate_recommendations, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='recommendation',
+            unique_together={('farm', 'date', 'recommendation_type', 'key')},
+        ),
+    ]
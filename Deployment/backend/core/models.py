@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.core.files.base import ContentFile
+from django.utils.functional import cached_property
 from django.dispatch import receiver
 from django.utils import timezone
+from decimal import Decimal
 import numpy as np
+import uuid
 
 # Create your models here.
 
@@ -103,6 +107,17 @@ class Farm(models.Model):
     size_hectares = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     size_category = models.CharField(max_length=1, choices=FARM_SIZE_CHOICES, blank=True, null=True)  # Can be derived or set
     boundary_geojson = models.JSONField(blank=True, null=True)
+
+    # Derived from boundary_geojson on every save (see update_geometry), for spatial queries
+    bbox_west = models.FloatField(blank=True, null=True, db_index=True)
+    bbox_south = models.FloatField(blank=True, null=True, db_index=True)
+    bbox_east = models.FloatField(blank=True, null=True, db_index=True)
+    bbox_north = models.FloatField(blank=True, null=True, db_index=True)
+    centroid_lat = models.FloatField(blank=True, null=True, db_index=True)
+    centroid_lng = models.FloatField(blank=True, null=True, db_index=True)
+    boundary_area_hectares = models.FloatField(blank=True, null=True, db_index=True)  # Geodesic area of the boundary
+    # Douglas-Peucker simplified MultiPolygon coordinates per web map zoom level, {'<zoom>': coordinates}
+    boundary_levels = models.JSONField(blank=True, null=True)
     
     # Soil parameters
     soil_type = models.CharField(max_length=20, choices=SOIL_TYPE_CHOICES, blank=True, null=True)
@@ -129,8 +144,105 @@ class Farm(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    GEOMETRY_FIELDS = ['bbox_west', 'bbox_south', 'bbox_east', 'bbox_north', 'centroid_lat', 'centroid_lng',
+                       'boundary_area_hectares']
+
     def __str__(self):
         return f"{self.name} ({self.owner.profile.user.username})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored boundary so save() can tell whether it was replaced
+        instance._saved_boundary = instance.__dict__.get('boundary_geojson')
+        return instance
+
+    @staticmethod
+    def size_category_for(area_hectares):
+        """Size category for an area in hectares"""
+        if area_hectares < 10:
+            return 'S'  # Small
+        elif area_hectares < 50:
+            return 'M'  # Medium
+        return 'L'  # Large
+
+    def save(self, *args, **kwargs):
+        # Keep the derived geometry in step with the boundary, however it was changed
+        # (serializers, the boundary update views, onboarding, the admin). It is only
+        # recomputed when the boundary changed or was never processed, so saves of
+        # other fields skip the simplification.
+        update_fields = kwargs.get('update_fields')
+        if 'boundary_geojson' not in self.get_deferred_fields():
+            boundary_changed = self._state.adding or (
+                self.boundary_geojson is not getattr(self, '_saved_boundary', None)
+                and self.boundary_geojson != getattr(self, '_saved_boundary', None)
+            )
+            # Deferred derived fields count as missing rather than being loaded to check
+            missing = bool(self.boundary_geojson) and any(
+                self.__dict__.get(field) is None for field in ('boundary_levels', 'centroid_lat'))
+            if boundary_changed or missing:
+                self.update_geometry(update_size=boundary_changed)
+                if update_fields is not None and 'boundary_geojson' in update_fields:
+                    kwargs['update_fields'] = set(update_fields) | set(self.GEOMETRY_FIELDS) | {
+                        'boundary_levels', 'size_hectares', 'size_category', 'updated_at'}
+                elif update_fields is not None and not boundary_changed:
+                    # Store the backfilled geometry of the unchanged boundary too
+                    kwargs['update_fields'] = set(update_fields) | set(self.GEOMETRY_FIELDS) | {'boundary_levels'}
+        super().save(*args, **kwargs)
+        self._saved_boundary = self.__dict__.get('boundary_geojson')
+
+    def update_geometry(self, update_size=False):
+        """
+        Recompute the bbox, centroid, area and simplified zoom levels from boundary_geojson.
+        With update_size, size_hectares and size_category are set from the measured
+        area (instead of any area the client sent along with the boundary).
+        """
+        from django.conf import settings
+        from .farm_geometry import (boundary_polygons, polygons_bbox, polygons_centroid, polygons_area_m2,
+                                    boundary_levels)
+
+        polygons = boundary_polygons(self.boundary_geojson)
+        bbox = polygons_bbox(polygons)
+        self.bbox_west, self.bbox_south, self.bbox_east, self.bbox_north = bbox or (None, None, None, None)
+        self.centroid_lat, self.centroid_lng = polygons_centroid(polygons) or (None, None)
+        self.boundary_area_hectares = polygons_area_m2(polygons) / 10000.0 if polygons else None
+        self.boundary_levels = boundary_levels(polygons, settings.FARM_BOUNDARY_ZOOM_LEVELS) if polygons else None
+
+        if update_size and self.boundary_area_hectares:
+            self.size_hectares = round(Decimal(self.boundary_area_hectares), 2)
+            self.size_category = self.size_category_for(self.boundary_area_hectares)
+
+    def boundary_at_zoom(self, zoom):
+        """
+        Boundary as a GeoJSON MultiPolygon simplified for a web map zoom level: the
+        closest precomputed level at least as detailed as the zoom. Returns
+        (geometry, level), level being None for the full-resolution boundary.
+        """
+        from .farm_geometry import boundary_polygons, multipolygon_coordinates
+
+        levels = sorted(int(level) for level in (self.boundary_levels or {}))
+        level = next((level for level in levels if level >= zoom), None)
+        if level is not None:
+            coordinates = self.boundary_levels[str(level)]
+        else:
+            coordinates = multipolygon_coordinates(boundary_polygons(self.boundary_geojson))
+        if not coordinates:
+            return None, level
+        return {'type': 'MultiPolygon', 'coordinates': coordinates}, level
+
+    @property
+    def centroid(self):
+        """{'latitude', 'longitude'} of the boundary centroid, or None"""
+        if self.centroid_lat is None:
+            return None
+        return {'latitude': self.centroid_lat, 'longitude': self.centroid_lng}
+
+    @property
+    def bbox(self):
+        """[west, south, east, north] of the boundary, or None"""
+        if self.bbox_west is None:
+            return None
+        return [self.bbox_west, self.bbox_south, self.bbox_east, self.bbox_north]
     
     def get_available_hectares(self):
         """Calculate available hectares for planting new crops"""
@@ -207,6 +319,22 @@ class Weather(models.Model):
     def __str__(self):
         return f"Weather for {self.farm.name} on {self.date}"
 
+class DailyRainfall(models.Model):
+    """
+    Daily precipitation of one weather grid cell from the Open-Meteo archive,
+    kept up to date incrementally by api/rainfall.py
+    """
+    latitude = models.FloatField()  # Centre of the weather grid cell
+    longitude = models.FloatField()
+    date = models.DateField()
+    precipitation = models.FloatField()  # in mm
+
+    class Meta:
+        unique_together = ['latitude', 'longitude', 'date']
+
+    def __str__(self):
+        return f"Rainfall at {self.latitude},{self.longitude} on {self.date}"
+
 class Crop(models.Model):
     WATER_REQUIREMENT_CHOICES = [
         ('LOW', 'Low - Drought Tolerant'),
@@ -617,6 +745,12 @@ class FarmCrop(models.Model):
         if recent_weather.exists():
             avg_temp_max = recent_weather.aggregate(models.Avg('temperature_max'))['temperature_max__avg']
             avg_rain = recent_weather.aggregate(models.Avg('precipitation'))['precipitation__avg']
+            # Daily average of the stored archive rainfall when available (Weather rows only hold
+            # the precipitation at the time the weather page was opened)
+            from api.rainfall import feature_rainfall
+            rainfall_30_days = feature_rainfall([self.farm], days=30).get(self.farm.pk)
+            if rainfall_30_days is not None:
+                avg_rain = rainfall_30_days / 30
             
             # Simple adjustments based on weather
             if avg_temp_max and avg_temp_max > 30:  # Too hot
@@ -738,6 +872,13 @@ class Recommendation(models.Model):
     recommendation_type = models.CharField(max_length=20, choices=RECOMMENDATION_TYPES)
     details = models.JSONField()  # Flexible field to store recommendation data (values, text, etc.)
     generated_at = models.DateTimeField(auto_now_add=True)
+    # Day the recommendation applies to and what it is about within its type (e.g. 'heat',
+    # 'flowering-heat-12'), so regenerating a day's recommendations updates them in place
+    date = models.DateField(blank=True, null=True, db_index=True)
+    key = models.CharField(max_length=50, blank=True, default='')
+
+    class Meta:
+        unique_together = ['farm', 'date', 'recommendation_type', 'key']
 
     def __str__(self):
         target = self.farm_crop if self.farm_crop else self.farm
@@ -763,6 +904,12 @@ class Scan(models.Model):
         ('DISEASE', 'Disease Detection'),
         ('WEED', 'Weed Detection'),
     ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
     farm_crop = models.ForeignKey(FarmCrop, on_delete=models.CASCADE, related_name='scans', null=True, blank=True)  # Link to specific planting
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='scans', null=True, blank=True)  # Or link to the whole farm
     scan_type = models.CharField(max_length=10, choices=SCAN_TYPES)
@@ -774,28 +921,100 @@ class Scan(models.Model):
     # For weed detection scans
     detected_weeds = models.ManyToManyField(DetectedWeed, blank=True, related_name='scans')
     weed_coverage_percentage = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    # Mask coverage computed at detection time: per-class pixel counts, density grid and,
+    # with bounds, areas in m2 (see api.postprocessing.weed_coverage)
+    weed_coverage = models.JSONField(blank=True, null=True)
+    # Optional {'north', 'south', 'east', 'west'} of the area the image covers
+    bounds = models.JSONField(blank=True, null=True)
+    # Weed polygons as a compressed .npz (see core/scan_geometry.py) instead of JSON in detection_results
+    geometry_file = models.FileField(upload_to='scans/geometry/', blank=True)
+
+    # Background processing (see api/inference_queue.py)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='PENDING')
+    error = models.TextField(blank=True, null=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         target = self.farm_crop if self.farm_crop else self.farm
         return f"{self.get_scan_type_display()} for {target} at {self.scanned_at}"
+
+    def record_detection(self, results=None, error=None):
+        """Store the outcome of the background detection for this scan"""
+        self.processed_at = timezone.now()
+        if error is not None:
+            self.status = 'FAILED'
+            self.error = error
+            self.save(update_fields=['status', 'error', 'processed_at'])
+            return
+
+        self.status = 'DONE'
+        self.error = None
+        if isinstance(results, dict) and 'coverage' in results:
+            # Stored in its own field; copied so a cached result isn't modified
+            results = dict(results)
+            self.weed_coverage = results.pop('coverage')
+        self.detection_results = results
+        self.compact_geometry(save=False)
+        self.save(update_fields=['status', 'error', 'processed_at', 'detection_results', 'weed_coverage', 'geometry_file'])
+        if self.scan_type == 'WEED':
+            self.process_weed_detection()
+
+    def compact_geometry(self, save=True):
+        """
+        Move the weed polygons out of detection_results into geometry_file, leaving a
+        summary with the detection count. Returns False if there was nothing to move.
+        """
+        from .scan_geometry import encode_weed_geometry
+
+        results = self.detection_results
+        if not isinstance(results, dict) or not isinstance(results.get('detected_weeds'), list):
+            return False
+        summary = {key: value for key, value in results.items() if key not in ('detected_weeds', 'boxes')}
+        summary['detection_count'] = len(results['detected_weeds'])
+        self.geometry_file.save(f'scan_{self.pk}.npz', ContentFile(encode_weed_geometry(results['detected_weeds'])), save=False)
+        self.detection_results = summary
+        self.__dict__.pop('weed_geometry', None)
+        if save:
+            self.save(update_fields=['detection_results', 'geometry_file'])
+        return True
+
+    @cached_property
+    def weed_geometry(self):
+        """Decoded {'detected_weeds', 'boxes'} from geometry_file (read on first access), or None"""
+        if not self.geometry_file:
+            return None
+        from .scan_geometry import decode_weed_geometry
+
+        with self.geometry_file.open('rb') as geometry:
+            return decode_weed_geometry(geometry.read())
+
+    def full_detection_results(self):
+        """detection_results with the polygons and boxes from geometry_file merged back in"""
+        if self.weed_geometry is None:
+            return self.detection_results
+        return {**(self.detection_results or {}), **self.weed_geometry}
     
     def process_weed_detection(self):
         """Process the scan for weed detection and link to DetectedWeed objects"""
         if self.scan_type != 'WEED' or not self.detection_results:
             return False
         
-        # Calculate weed coverage from detection results
-        # This is a simplified example - actual implementation would depend on your detection_results structure
+        # Coverage from the mask bitmap, computed by the detection job
+        if self.weed_coverage:
+            self.weed_coverage_percentage = self.weed_coverage['percentage']
+
+        # Older results only have per-detection polygon areas (overlaps counted twice)
         total_area = 0
         weed_area = 0
         
-        if isinstance(self.detection_results, dict) and 'boxes' in self.detection_results:
-            total_area = self.detection_results.get('image_area', 100)
-            for box in self.detection_results.get('boxes', []):
+        results = self.full_detection_results() if not self.weed_coverage else None
+        if isinstance(results, dict) and 'boxes' in results:
+            total_area = results.get('image_area', 100)
+            for box in results.get('boxes', []):
                 weed_area += box.get('area', 0)
         
         if total_area > 0:
-            self.weed_coverage_percentage = (weed_area / total_area) * 100
+            self.weed_coverage_percentage = min((weed_area / total_area) * 100, 100)
         
         # Link detected weeds
         if isinstance(self.detection_results, dict) and 'classes' in self.detection_results:
@@ -962,11 +1181,31 @@ class CropClassification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+    def get_feature_row(self):
+        """Return the model input for this classification, keyed by the classifier's column names"""
+        return {
+            'N (kg/ha)': float(self.soil_n),
+            'P (kg/ha)': float(self.soil_p),
+            'K (kg/ha)': float(self.soil_k),
+            'Temperature (°C)': float(self.temperature),
+            'Humidity (%)': float(self.humidity),
+            'pH': float(self.ph),
+            'Rainfall (mm)': float(self.rainfall),
+            'Area (ha)': float(self.area),
+            'Fertilizer (kg)': float(self.fertilizer_amount),
+            'Pesticide (kg)': float(self.pesticide_amount),
+            'Governorate': self.governorate,
+            'Irrigation': self.irrigation,
+            'Fertilizer Plant': self.fertilizer_type,
+            'Planting Season': self.planting_season,
+            'Growing Season': self.growing_season,
+            'Harvest Season': self.harvest_season,
+        }
         
     def save(self, *args, **kwargs):
         # Ensure temperature is properly formatted to avoid validation errors
         if self.temperature:
-            from decimal import Decimal
             self.temperature = Decimal(str(round(float(self.temperature), 2)))
             
         # Automatically pull data from farm if not provided
@@ -988,6 +1227,13 @@ class CropClassification(models.Model):
         if not self.irrigation and self.farm.irrigation_type:
             self.irrigation = self.farm.irrigation_type
 
+        # Seasonal rainfall from the daily rainfall store, if the farm's grid cell has one
+        if not self.rainfall:
+            from api.rainfall import feature_rainfall
+            rainfall = feature_rainfall([self.farm]).get(self.farm.pk)
+            if rainfall is not None:
+                self.rainfall = Decimal(str(rainfall))
+
         # Get latest weather data if available
         latest_weather = self.farm.weather_records.order_by('-date').first()
         if latest_weather:
@@ -1000,68 +1246,14 @@ class CropClassification(models.Model):
 
         # Predict crop using the ML model
         try:
-            import os
-            from django.apps import apps
-            
-            # Import the ml_utils dynamically to avoid circular imports
-            try:
-                from api.ml_utils import predict_crop
-                print("Successfully imported predict_crop from ml_utils")
-            except ImportError:
-                print("Error importing predict_crop, will use fallback method")
-                predict_crop = None
-
-            # Prepare data for prediction
-            data = {
-                'N (kg/ha)': [float(self.soil_n)],
-                'P (kg/ha)': [float(self.soil_p)],
-                'K (kg/ha)': [float(self.soil_k)],
-                'Temperature (°C)': [float(self.temperature)],
-                'Humidity (%)': [float(self.humidity)],
-                'pH': [float(self.ph)],
-                'Rainfall (mm)': [float(self.rainfall)],
-                'Area (ha)': [float(self.area)],
-                'Fertilizer (kg)': [float(self.fertilizer_amount)],
-                'Pesticide (kg)': [float(self.pesticide_amount)],
-                'Governorate': [self.governorate],
-                'Irrigation': [self.irrigation],
-                'Fertilizer Plant': [self.fertilizer_type],
-                'Planting Season': [self.planting_season],
-                'Growing Season': [self.growing_season],
-                'Harvest Season': [self.harvest_season]
-            }
-            
-            # Try to use the utility function first
-            if predict_crop:
-                predicted_crop_name, confidence = predict_crop(data)
-                print(f"Prediction from utility: {predicted_crop_name}, confidence: {confidence}")
-            else:
-                # Fallback to local prediction if utility function not available
-                import pandas as pd
-                import joblib
-                
-                # Try both absolute and relative paths, prioritizing local copy
-                model_paths = [
-                    os.path.join('models', 'crop_classifier.pkl'),  # Local copy in Django project directory
-                    r'C:\Users\ahmed\Desktop\PIDS\Data-Farmers-FarmWise-4DS3\Models\ml_models\crop_classifier.pkl',
-                    os.path.join('..', '..', 'Models', 'ml_models', 'crop_classifier.pkl')
-                ]
-                
-                model = None
-                for path in model_paths:
-                    if os.path.exists(path):
-                        print(f"Loading model from: {path}")
-                        model = joblib.load(path)
-                        break
-                
-                if not model:
-                    raise FileNotFoundError("Could not find the crop classification model")
-                
-                df_input = pd.DataFrame(data)
-                predicted_crop_name = model.predict(df_input)[0]
-                probabilities = model.predict_proba(df_input)[0]
-                confidence = float(probabilities.max()) * 100
-                print(f"Prediction from fallback: {predicted_crop_name}, confidence: {confidence}")
+            # Import the ml_utils lazily to avoid circular imports
+            from api.ml_utils import crop_classifier
+
+            if crop_classifier.model is None:
+                raise FileNotFoundError("Could not find the crop classification model")
+
+            # A single predict_proba pass gives both the label and its confidence
+            predicted_crop_name, confidence = crop_classifier.predict(self.get_feature_row())
 
             # Get or create the Crop object
             recommended_crop, _ = Crop.objects.get_or_create(name=predicted_crop_name)
@@ -1071,20 +1263,11 @@ class CropClassification(models.Model):
         except Exception as e:
             import logging
             import traceback
-            import pandas as pd  # Ensure pandas is imported
-            
+
             logger = logging.getLogger(__name__)
             logger.error(f"Error predicting crop: {e}")
             logger.error(f"Stack trace: {traceback.format_exc()}")
-            
-            # Print the error for console visibility during development
-            print(f"ERROR predicting crop: {e}")
-            print(f"Stack trace: {traceback.format_exc()}")
-            
-            # Check file paths for debugging
-            print(f"Absolute model path exists: {os.path.exists(r'C:\Users\ahmed\Desktop\PIDS\Data-Farmers-FarmWise-4DS3\Models\ml_models\crop_classifier.pkl')}")
-            print(f"Current working directory: {os.getcwd()}")
-            
+
             # Use a fallback value for recommended_crop so the save doesn't fail
             default_crop, _ = Crop.objects.get_or_create(name="Wheat")  # Default to a common crop
             self.recommended_crop = default_crop
@@ -1092,6 +1275,49 @@ class CropClassification(models.Model):
 
         super().save(*args, **kwargs)
 
+class InferenceJob(models.Model):
+    """
+    A detection queued for the inference worker processes (see api/inference_queue.py).
+    The database table is the queue: workers claim QUEUED rows one at a time and
+    write the JSON result (or error) back for the submitting request to pick up.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=30)  # Detection pipeline, see api.detection.DETECTORS
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    params = models.JSONField(default=dict, blank=True)
+    input_path = models.CharField(max_length=500, blank=True, default='')  # Spooled image, removed once processed
+    cache_key = models.CharField(max_length=64, blank=True, default='')
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    scan = models.ForeignKey(Scan, on_delete=models.CASCADE, related_name='inference_jobs', null=True, blank=True)  # Scan the result is stored on
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
+
+@receiver(post_delete, sender=Scan)
+def delete_scan_geometry(sender, instance, **kwargs):
+    """Remove the geometry file of a deleted scan"""
+    if instance.geometry_file:
+        instance.geometry_file.delete(save=False)
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Create a UserProfile whenever a User is created"""
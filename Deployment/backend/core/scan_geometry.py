@@ -0,0 +1,110 @@
+"""
+Compact storage for the weed polygons of a Scan.
+
+Dense weed photos produce hundreds of polygons; kept as nested JSON lists in
+Scan.detection_results they dominate the database and every scan read. Instead the
+polygons are written to a compressed .npz file in media/ next to the scan image:
+
+- coords:      all vertices back to back, delta-encoded (each point stored as the
+               offset from the previous one) as int16, which zlib compresses well
+- offsets:     point index where each polygon starts, plus the total
+- ids:         detection ids
+- class_index: index into 'classes' per detection
+- confidence:  confidence in hundredths as uint8 (the API rounds to 2 decimals)
+
+Bounding boxes and polygon areas are not stored; they are recomputed from the
+polygons when the geometry is decoded.
+"""
+import io
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+def encode_weed_geometry(detected_weeds):
+    """
+    Encode the 'objects' weed detections ({'id', 'class_name', 'confidence', 'polygon_pixels'})
+    into .npz bytes.
+    """
+    polygons = [np.asarray(weed['polygon_pixels'], dtype=np.int64).reshape(-1, 2) for weed in detected_weeds]
+    counts = np.array([len(p) for p in polygons], dtype=np.int64)
+    points = np.concatenate(polygons) if polygons else np.zeros((0, 2), dtype=np.int64)
+
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    coord_type = np.int16 if not len(deltas) or np.abs(deltas).max() <= np.iinfo(np.int16).max else np.int32
+
+    class_names = [weed['class_name'] for weed in detected_weeds]
+    classes = sorted(set(class_names))
+    class_lookup = {name: i for i, name in enumerate(classes)}
+
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        version=np.array(FORMAT_VERSION),
+        coords=deltas.astype(coord_type),
+        offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int32),
+        ids=np.array([weed['id'] for weed in detected_weeds], dtype=np.int32),
+        classes=np.array(classes, dtype=str),
+        class_index=np.array([class_lookup[name] for name in class_names], dtype=np.int16),
+        confidence=np.rint(np.array([weed['confidence'] for weed in detected_weeds], dtype=np.float64) * 100).astype(np.uint8),
+    )
+    return buffer.getvalue()
+
+
+def polygon_boxes_and_areas(points, offsets):
+    """
+    Bounding boxes [x1, y1, x2, y2] (exclusive max, like cv2.boundingRect) and shoelace
+    areas of polygons stored back to back in one (P, 2) array.
+    """
+    count = len(offsets) - 1
+    if not count:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0)
+    starts = offsets[:-1]
+    mins = np.minimum.reduceat(points, starts, axis=0)
+    maxs = np.maximum.reduceat(points, starts, axis=0) + 1
+
+    # Shoelace: sum of x_i * y_next - x_next * y_i over each closed ring
+    next_index = np.arange(1, len(points) + 1)
+    next_index[offsets[1:] - 1] = starts
+    x, y = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+    cross = x * y[next_index] - x[next_index] * y
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2
+    return np.concatenate([mins, maxs], axis=1), areas
+
+
+def decode_weed_geometry(data):
+    """
+    Decode .npz bytes (or a file object) from encode_weed_geometry.
+
+    Returns:
+        {'detected_weeds': [...], 'boxes': [...]} in the format the weed scan
+        pipeline produces
+    """
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+    with np.load(source, allow_pickle=False) as npz:
+        points = np.cumsum(npz['coords'].astype(np.int64), axis=0)
+        offsets = npz['offsets'].astype(np.int64)
+        ids = npz['ids'].tolist()
+        classes = npz['classes'].tolist()
+        class_names = [classes[i] for i in npz['class_index'].tolist()]
+        confidences = (npz['confidence'] / 100).round(2).tolist()
+
+    boxes, areas = polygon_boxes_and_areas(points, offsets)
+    detected_weeds = []
+    weed_boxes = []
+    for i, (detection_id, class_name, confidence) in enumerate(zip(ids, class_names, confidences)):
+        detected_weeds.append({
+            'id': detection_id,
+            'class_name': class_name,
+            'confidence': confidence,
+            'polygon_pixels': points[offsets[i]:offsets[i + 1]].tolist(),
+        })
+        weed_boxes.append({
+            'id': detection_id,
+            'class_name': class_name,
+            'confidence': confidence,
+            'box': boxes[i].tolist(),
+            'area': float(areas[i]),
+        })
+    return {'detected_weeds': detected_weeds, 'boxes': weed_boxes}
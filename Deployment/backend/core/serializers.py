@@ -1,3 +1,4 @@
+import json
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import UserProfile, Farm, Farmer, Admin, Weather, DetectedWeed, Crop, FarmCrop, Scan, Recommendation, InventoryItem, Equipment, CropClassification
@@ -9,6 +10,7 @@ class WeatherSerializer(serializers.ModelSerializer):
 
 class FarmSerializer(serializers.ModelSerializer):
     weather_records = WeatherSerializer(many=True, read_only=True)
+    bbox = serializers.ReadOnlyField()
     
     class Meta:
         model = Farm
@@ -16,9 +18,11 @@ class FarmSerializer(serializers.ModelSerializer):
                   'soil_type', 'soil_nitrogen', 'soil_phosphorus', 'soil_potassium', 'soil_ph',
                   'has_water_access', 'irrigation_type', 'has_road_access', 'has_electricity', 
                   'storage_capacity', 'farming_method', 'year_established',
-                  'estimated_price', 'boundary_geojson', 'created_at', 'updated_at', 'owner',
-                  'weather_records']
-        read_only_fields = ['created_at', 'updated_at', 'owner', 'weather_records']
+                  'estimated_price', 'boundary_geojson', 'boundary_area_hectares', 'centroid_lat', 'centroid_lng',
+                  'bbox', 'created_at', 'updated_at', 'owner', 'weather_records']
+        # Geometry columns are derived from boundary_geojson when the farm is saved
+        read_only_fields = ['created_at', 'updated_at', 'owner', 'weather_records',
+                            'boundary_area_hectares', 'centroid_lat', 'centroid_lng']
     
     def validate_boundary_geojson(self, value):
         """
@@ -91,7 +95,51 @@ class ScanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Scan
         fields = ['id', 'farm', 'farm_crop', 'scan_type', 'image', 'detection_results', 
-                  'treatment_suggestion', 'scanned_at', 'detected_weeds', 'weed_coverage_percentage']
+                  'treatment_suggestion', 'scanned_at', 'detected_weeds', 'weed_coverage_percentage',
+                  'weed_coverage', 'bounds', 'status', 'error', 'processed_at']
+        # Filled in by the background detection job
+        read_only_fields = ['detection_results', 'treatment_suggestion', 'weed_coverage_percentage',
+                            'weed_coverage', 'status', 'error', 'processed_at']
+
+    def validate_bounds(self, value):
+        """
+        Accept {'north', 'south', 'east', 'west'} or the {'north_east': {lat, lng}, 'south_west': {lat, lng}}
+        format of the detection endpoints (JSON-encoded in multipart requests); stored as the former.
+        """
+        if value in (None, ''):
+            return None
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise serializers.ValidationError("Invalid JSON")
+        try:
+            if 'north_east' in value and 'south_west' in value:
+                ne, sw = value['north_east'], value['south_west']
+                value = {'north': ne['lat'], 'south': sw['lat'], 'east': ne['lng'], 'west': sw['lng']}
+            bounds = {key: float(value[key]) for key in ('north', 'south', 'east', 'west')}
+        except (TypeError, KeyError, ValueError):
+            raise serializers.ValidationError("Expected north, south, east and west coordinates")
+        if bounds['north'] <= bounds['south'] or bounds['east'] <= bounds['west']:
+            raise serializers.ValidationError("North must be above south and east right of west")
+        return bounds
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Polygons live in the scan's geometry file and are only decoded for ?geometry=full
+        request = self.context.get('request')
+        if request is not None and request.query_params.get('geometry') == 'full':
+            data['detection_results'] = instance.full_detection_results()
+        return data
+
+    def validate(self, data):
+        if not data.get('farm') and not data.get('farm_crop'):
+            raise serializers.ValidationError("Either farm or farm_crop is required")
+        if data.get('farm_crop') and not data.get('farm'):
+            data['farm'] = data['farm_crop'].farm
+        if data.get('farm_crop') and data['farm_crop'].farm_id != data['farm'].id:
+            raise serializers.ValidationError("farm_crop does not belong to farm")
+        return data
         
 class RecommendationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -14,6 +14,7 @@ router.register(r'admins', views.AdminViewSet, basename='admin')
 router.register(r'farm-crops', views.FarmCropViewSet, basename='farm-crop')
 router.register(r'inventory', views.InventoryItemViewSet, basename='inventory')
 router.register(r'equipment', views.EquipmentViewSet, basename='equipment')
+router.register(r'scans', views.ScanViewSet, basename='scan')
 
 # URL patterns for the core app
 urlpatterns = [
@@ -466,16 +466,15 @@ def update_farm_boundary(request, farm_id):
         # Update only the boundary_geojson field
         if 'boundary_geojson' in request.data:
             farm.boundary_geojson = request.data['boundary_geojson']
+            # Also saves the area, size category, centroid and bbox measured from the boundary
             farm.save(update_fields=['boundary_geojson'])
             
-            # Update farm size if GeoJSON contains area information
-            if farm.boundary_geojson and 'properties' in farm.boundary_geojson and 'area_hectares' in farm.boundary_geojson['properties']:
-                farm.size_hectares = farm.boundary_geojson['properties']['area_hectares']
-                farm.save(update_fields=['size_hectares'])
-            
             return Response({
                 "success": True,
-                "message": "Farm boundary updated successfully"
+                "message": "Farm boundary updated successfully",
+                "area_hectares": farm.boundary_area_hectares,
+                "centroid": farm.centroid,
+                "bbox": farm.bbox
             })
         else:
             return Response({
@@ -906,6 +905,78 @@ class EquipmentViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response([])
 
+class ScanViewSet(viewsets.ModelViewSet):
+    """
+    API endpoint for weed and disease scans.
+
+    POST an image (multipart: image, scan_type, farm and/or farm_crop) to create a
+    PENDING scan; detection runs in the background and the response is 202 right away.
+    Poll GET /core/scans/<id>/ until status is DONE (results in detection_results)
+    or FAILED (reason in error). Optional filters: ?farm=<id>&status=<status>;
+    ?geometry=full adds the weed polygons and boxes to detection_results.
+    """
+    serializer_class = ScanSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        user = self.request.user
+        profile = user.profile
+        queryset = Scan.objects.select_related('farm', 'farm_crop').prefetch_related('detected_weeds').order_by('-scanned_at')
+
+        if not (profile.is_admin or user.is_staff):
+            if not hasattr(profile, 'farmer_profile'):
+                return Scan.objects.none()
+            queryset = queryset.filter(farm__owner=profile.farmer_profile)
+
+        farm_id = self.request.query_params.get('farm')
+        if farm_id:
+            try:
+                queryset = queryset.filter(farm_id=int(farm_id))
+            except ValueError:
+                raise serializers.ValidationError({'farm': 'Must be a farm ID'})
+        scan_status = self.request.query_params.get('status')
+        if scan_status:
+            statuses = [value for value, _ in Scan.STATUS_CHOICES]
+            if scan_status.upper() not in statuses:
+                raise serializers.ValidationError({'status': f"Must be one of {', '.join(statuses)}"})
+            queryset = queryset.filter(status=scan_status.upper())
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        # Imported here so other endpoints don't load the ML stack
+        from api.inference_cache import digest_uploaded_file
+        from api.inference_queue import submit_scan
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        profile = request.user.profile
+        farm = serializer.validated_data['farm']
+        is_owner = hasattr(profile, 'farmer_profile') and farm.owner == profile.farmer_profile
+        if not is_owner and not (profile.is_admin or request.user.is_staff):
+            return Response({"error": "You don't have access to this farm"}, status=status.HTTP_403_FORBIDDEN)
+
+        image_digest = digest_uploaded_file(serializer.validated_data['image'])
+        scan = serializer.save(status='PENDING')
+        try:
+            submit_scan(scan, image_digest=image_digest)
+        except Exception as e:
+            print(f"Error queueing scan {scan.id}: {e}")
+            scan.record_detection(error=f"Could not queue detection: {e}")
+
+        scan.refresh_from_db()
+        response_status = status.HTTP_201_CREATED if scan.status == 'DONE' else status.HTTP_202_ACCEPTED
+        return Response(self.get_serializer(scan).data, status=response_status)
+
+    def retrieve(self, request, *args, **kwargs):
+        scan = self.get_object()
+        if scan.status == 'PENDING' and settings.INFERENCE_MODE != 'queue':
+            # The web process running an inline job may have restarted; pick up jobs it left behind
+            from api.inference_queue import recover_local_jobs
+            recover_local_jobs()
+        return Response(self.get_serializer(scan).data)
+
 class CropClassificationView(viewsets.ModelViewSet):
     queryset = CropClassification.objects.all()
     serializer_class = CropClassificationSerializer
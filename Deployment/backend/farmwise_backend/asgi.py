@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'farmwise_backend.settings')
 
 application = get_asgi_application()
+
+# Load the models listed in ML_WARMUP_MODELS before this worker serves requests;
+# all other models are loaded lazily by the registry on first use.
+from django.conf import settings
+from api.model_registry import registry
+
+registry.warm_up(settings.ML_WARMUP_MODELS)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -143,6 +144,104 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
+# Machine learning models
+# Trained weights live in the repository-level Models/ directory
+ML_MODELS_DIR = BASE_DIR.parent.parent / 'Models'
+# Models loaded when a worker process starts, e.g. ML_WARMUP_MODELS="farm_boundary,disease".
+# Any model not listed here is loaded lazily on first use.
+ML_WARMUP_MODELS = [name.strip() for name in os.getenv('ML_WARMUP_MODELS', '').split(',') if name.strip()]
+# Load weights memory-mapped where the format allows it (ResNet9 state_dict, uncompressed joblib),
+# so separate worker processes share one copy through the OS page cache
+ML_MMAP_WEIGHTS = os.getenv('ML_MMAP_WEIGHTS', '1') not in ('0', 'false', 'False')
+# Micro-batching for the YOLO segmentation models: concurrent requests arriving within
+# ML_BATCH_MAX_WAIT_MS of each other are run as one predict call of up to ML_BATCH_MAX_SIZE images.
+ML_BATCH_MAX_SIZE = int(os.getenv('ML_BATCH_MAX_SIZE', '8'))
+ML_BATCH_MAX_WAIT_MS = float(os.getenv('ML_BATCH_MAX_WAIT_MS', '10'))
+ML_BATCH_TIMEOUT_SECONDS = float(os.getenv('ML_BATCH_TIMEOUT_SECONDS', '120'))
+
+# Tiled boundary detection: XYZ imagery source used for bounds + zoom requests,
+# and the largest area (in pixels at the requested zoom) a single request may cover
+MAP_TILE_URL_TEMPLATE = os.getenv(
+    'MAP_TILE_URL_TEMPLATE',
+    'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+)
+TILED_DETECTION_MAX_PIXELS = int(os.getenv('TILED_DETECTION_MAX_PIXELS', str(400 * 1000 * 1000)))
+
+# How detection endpoints map image pixels to lng/lat when the request does not say:
+# 'linear' (interpolate lat/lng across the image) or 'mercator' (Web Mercator, as web maps render)
+MAP_PIXEL_PROJECTION = os.getenv('MAP_PIXEL_PROJECTION', 'linear')
+
+# Detection result cache keyed by model version, image digest and parameters.
+# The in-memory LRU is per worker; set ML_RESULT_CACHE_DIR to add a disk tier shared by all workers.
+ML_RESULT_CACHE_MAX_ENTRIES = int(os.getenv('ML_RESULT_CACHE_MAX_ENTRIES', '256'))
+ML_RESULT_CACHE_MAX_MB = int(os.getenv('ML_RESULT_CACHE_MAX_MB', '64'))
+ML_RESULT_CACHE_DIR = os.getenv('ML_RESULT_CACHE_DIR') or None
+ML_RESULT_CACHE_DISK_MAX_MB = int(os.getenv('ML_RESULT_CACHE_DISK_MAX_MB', '512'))
+
+# Batched disease detection: most images per request and threads used to decode/preprocess them
+DISEASE_BATCH_MAX_IMAGES = int(os.getenv('DISEASE_BATCH_MAX_IMAGES', '64'))
+DISEASE_PREPROCESS_WORKERS = int(os.getenv('DISEASE_PREPROCESS_WORKERS', str(min(8, os.cpu_count() or 1))))
+
+# CPU runtime for the disease model: 'eager' (state_dict + ResNet9 class), 'torchscript' or 'onnx'.
+# Export the artifacts with `python manage.py export_disease_model`.
+DISEASE_MODEL_BACKEND = os.getenv('DISEASE_MODEL_BACKEND', 'eager')
+# Intra-op threads per worker process; defaults to the cores divided between the Gunicorn workers
+ML_INTRA_OP_THREADS = int(os.getenv(
+    'ML_INTRA_OP_THREADS',
+    str(max(1, (os.cpu_count() or 1) // max(1, int(os.getenv('WEB_CONCURRENCY', '1'))))),
+))
+# Per-model precision, e.g. ML_MODEL_PRECISION="farm_boundary=int8,weed=int8,disease=fp32".
+# int8 serves the artifact from `python manage.py quantize_models`; unlisted models run in fp32.
+ML_MODEL_PRECISION = {
+    name.strip(): precision.strip()
+    for name, precision in (item.split('=', 1) for item in os.getenv('ML_MODEL_PRECISION', '').split(',') if '=' in item)
+}
+
+# Where the detection endpoints run inference: 'inline' (in the request thread) or 'queue'
+# (handed to the worker processes started with `python manage.py run_inference_workers`)
+INFERENCE_MODE = os.getenv('INFERENCE_MODE', 'inline')
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '2'))
+INFERENCE_WORKER_POLL_SECONDS = float(os.getenv('INFERENCE_WORKER_POLL_SECONDS', '0.2'))
+# How long a request waits for its queued job before answering 202 with the job id to poll
+INFERENCE_JOB_WAIT_SECONDS = float(os.getenv('INFERENCE_JOB_WAIT_SECONDS', '30'))
+# Spooled job inputs; must be shared by the web and worker processes
+INFERENCE_JOB_DIR = os.getenv('INFERENCE_JOB_DIR') or str(MEDIA_ROOT / 'inference_jobs')
+INFERENCE_JOB_RETENTION_HOURS = int(os.getenv('INFERENCE_JOB_RETENTION_HOURS', '24'))
+# INFERENCE_MODE='inline': background jobs queued this long are re-dispatched (their web process may have restarted)
+INFERENCE_LOCAL_STALE_SECONDS = float(os.getenv('INFERENCE_LOCAL_STALE_SECONDS', '120'))
+
+# Cell size (degrees) of the in-memory farm bbox grid behind /api/farms/within/ and /api/farms/at/
+FARM_INDEX_CELL_DEGREES = float(os.getenv('FARM_INDEX_CELL_DEGREES', '0.05'))
+# Web map zoom levels for which simplified farm boundaries are precomputed on save;
+# deeper zooms are served the full-resolution boundary
+FARM_BOUNDARY_ZOOM_LEVELS = [int(z) for z in os.getenv('FARM_BOUNDARY_ZOOM_LEVELS', '6,9,12,15').split(',') if z.strip()]
+
+# Open-Meteo responses cached per lat/lng grid cell: 'memory' (per-worker LRU), 'django' (the
+# WEATHER_CACHE_ALIAS cache) or 'file' (WEATHER_CACHE_DIR). Expired entries are served for up to
+# WEATHER_STALE_TTL seconds while they are refreshed in the background.
+WEATHER_CACHE_BACKEND = os.getenv('WEATHER_CACHE_BACKEND', 'memory')
+WEATHER_CACHE_ALIAS = os.getenv('WEATHER_CACHE_ALIAS', 'default')
+WEATHER_CACHE_DIR = os.getenv('WEATHER_CACHE_DIR') or str(MEDIA_ROOT / 'weather_cache')
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '1024'))
+WEATHER_CACHE_CELL_DEGREES = float(os.getenv('WEATHER_CACHE_CELL_DEGREES', '0.1'))
+WEATHER_FORECAST_TTL = int(os.getenv('WEATHER_FORECAST_TTL', '900'))
+WEATHER_RAINFALL_TTL = int(os.getenv('WEATHER_RAINFALL_TTL', '86400'))
+WEATHER_STALE_TTL = int(os.getenv('WEATHER_STALE_TTL', '3600'))
+# Days of archive precipitation backfilled when a grid cell is first seen (api/rainfall.py)
+WEATHER_RAINFALL_HISTORY_DAYS = int(os.getenv('WEATHER_RAINFALL_HISTORY_DAYS', '365'))
+# Open-Meteo client (api/open_meteo.py): endpoints (point both at `manage.py fake_open_meteo` for local runs),
+# pooled connections, retries with jittered backoff and the per-endpoint circuit breaker
+OPEN_METEO_FORECAST_URL = os.getenv('OPEN_METEO_FORECAST_URL', 'https://api.open-meteo.com/v1/forecast')
+OPEN_METEO_ARCHIVE_URL = os.getenv('OPEN_METEO_ARCHIVE_URL', 'https://archive-api.open-meteo.com/v1/archive')
+OPEN_METEO_POOL_SIZE = int(os.getenv('OPEN_METEO_POOL_SIZE', '10'))
+OPEN_METEO_RETRIES = int(os.getenv('OPEN_METEO_RETRIES', '2'))
+OPEN_METEO_RETRY_BACKOFF = float(os.getenv('OPEN_METEO_RETRY_BACKOFF', '0.25'))
+OPEN_METEO_BREAKER_FAILURES = int(os.getenv('OPEN_METEO_BREAKER_FAILURES', '5'))
+OPEN_METEO_BREAKER_RESET_SECONDS = float(os.getenv('OPEN_METEO_BREAKER_RESET_SECONDS', '30'))
+
+# Rows/columns of the weed density grid stored with each weed scan
+WEED_DENSITY_GRID_SIZE = int(os.getenv('WEED_DENSITY_GRID_SIZE', '16'))
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000", # Your Next.js frontend development URL
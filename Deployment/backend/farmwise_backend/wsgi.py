@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'farmwise_backend.settings')
 
 application = get_wsgi_application()
+
+# Load the models listed in ML_WARMUP_MODELS before this worker serves requests;
+# all other models are loaded lazily by the registry on first use.
+# Under gunicorn.conf.py (preload_app) this runs once in the master process and the
+# forked workers share the loaded weights copy-on-write. Only loading happens here:
+# running inference before fork would leave PyTorch's thread pool unusable in the workers.
+from django.conf import settings
+from api.model_registry import registry
+
+registry.warm_up(settings.ML_WARMUP_MODELS)
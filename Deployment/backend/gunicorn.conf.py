@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration for serving the FarmWise API with shared model weights.
+
+    gunicorn -c gunicorn.conf.py farmwise_backend.wsgi
+
+With preload_app the master process imports the WSGI application once, which
+loads the models listed in ML_WARMUP_MODELS (see farmwise_backend/wsgi.py),
+and then forks the workers. The workers share the read-only weight pages with
+the master through copy-on-write instead of each loading its own copy, so
+per-worker memory no longer grows with the number of models.
+
+Environment variables:
+    WEB_CONCURRENCY     number of worker processes (default 2)
+    GUNICORN_BIND       bind address (default 0.0.0.0:8000)
+    GUNICORN_TIMEOUT    worker timeout in seconds (default 120, inference can be slow on CPU)
+    ML_PRELOAD_APP      set to 0 to load the application (and models) in each worker instead
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# Requests wait on the micro-batcher, so a few threads per worker keep the model busy
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = os.getenv('ML_PRELOAD_APP', '1') not in ('0', 'false', 'False')
+
+
+def when_ready(server):
+    if preload_app:
+        from api.model_registry import registry
+        loaded = [name for name in registry.names() if registry.is_loaded(name)]
+        server.log.info(f"Models preloaded in master (shared with workers): {', '.join(loaded) or 'none'}")
+
+
+def pre_fork(server, worker):
+    # Move every object allocated so far (including the loaded models) into the permanent
+    # generation, so the cyclic garbage collector in the workers never writes to their
+    # headers and the pages stay shared.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork: the micro-batcher restarts its worker thread on first use
+    # in this process, and PyTorch's thread pool is recreated with ML_INTRA_OP_THREADS.
+    server.log.info(f"Worker {worker.pid} forked")